@@ -0,0 +1 @@
+"""Synthetic catalogs and timing harness for the matching paths."""
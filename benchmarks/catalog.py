@@ -0,0 +1,83 @@
+"""
+Seeded generator of realistic-looking profiles, offers and requests.
+
+Categories and subcategories come from utils.helpers.CATEGORIES and
+postcodes follow the Dutch "1234AB" format, clustered around a handful of
+cities so the proximity component sees both near and far pairs.
+"""
+import random
+import string
+from dataclasses import dataclass, field
+
+from utils.helpers import CATEGORIES
+
+LISTINGS_PER_PROFILE = 5
+
+# PC4 ranges around a few Dutch cities (Amsterdam, Rotterdam, Utrecht, Eindhoven, Groningen)
+PC4_CLUSTERS = [(1011, 1109), (3011, 3089), (3511, 3585), (5611, 5658), (9711, 9747)]
+
+ADJECTIVES = ["vintage", "used", "new", "small", "large", "kids", "wooden", "electric", "old", "spare"]
+NOUNS = {
+    "Electronics": ["phone", "tablet", "laptop", "charger", "speaker", "camera", "headphones", "monitor"],
+    "Clothing & Accessories": ["jacket", "dress", "shoes", "scarf", "watch", "backpack", "jeans", "sweater"],
+    "Books & Media": ["novel", "cookbook", "guitar", "vinyl", "board book", "dvd box", "comics", "keyboard"],
+    "Home & Living": ["sofa", "table", "lamp", "blender", "plant pot", "rug", "chair", "kettle"],
+    "Sports & Outdoors": ["bicycle", "tent", "dumbbells", "kayak", "yoga mat", "helmet", "skates", "racket"],
+    "Toys & Games": ["lego set", "puzzle", "doll", "board game", "playstation", "train set", "teddy bear"],
+    "Beauty & Personal Care": ["lipstick", "shampoo", "hair dryer", "perfume", "vitamins", "razor"],
+    "Food & Beverages": ["rice", "coffee beans", "tea", "olive oil", "wine", "pasta", "spices"],
+    "Other": ["dog sitting", "cat food", "moving help", "bike repair", "garden work", "aquarium"],
+}
+
+
+@dataclass
+class Catalog:
+    profiles: list = field(default_factory=list)
+    offers: list = field(default_factory=list)
+    requests: list = field(default_factory=list)
+
+
+def _postcode(rng: random.Random) -> str:
+    low, high = rng.choice(PC4_CLUSTERS)
+    letters = rng.choice([a + b for a in string.ascii_uppercase for b in string.ascii_uppercase
+                          if a + b not in ("SA", "SD", "SS")])
+    return f"{rng.randint(low, high)}{letters}"
+
+
+def _listing(rng: random.Random, listing_id: int, profile: dict) -> dict:
+    category = rng.choice(list(CATEGORIES.keys()))
+    noun = rng.choice(NOUNS[category])
+    return {
+        "id": listing_id,
+        "profile_id": profile["id"],
+        "title": f"{rng.choice(ADJECTIVES)} {noun}".capitalize(),
+        "description": None,
+        "category": category,
+        "subcategory": rng.choice(CATEGORIES[category]),
+        "is_active": True,
+        "profiles": profile,
+    }
+
+
+def generate_catalog(listings: int, seed: int = 42) -> Catalog:
+    """
+    Build a catalog with `listings` offers and requests in total (split evenly),
+    owned by listings / LISTINGS_PER_PROFILE profiles. Offer and request dicts
+    have the same shape as the Supabase rows scored by refresh_matches_for_item.
+    """
+    rng = random.Random(seed)
+    catalog = Catalog()
+
+    for i in range(max(listings // LISTINGS_PER_PROFILE, 2)):
+        catalog.profiles.append({
+            "id": f"profile-{i:06d}",
+            "full_name": f"User {i}",
+            "postal_code": _postcode(rng),
+            "karma": rng.randint(0, 50),
+        })
+
+    for listing_id in range(1, listings + 1):
+        listing = _listing(rng, listing_id, rng.choice(catalog.profiles))
+        (catalog.offers if listing_id % 2 else catalog.requests).append(listing)
+
+    return catalog
@@ -0,0 +1,197 @@
+"""
+Benchmark the matching paths on synthetic catalogs.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --profiles 50
+
+Reports latency percentiles, pairs scored per second and peak memory for
+score_match and rank_potential_matches (the Python ranking that the
+potential_matches() Postgres function reproduces). With --legacy-db the catalog is also
+loaded into the SUPABASE_DB_URL database inside a transaction that is
+rolled back afterwards, and services/matching.find_matches_for_user is
+timed against it. --compare-db likewise checks that the potential_matches()
+Postgres function ranks like rank_potential_matches.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.catalog import generate_catalog
+from services import geolocation, matching_ipv4
+
+MEMORY_SAMPLES = 5
+
+
+def _percentiles(latencies):
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return f"p50 {p50:8.2f} ms | p95 {p95:8.2f} ms | p99 {p99:8.2f} ms"
+
+
+def _peak_memory_mb(fn, args_list) -> float:
+    tracemalloc.start()
+    try:
+        for args in args_list[:MEMORY_SAMPLES]:
+            fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def _report(name, latencies, pairs, peak_mb):
+    total = sum(latencies)
+    rate = pairs / total if total else 0.0
+    print(f"  {name:<28} {_percentiles(latencies)} | {rate:12,.0f} pairs/s | peak {peak_mb:7.1f} MB")
+
+
+def bench_score_match(catalog, rng, samples: int):
+    offers_by_category = {}
+    for offer in catalog.offers:
+        offers_by_category.setdefault(offer["category"], []).append(offer)
+    pairs = [
+        (rng.choice(offers_by_category[req["category"]]), req)
+        for req in rng.sample(catalog.requests, min(samples, len(catalog.requests)))
+        if req["category"] in offers_by_category
+    ]
+
+    latencies = []
+    for offer, req in pairs:
+        started = time.perf_counter()
+        matching_ipv4.score_match(offer, req)
+        latencies.append(time.perf_counter() - started)
+
+    _report("score_match", latencies, len(pairs), _peak_memory_mb(matching_ipv4.score_match, pairs))
+
+
+def _candidate_pairs(catalog, profile_id) -> int:
+    """Number of same-category pairs rank_potential_matches has to consider for a profile."""
+    offers_index = matching_ipv4.build_candidate_index([o for o in catalog.offers if o["profile_id"] != profile_id])
+    requests_index = matching_ipv4.build_candidate_index([r for r in catalog.requests if r["profile_id"] != profile_id])
+    count = 0
+    for req in catalog.requests:
+        if req["profile_id"] == profile_id:
+            count += sum(1 for _ in matching_ipv4.iter_candidates(offers_index, req))
+    for offer in catalog.offers:
+        if offer["profile_id"] == profile_id:
+            count += sum(1 for _ in matching_ipv4.iter_candidates(requests_index, offer))
+    return count
+
+
+def bench_rank_potential_matches(catalog, profile_ids, top_n: int):
+    calls = [(pid, catalog.offers, catalog.requests, set(), top_n) for pid in profile_ids]
+
+    latencies = []
+    for args in calls:
+        started = time.perf_counter()
+        matching_ipv4.rank_potential_matches(*args)
+        latencies.append(time.perf_counter() - started)
+
+    pairs = sum(_candidate_pairs(catalog, pid) for pid in profile_ids)
+    _report("rank_potential_matches", latencies, pairs, _peak_memory_mb(matching_ipv4.rank_potential_matches, calls))
+
+
+def _load_catalog(session, catalog):
+    """Insert the catalog through the ORM; returns ({db offer id: offer}, {db request id: request})."""
+    from data.models import Profile, Offer, Request
+
+    session.add_all(Profile(id=p["id"], full_name=p["full_name"], postal_code=p["postal_code"], karma=p["karma"])
+                    for p in catalog.profiles)
+    session.flush()
+    loaded = []
+    for model, rows in ((Offer, catalog.offers), (Request, catalog.requests)):
+        objects = [model(profile_id=r["profile_id"], title=r["title"], category=r["category"],
+                         subcategory=r["subcategory"], is_active=True) for r in rows]
+        session.add_all(objects)
+        session.flush()
+        loaded.append({obj.id: row for obj, row in zip(objects, rows)})
+    return loaded[0], loaded[1]
+
+
+def bench_find_matches_for_user(catalog, profile_ids, top_n: int):
+    from data.db import SessionLocal
+    from services.matching import find_matches_for_user
+
+    session = SessionLocal()
+    try:
+        _load_catalog(session, catalog)
+
+        calls = [(session, pid, top_n) for pid in profile_ids]
+        latencies = []
+        for args in calls:
+            started = time.perf_counter()
+            find_matches_for_user(*args)
+            latencies.append(time.perf_counter() - started)
+
+        pairs = sum(_candidate_pairs(catalog, pid) for pid in profile_ids)
+        _report("find_matches_for_user", latencies, pairs, _peak_memory_mb(find_matches_for_user, calls))
+    finally:
+        session.rollback()
+        session.close()
+
+
+def compare_database_scores(catalog, profile_ids, top_n: int):
+    """
+    Check that the potential_matches() Postgres function returns the same
+    top N scores as rank_potential_matches for each sampled profile.
+    """
+    from sqlalchemy import text
+    from data.db import SessionLocal
+
+    session = SessionLocal()
+    try:
+        offers, requests = _load_catalog(session, catalog)
+        mismatched = []
+        for pid in profile_ids:
+            expected = [score for _, _, score in
+                        matching_ipv4.rank_potential_matches(pid, catalog.offers, catalog.requests, top_n=top_n)]
+            rows = session.execute(
+                text("SELECT offer, request, score FROM potential_matches(:pid, :top_n, :half_km)"),
+                {"pid": pid, "top_n": top_n, "half_km": geolocation.DISTANCE_HALF_KM},
+            ).all()
+            actual = [row.score for row in rows]
+            # Equal scores may come back in a different order, so compare the ranked scores
+            if len(actual) != len(expected) or not np.allclose(actual, expected, atol=1e-9):
+                mismatched.append(pid)
+            elif any(offers[row.offer["id"]]["profile_id"] != pid and requests[row.request["id"]]["profile_id"] != pid
+                     for row in rows):
+                mismatched.append(pid)
+        print(f"  {'potential_matches()':<28} {len(profile_ids) - len(mismatched)}/{len(profile_ids)} profiles "
+              f"rank like rank_potential_matches" + (f" (differ: {', '.join(mismatched)})" if mismatched else ""))
+    finally:
+        session.rollback()
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BetterBarter matching paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="total listings (offers + requests) per catalog")
+    parser.add_argument("--profiles", type=int, default=50, help="profiles sampled per catalog")
+    parser.add_argument("--pairs", type=int, default=5_000, help="pairs sampled for score_match")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--legacy-db", action="store_true",
+                        help="also time find_matches_for_user against SUPABASE_DB_URL (changes are rolled back)")
+    parser.add_argument("--compare-db", action="store_true",
+                        help="check potential_matches() in SUPABASE_DB_URL against rank_potential_matches "
+                             "(changes are rolled back)")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        catalog = generate_catalog(size, seed=args.seed)
+        rng = random.Random(args.seed)
+        profile_ids = [p["id"] for p in rng.sample(catalog.profiles, min(args.profiles, len(catalog.profiles)))]
+
+        print(f"{size:,} listings ({len(catalog.profiles):,} profiles, {len(profile_ids)} sampled)")
+        bench_score_match(catalog, rng, args.pairs)
+        bench_rank_potential_matches(catalog, profile_ids, args.top_n)
+        if args.legacy_db:
+            bench_find_matches_for_user(catalog, profile_ids, args.top_n)
+        if args.compare_db:
+            compare_database_scores(catalog, profile_ids, args.top_n)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
 from typing import Literal
 from supabase import Client as SupabaseClient
+from postgrest.exceptions import APIError
 import datetime
+import time
+import os
 from data.models import MatchStatus
-from services.email_service import send_match_request_email, send_match_accepted_email
-from services import matching_ipv4
+from services import matching_ipv4, images, geolocation
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-MAX_MATCH_REQUESTS_PER_DAY = 3  # adjustable
+MAX_MATCH_REQUESTS_PER_DAY = 3  # for the UI pre-check; create_match_request() enforces its own copy
 REQUEST_BUCKET_NAME = "request-images"
 OFFER_BUCKET_NAME = "offer-images"
+# Where the Matches page gets potential matches: "python" reads the stored
+# matches table, "database" scores live in the potential_matches() function
+MATCH_SCORING_BACKEND = os.environ.get("MATCH_SCORING_BACKEND", "python")
+MATCH_FIELDS = {"title", "category", "subcategory", "is_active"}  # fields that affect stored match scores
+MATCH_FETCH_PAGE_SIZE = 1000  # at most PostgREST's max-rows, or pages come back short
+MATCH_WRITE_BATCH_SIZE = 500
+PROFILE_CACHE_KEY = "profile_cache"
+PROFILE_CACHE_SECONDS = 30  # bounds staleness for changes made by other users
 
 # -----------------------------
 # Helper class to pass to email service
@@ -45,9 +56,47 @@ def create_profile(
     return response.data[0] if response.data else None
 
 
+def _profile_cache():
+    """
+    profile_id -> (profile, fetched_at), kept in the user's session. None outside
+    a Streamlit script run (email_worker.py, recompute_matches.py), which has no session.
+    """
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    return st.session_state.setdefault(PROFILE_CACHE_KEY, {})
+
+
+def invalidate_profiles(*profile_ids):
+    """Drop cached profiles after writing to them."""
+    cache = _profile_cache()
+    if cache is None:
+        return
+    for profile_id in profile_ids:
+        cache.pop(profile_id, None)
+
+
 def get_profile(supabase_client: SupabaseClient, profile_id: str):
+    """Fetch a profile, at most once per PROFILE_CACHE_SECONDS within a session."""
+    cache = _profile_cache()
+    now = time.monotonic()
+    cached = cache.get(profile_id) if cache is not None else None
+    if cached and now - cached[1] < PROFILE_CACHE_SECONDS:
+        return cached[0]
+
     response = supabase_client.table("profiles").select("*").eq("id", profile_id).execute()
-    return response.data[0] if response.data else None
+    profile = response.data[0] if response.data else None
+    if cache is not None:
+        cache[profile_id] = (profile, now)
+    return profile
+
+
+def get_profiles(supabase_client: SupabaseClient, profile_ids) -> dict:
+    """Fetch several profiles in one query, keyed by id."""
+    profile_ids = list(set(profile_ids))
+    if not profile_ids:
+        return {}
+    response = supabase_client.table("profiles").select("*").in_("id", profile_ids).execute()
+    return {p["id"]: p for p in response.data or []}
 
 
 def update_profile(supabase_client: SupabaseClient, profile_id: str, phone: str = None, share_phone: bool = None, **kwargs):
@@ -58,6 +107,10 @@ def update_profile(supabase_client: SupabaseClient, profile_id: str, phone: str
         update_data["share_phone"] = share_phone
 
     response = supabase_client.table("profiles").update(update_data).eq("id", profile_id).execute()
+    invalidate_profiles(profile_id)
+    # Stored match scores include the owner's postal code
+    if response.data and "postal_code" in update_data:
+        refresh_matches_for_profile(supabase_client, profile_id)
     return response.data[0] if response.data else None
 
 
@@ -66,6 +119,7 @@ def delete_profile(supabase_client: SupabaseClient, profile_id: str):
     supabase_client.auth.admin.delete_user(profile_id)
     # Delete profile row
     response = supabase_client.table("profiles").delete().eq("id", profile_id).execute()
+    invalidate_profiles(profile_id)
     return response.data[0] if response.data else None
 
 
@@ -84,9 +138,11 @@ def create_offer(supabase_client: SupabaseClient, profile_id: str, title: str, d
     if image_file_name:
         offer_data["image_file_name"] = image_file_name
     response = supabase_client.table("offers").insert(offer_data).execute()
+    # The offers trigger awarded karma
+    invalidate_profiles(profile_id)
 
-    # Increment karma
-    add_karma(supabase_client, profile_id, points=3)
+    if response.data:
+        refresh_matches_for_item(supabase_client, response.data[0], item_type="offer")
 
     return response.data[0] if response.data else None
 
@@ -99,8 +155,19 @@ def get_offers(supabase_client: SupabaseClient, exclude_profile_id: str = None,
     return response.data
 
 
+def get_offers_for_profile(supabase_client: SupabaseClient, profile_id: str, include_inactive: bool = True):
+    """The profile's own offers, newest first."""
+    query = supabase_client.table("offers").select("*").eq("profile_id", profile_id)
+    if not include_inactive:
+        query = query.eq("is_active", True)
+    resp = query.order("created_at", desc=True).execute()
+    return resp.data if resp.data else []
+
+
 def update_offer(supabase_client: SupabaseClient, offer_id: int, **kwargs):
     response = supabase_client.table("offers").update(kwargs).eq("id", offer_id).execute()
+    if response.data and MATCH_FIELDS.intersection(kwargs):
+        refresh_matches_for_item(supabase_client, response.data[0], item_type="offer")
     return response.data[0] if response.data else None
 
 
@@ -113,29 +180,32 @@ def delete_offer(supabase_client: SupabaseClient, offer_id: int):
 
     offer = offers[0]
 
-    # Deduct karma
-    add_karma(supabase_client, offer["profile_id"], points=-3)
-
-    # Delete related match requests
+    # Delete related match requests and scored matches
     supabase_client.table("match_requests").delete().eq("offer_id", offer_id).execute()
+    remove_matches_for_item(supabase_client, offer_id, item_type="offer")
 
     # Delete image from storage if exists
     image_file_name = offer.get("image_file_name")
     if image_file_name:
         try:
-            supabase_client.storage.from_(OFFER_BUCKET_NAME).remove([image_file_name])
+            supabase_client.storage.from_(OFFER_BUCKET_NAME).remove(
+                [image_file_name] + images.rendition_names(image_file_name)
+            )
         except Exception as e:
             print(f"Warning: could not delete image {image_file_name}: {e}")
 
     # Delete the offer itself
     del_response = supabase_client.table("offers").delete().eq("id", offer_id).execute()
+    # The offers trigger deducted karma
+    invalidate_profiles(offer["profile_id"])
     return del_response.data[0] if del_response.data else None
 
 
 def mark_offer_matched(supabase_client: SupabaseClient, offer_id: int):
+    """Deactivate a matched offer; accept_match_request() awards the karma."""
     offer = supabase_client.table("offers").update({"is_active": False}).eq("id", offer_id).execute()
     if offer.data:
-        add_karma(supabase_client, offer.data[0]["profile_id"], points=5)
+        remove_matches_for_item(supabase_client, offer_id, item_type="offer")
     return offer.data[0] if offer.data else None
 
 
@@ -154,7 +224,10 @@ def create_request(supabase_client: SupabaseClient, profile_id: str, title: str,
     if image_file_name:
         request_data["image_file_name"] = image_file_name
     response = supabase_client.table("requests").insert(request_data).execute()
-    add_karma(supabase_client, profile_id, points=1)
+    # The requests trigger awarded karma
+    invalidate_profiles(profile_id)
+    if response.data:
+        refresh_matches_for_item(supabase_client, response.data[0], item_type="request")
     return response.data[0] if response.data else None
 
 
@@ -166,8 +239,19 @@ def get_requests(supabase_client: SupabaseClient, exclude_profile_id: str = None
     return response.data
 
 
+def get_requests_for_profile(supabase_client: SupabaseClient, profile_id: str, include_inactive: bool = True):
+    """The profile's own requests, newest first."""
+    query = supabase_client.table("requests").select("*").eq("profile_id", profile_id)
+    if not include_inactive:
+        query = query.eq("is_active", True)
+    resp = query.order("created_at", desc=True).execute()
+    return resp.data if resp.data else []
+
+
 def update_request(supabase_client: SupabaseClient, request_id: int, **kwargs):
     response = supabase_client.table("requests").update(kwargs).eq("id", request_id).execute()
+    if response.data and MATCH_FIELDS.intersection(kwargs):
+        refresh_matches_for_item(supabase_client, response.data[0], item_type="request")
     return response.data[0] if response.data else None
     
 
@@ -181,29 +265,32 @@ def delete_request(supabase_client: SupabaseClient, request_id: int):
 
     req = requests[0]
 
-    # Deduct karma
-    add_karma(supabase_client, req["profile_id"], points=-1)
-
-    # Delete related match requests
+    # Delete related match requests and scored matches
     supabase_client.table("match_requests").delete().eq("request_id", request_id).execute()
+    remove_matches_for_item(supabase_client, request_id, item_type="request")
 
     # Delete image from storage if exists
     image_file_name = req.get("image_file_name")
     if image_file_name:
         try:
-            supabase_client.storage.from_(REQUEST_BUCKET_NAME).remove([image_file_name])
+            supabase_client.storage.from_(REQUEST_BUCKET_NAME).remove(
+                [image_file_name] + images.rendition_names(image_file_name)
+            )
         except Exception as e:
             print(f"Warning: could not delete image {image_file_name}: {e}")
 
     # Delete the request itself
     del_response = supabase_client.table("requests").delete().eq("id", request_id).execute()
+    # The requests trigger deducted karma
+    invalidate_profiles(req["profile_id"])
     return del_response.data[0] if del_response.data else None
 
 
 def mark_request_matched(supabase_client: SupabaseClient, request_id: int):
+    """Deactivate a matched request; accept_match_request() awards the karma."""
     request = supabase_client.table("requests").update({"is_active": False}).eq("id", request_id).execute()
     if request.data:
-        add_karma(supabase_client, request.data[0]["profile_id"], points=5)
+        remove_matches_for_item(supabase_client, request_id, item_type="request")
     return request.data[0] if request.data else None
 
 
@@ -225,30 +312,28 @@ def authenticate_user(supabase_client: SupabaseClient, email: str, password: str
         return response
     return None
 
-# -----------------------------
-# Karma system helper
-# -----------------------------
-def add_karma(supabase_client: SupabaseClient, profile_id: str, points: int):
-    profile = supabase_client.table("profiles").select("*").eq("id", profile_id).execute().data
-    if profile:
-        new_karma = (profile[0]["karma"] or 0) + points
-        supabase_client.table("profiles").update({"karma": new_karma}).eq("id", profile_id).execute()
-        return supabase_client.table("profiles").select("*").eq("id", profile_id).execute().data[0]
-    return None
-
-
 # -----------------------------
 # Match Request CRUD
 # -----------------------------
 
 def can_send_match_request(supabase_client: SupabaseClient, requester_id: str) -> bool:
-    today_start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-    response = supabase_client.table("match_requests")\
-        .select("*", count="exact")\
-        .eq("requester_id", requester_id)\
-        .gte("created_at", today_start)\
+    """
+    UI pre-check against the profile's daily counter; create_match_request
+    claims the slot atomically and enforces the limit.
+    """
+    response = supabase_client.table("profiles")\
+        .select("daily_match_count, daily_match_count_reset")\
+        .eq("id", requester_id)\
+        .limit(1)\
         .execute()
-    return response.count < MAX_MATCH_REQUESTS_PER_DAY
+    if not response.data:
+        return True
+    profile = response.data[0]
+    today_start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    reset = profile.get("daily_match_count_reset")
+    if not reset or datetime.datetime.fromisoformat(reset) < today_start:
+        return True
+    return (profile.get("daily_match_count") or 0) < MAX_MATCH_REQUESTS_PER_DAY
 
 
 def get_existing_match_request(
@@ -271,6 +356,59 @@ def get_existing_match_request(
     return resp.data[0] if resp.data else None
 
 
+def get_existing_match_requests(
+    supabase_client: SupabaseClient,
+    initiator_id: str,
+    request_ids=None,
+    offer_ids=None,
+) -> dict:
+    """
+    Batch variant of get_existing_match_request: one query for the
+    initiator's match requests on any of the given requests/offers.
+    Returns {("request" | "offer", id): match_request}.
+    """
+    request_ids = list(set(request_ids or []))
+    offer_ids = list(set(offer_ids or []))
+    filters = []
+    if request_ids:
+        filters.append(f"request_id.in.({','.join(str(i) for i in request_ids)})")
+    if offer_ids:
+        filters.append(f"offer_id.in.({','.join(str(i) for i in offer_ids)})")
+    if not filters:
+        return {}
+
+    resp = supabase_client.table("match_requests")\
+        .select("*")\
+        .eq("initiator_id", initiator_id)\
+        .or_(",".join(filters))\
+        .execute()
+
+    existing = {}
+    for mr in resp.data or []:
+        if mr.get("request_id") in request_ids:
+            existing.setdefault(("request", mr["request_id"]), mr)
+        if mr.get("offer_id") in offer_ids:
+            existing.setdefault(("offer", mr["offer_id"]), mr)
+    return existing
+
+
+def _call_procedure(supabase_client: SupabaseClient, name: str, params: dict):
+    """
+    Call a Postgres function over RPC. Errors raised inside the function
+    (RAISE EXCEPTION) surface as plain Exceptions carrying its message.
+    """
+    try:
+        return supabase_client.rpc(name, params).execute().data
+    except APIError as e:
+        raise Exception(e.message) from e
+
+
+def _split_profiles(row: dict):
+    """Separate the requester/offerer profiles a procedure returns from the match request row."""
+    row = dict(row)
+    return row, row.pop("requester_profile", None), row.pop("offerer_profile", None)
+
+
 def create_match_request(
     supabase_client: SupabaseClient,
     caller_id: str,
@@ -285,102 +423,25 @@ def create_match_request(
     Create a match request. Handles both:
     - Caller owns a request and wants an offer (initiator_type="request")
     - Caller owns an offer and wants to respond to a request (initiator_type="offer")
+    Validation, insert and karma run in the create_match_request() Postgres
+    function in one round trip. The function takes the caller from the
+    session (auth.uid()); caller_id only refreshes the cached profile.
     """
-    # --- Basic validations ---
-    if not can_send_match_request(supabase_client, caller_id):
-        raise Exception(f"Daily limit of {MAX_MATCH_REQUESTS_PER_DAY} match requests reached.")
-
-    if not offer_id and not request_id:
-        raise Exception("Either offer_id or request_id must be provided.")
-
-    if not contact_mode or not contact_value:
-        raise Exception("Contact mode and contact details must be provided.")
-
-    requester_id = offerer_id = None
-
-    if initiator_type == "request":
-        # Caller is the requester, must provide target offer
-        if not offer_id:
-            raise Exception("offer_id must be provided when initiator_type='request'")
-        requester_id = caller_id
-
-        resp = supabase_client.table("offers").select("profile_id, is_active").eq("id", offer_id).execute()
-        if not resp.data:
-            raise Exception("Offer not found")
-        if not resp.data[0].get("is_active", True):
-            raise Exception("Cannot send a match request to a deactivated offer")
-        offerer_id = resp.data[0]["profile_id"]
-
-        if offerer_id == caller_id:
-            raise Exception("Cannot send a match request to your own offer")
-        
-        initiator_id = caller_id  
-
-
-    elif initiator_type == "offer":
-        # Caller is the offerer, must provide target request
-        if not request_id:
-            raise Exception("request_id must be provided when initiator_type='offer'")
-        offerer_id = caller_id
-
-        resp = supabase_client.table("requests").select("profile_id, is_active").eq("id", request_id).execute()
-        if not resp.data:
-            raise Exception("Request not found")
-        if not resp.data[0].get("is_active", True):
-            raise Exception("Cannot send a match request to a deactivated request")
-        requester_id = resp.data[0]["profile_id"]
-
-        if requester_id == caller_id:
-            raise Exception("Cannot send a match request to your own request")
-
-        initiator_id = caller_id  
-
-    else:
-        raise Exception("Invalid initiator_type. Must be 'request' or 'offer'.")
-
-    if requester_id == offerer_id:
-        raise Exception("Cannot send a match request to your own item")
-
-    # --- Prevent duplicate match requests ---
-    if get_existing_match_request(supabase_client, initiator_id=caller_id, request_id=request_id, offer_id=offer_id):
-        raise Exception("You have already sent a match request here.")
-
-    # --- Prepare match data ---
-    match_data = {
-        "requester_id": requester_id,
-        "offerer_id": offerer_id,
-        "initiator_id": initiator_id,  
-        "request_id": request_id,
-        "offer_id": offer_id,
-        "message": message,
-        "status": "pending",
-        "created_at": datetime.datetime.utcnow().isoformat(),
-        "notified": False,
-        "requester_contact_mode": contact_mode if initiator_type == "request" else None,
-        "requester_contact_value": contact_value if initiator_type == "request" else None,
-        "offerer_contact_mode": contact_mode if initiator_type == "offer" else None,
-        "offerer_contact_value": contact_value if initiator_type == "offer" else None,
-    }
-
-    # --- Insert into DB ---
-    resp = supabase_client.table("match_requests").insert(match_data).execute()
-    add_karma(supabase_client, caller_id, 1)
-
-    # --- Send email notification ---
-    if resp.data:
-        caller_profile = get_profile(supabase_client, caller_id)
-        other_profile = get_profile(
-            supabase_client, 
-            offerer_id if initiator_type == "request" else requester_id
-        )
-
-        if caller_profile and other_profile:
-            send_match_request_email(
-                receiver=UserEmailObj(other_profile),
-                sender=UserEmailObj(caller_profile),
-            )
-
-    return resp.data[0] if resp.data else None
+    row = _call_procedure(supabase_client, "create_match_request", {
+        "p_offer_id": offer_id,
+        "p_request_id": request_id,
+        "p_message": message,
+        "p_contact_mode": contact_mode,
+        "p_contact_value": contact_value,
+        "p_initiator_type": initiator_type,
+    })
+    # Karma and the daily counter changed
+    invalidate_profiles(caller_id)
+    if not row:
+        return None
+    # The notification email is queued in email_outbox by the same transaction
+    match_req, _, _ = _split_profiles(row)
+    return match_req
 
 
 
@@ -395,45 +456,72 @@ def get_match_requests_for_offer(supabase_client: SupabaseClient, offer_id: int,
     return resp.data
 
 
-def get_sent_match_requests(db, profile_id: str, status: str = None):
+MATCH_REQUEST_SELECT = "*, offers:offer_id(*, profiles:profile_id(*)), requests:request_id(*, profiles:profile_id(*))"
+CLOSED_MATCH_REQUEST_SELECT = """
+    *,
+    offers:offer_id (
+        id, title, description, image_file_name, category, subcategory,
+        profiles:profile_id (id, full_name, postal_code, karma)
+    ),
+    requests:request_id (
+        id, title, description, image_file_name, category, subcategory,
+        profiles:profile_id (id, full_name, postal_code, karma)
+    )
+"""
+CLOSED_MATCH_STATUSES = ["accepted", "completed", "rejected"]
+
+
+def _sent_match_requests_query(db, profile_id: str, status: str = None):
     query = (
         db.table("match_requests")
-        .select("*, offers:offer_id(*, profiles:profile_id(*)), requests:request_id(*, profiles:profile_id(*))")
+        .select(MATCH_REQUEST_SELECT)
         .eq("initiator_id", profile_id)  # only requests created by this user
     )
     if status:
         query = query.eq("status", status)
-
-    resp = query.execute()
-    filtered = [
-        mr for mr in resp.data
-        if (
-            (mr.get("offers") and mr["offers"].get("is_active", True)) or
-            (mr.get("requests") and mr["requests"].get("is_active", True))
-        )
-    ]
-    return filtered
+    return query
 
 
-def get_incoming_match_requests(db, profile_id: str, status: str = None):
+def _incoming_match_requests_query(db, profile_id: str, status: str = None):
     query = (
         db.table("match_requests")
-        .select("*, offers:offer_id(*, profiles:profile_id(*)), requests:request_id(*, profiles:profile_id(*))")
+        .select(MATCH_REQUEST_SELECT)
         .neq("initiator_id", profile_id)  # only requests initiated by someone else
         .or_(f"offerer_id.eq.{profile_id},requester_id.eq.{profile_id}")  # user is on the other side
     )
     if status:
         query = query.eq("status", status)
+    return query
 
-    resp = query.execute()
-    filtered = [
-        mr for mr in resp.data
+
+def _with_active_item(match_requests):
+    return [
+        mr for mr in match_requests or []
         if (
             (mr.get("offers") and mr["offers"].get("is_active", True)) or
             (mr.get("requests") and mr["requests"].get("is_active", True))
         )
     ]
-    return filtered
+
+
+def get_sent_match_requests(db, profile_id: str, status: str = None):
+    return _with_active_item(_sent_match_requests_query(db, profile_id, status).execute().data)
+
+
+def get_incoming_match_requests(db, profile_id: str, status: str = None):
+    return _with_active_item(_incoming_match_requests_query(db, profile_id, status).execute().data)
+
+
+def _closed_match_requests_query(db, profile_id: str):
+    return db.table("match_requests")\
+        .select(CLOSED_MATCH_REQUEST_SELECT)\
+        .or_(f"requester_id.eq.{profile_id},offerer_id.eq.{profile_id}")\
+        .in_("status", CLOSED_MATCH_STATUSES)
+
+
+def get_closed_match_requests(db, profile_id: str):
+    """Accepted, completed and declined match requests the profile is part of."""
+    return _closed_match_requests_query(db, profile_id).execute().data or []
 
 
 
@@ -448,85 +536,111 @@ def update_match_request_status(
     """
     Updates the status of a match request.
     Updates the contact info of the accepter (offerer or requester).
+    Accepting and declining run in the accept_match_request() /
+    decline_match_request() Postgres functions, which act as the session's
+    user (auth.uid()) rather than profile_id.
     """
     status_str = status.value if isinstance(status, MatchStatus) else str(status)
-    match_req_resp = supabase_client.table("match_requests").select("*").eq("id", match_request_id).execute()
-    match_req = match_req_resp.data[0] if match_req_resp.data else None
-    if not match_req:
-        return None
+
+    if status_str == MatchStatus.accepted.value:
+        row = _call_procedure(supabase_client, "accept_match_request", {
+            "p_match_request_id": match_request_id,
+            "p_contact_mode": contact_mode,
+            "p_contact_value": contact_value,
+        })
+        if not row:
+            return None
+        # Both sides are emailed by the outbox worker
+        match_req, _, _ = _split_profiles(row)
+        invalidate_profiles(match_req.get("requester_id"), match_req.get("offerer_id"))
+        return match_req
+
+    if status_str == MatchStatus.rejected.value:
+        return _call_procedure(supabase_client, "decline_match_request", {
+            "p_match_request_id": match_request_id,
+        })
 
     update_data = {"status": status_str, "updated_at": datetime.datetime.utcnow().isoformat()}
+    resp = supabase_client.table("match_requests").update(update_data).eq("id", match_request_id).execute()
+    return resp.data[0] if resp.data else None
 
-    # Determine which side is performing the acceptance
-    if status == MatchStatus.accepted and contact_mode and contact_value:
-        if profile_id == match_req.get("offerer_id"):
-            update_data["offerer_contact_mode"] = contact_mode
-            update_data["offerer_contact_value"] = contact_value
-        elif profile_id == match_req.get("requester_id"):
-            update_data["requester_contact_mode"] = contact_mode
-            update_data["requester_contact_value"] = contact_value
 
-    resp = supabase_client.table("match_requests").update(update_data).eq("id", match_request_id).execute()
-    match_req = resp.data[0] if resp.data else None
-
-    # Karma and marking as matched
-    if status == MatchStatus.accepted:
-        if match_req.get("offer_id"):
-            mark_offer_matched(supabase_client, match_req["offer_id"])
-            if match_req.get("requester_id"):
-                add_karma(supabase_client, match_req["requester_id"], 5)
-        if match_req.get("request_id"):
-            mark_request_matched(supabase_client, match_req["request_id"])
-            if match_req.get("offerer_id"):
-                add_karma(supabase_client, match_req["offerer_id"], 5)
-
-        # Send emails
-        requester_profile = get_profile(supabase_client, match_req["requester_id"])
-        offerer_profile = get_profile(supabase_client, match_req["offerer_id"])
-        if requester_profile and offerer_profile:
-            requester_user = UserEmailObj(requester_profile)
-            offerer_user = UserEmailObj(offerer_profile)
-
-            # Use stored contact info from match_request
-            requester_contact = {
-                "mode": match_req.get("requester_contact_mode"),
-                "value": match_req.get("requester_contact_value"),
-            }
-            offerer_contact = {
-                "mode": match_req.get("offerer_contact_mode"),
-                "value": match_req.get("offerer_contact_value"),
-            }
-
-            send_match_accepted_email(
-                requester_user,
-                offerer_user,
-                user1_contact=requester_contact,
-                user2_contact=offerer_contact
-            )
 
-    return match_req
+def cancel_match_request(supabase_client: SupabaseClient, match_request_id: int, requester_id: str):
+    """
+    Delete a pending match request and take back its karma point, atomically.
+    Only the session's user can cancel their own request; requester_id only
+    refreshes the cached profile.
+    """
+    cancelled = bool(_call_procedure(supabase_client, "cancel_match_request", {
+        "p_match_request_id": match_request_id,
+    }))
+    invalidate_profiles(requester_id)
+    return cancelled
 
 
+# -----------------------------
+# EMAIL OUTBOX
+# -----------------------------
+def claim_email_digests(supabase_client: SupabaseClient, window_seconds: int, max_recipients: int, lease_seconds: int):
+    """
+    Take all pending outbox entries of up to max_recipients recipients whose oldest
+    entry has waited window_seconds; they are locked to this worker for lease_seconds.
+    """
+    resp = supabase_client.rpc("claim_email_digests", {
+        "p_window_seconds": window_seconds,
+        "p_max_recipients": max_recipients,
+        "p_lease_seconds": lease_seconds,
+    }).execute()
+    return resp.data or []
 
-def cancel_match_request(supabase_client: SupabaseClient, match_request_id: int, requester_id: str):
-    resp = supabase_client.table("match_requests")\
-        .delete()\
-        .eq("id", match_request_id)\
-        .eq("requester_id", requester_id)\
-        .eq("status", MatchStatus.pending.value)\
-        .execute()
-    
-    add_karma(supabase_client, requester_id, -1)
 
-    return bool(resp.data)
+def get_match_requests_by_ids(supabase_client: SupabaseClient, match_request_ids) -> dict:
+    """Fetch match requests in a single query, keyed by id."""
+    ids = list({mr_id for mr_id in match_request_ids if mr_id is not None})
+    if not ids:
+        return {}
+    resp = supabase_client.table("match_requests").select("*").in_("id", ids).execute()
+    return {mr["id"]: mr for mr in resp.data or []}
 
 
-def mark_match_request_notified(supabase_client: SupabaseClient, match_request_id: int):
+def mark_match_requests_notified(supabase_client: SupabaseClient, match_request_ids):
+    ids = list(set(match_request_ids))
+    if not ids:
+        return []
     resp = supabase_client.table("match_requests")\
         .update({"notified": True})\
-        .eq("id", match_request_id)\
+        .in_("id", ids)\
         .execute()
-    return resp.data[0] if resp.data else None
+    return resp.data or []
+
+
+def mark_emails_sent(supabase_client: SupabaseClient, outbox_ids):
+    if not outbox_ids:
+        return []
+    resp = supabase_client.table("email_outbox")\
+        .update({
+            "status": "sent",
+            "sent_at": datetime.datetime.utcnow().isoformat(),
+            "last_error": None,
+            "locked_until": None,
+        })\
+        .in_("id", list(outbox_ids))\
+        .execute()
+    return resp.data or []
+
+
+def reschedule_emails(supabase_client: SupabaseClient, outbox_ids, error: str, retry_at: datetime.datetime = None):
+    """Record a failed delivery; without retry_at the entries are given up on."""
+    if not outbox_ids:
+        return []
+    update_data = {"last_error": error, "locked_until": None}
+    if retry_at is None:
+        update_data["status"] = "failed"
+    else:
+        update_data["next_attempt_at"] = retry_at.isoformat()
+    resp = supabase_client.table("email_outbox").update(update_data).in_("id", list(outbox_ids)).execute()
+    return resp.data or []
 
 def get_all_requests(supabase_client: SupabaseClient, exclude_profile_id: str = None, include_inactive: bool = False):
     query = supabase_client.table("requests").select("*")
@@ -549,6 +663,49 @@ def get_all_offers(supabase_client: SupabaseClient, exclude_profile_id: str = No
 
 
 
+def get_feed_page(
+    supabase_client: SupabaseClient,
+    table: Literal["offers", "requests"],
+    exclude_profile_id: str = None,
+    category: str = None,
+    subcategory: str = None,
+    cursor: dict = None,
+    page_size: int = 20,
+):
+    """
+    One page of active offers/requests, newest first, filtered server-side.
+    Keyset-paginated on (created_at, id): pass the returned cursor back to
+    get the next page. Returns (items, next_cursor); next_cursor is None on
+    the last page.
+    """
+    query = supabase_client.table(table).select("*").eq("is_active", True)
+    if exclude_profile_id:
+        query = query.neq("profile_id", exclude_profile_id)
+    if category:
+        query = query.eq("category", category)
+    if subcategory:
+        query = query.eq("subcategory", subcategory)
+    if cursor:
+        created_at = cursor["created_at"]
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{cursor["id"]})'
+        )
+
+    resp = query.order("created_at", desc=True)\
+        .order("id", desc=True)\
+        .limit(page_size + 1)\
+        .execute()
+    rows = resp.data or []
+
+    items = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = {"created_at": last["created_at"], "id": last["id"]}
+    return items, next_cursor
+
+
+
 # -----------------------------
 # MATCH CRUD
 # -----------------------------
@@ -565,77 +722,141 @@ def match_request_exists(supabase_client: SupabaseClient , requester_id, request
 
 
 
-def get_potential_matches(supabase_client, profile_id: str, top_n: int = 10):
-    """
-    Return potential matches for the logged-in profile.
-    Excludes matches where requester and offerer are the same profile.
-    """
-    candidates = []
-
-    # Fetch active offers and requests
-    # Fetch active offers and requests with profile info including karma
-    all_offers = supabase_client.table("offers")\
-        .select("*, profiles(id, full_name, postal_code, karma)")\
-        .eq("is_active", True)\
-        .execute().data or []
-
-    all_requests = supabase_client.table("requests")\
-        .select("*, profiles(id, full_name, postal_code, karma)")\
-        .eq("is_active", True)\
-        .execute().data or []
-
-    # Separate my vs others
-    my_offers = [o for o in all_offers if o["profile_id"] == profile_id]
-    my_requests = [r for r in all_requests if r["profile_id"] == profile_id]
-
-    others_offers = [o for o in all_offers if o["profile_id"] != profile_id]
-    others_requests = [r for r in all_requests if r["profile_id"] != profile_id]
-
-    # Pre-fetch existing match requests
-    existing = supabase_client.table("match_requests")\
+def _existing_match_pairs_query(supabase_client: SupabaseClient, profile_id: str):
+    return supabase_client.table("match_requests")\
         .select("offer_id, request_id")\
-        .or_(f"requester_id.eq.{profile_id},offerer_id.eq.{profile_id}")\
-        .execute().data or []
+        .or_(f"requester_id.eq.{profile_id},offerer_id.eq.{profile_id}")
+
 
-    existing_pairs = {
+def _match_pairs(match_requests) -> set:
+    return {
         (mr["offer_id"], mr["request_id"])
-        for mr in existing
+        for mr in match_requests or []
         if mr.get("offer_id") is not None and mr.get("request_id") is not None
     }
 
-    # 1. My requests -> Others' offers
-    for req in my_requests:
-        for offer in others_offers:
-            if req["profile_id"] == offer["profile_id"]:
-                continue
-            if req["category"] != offer["category"]:
-                continue  # discard mismatched categories
-            if (offer["id"], req["id"]) in existing_pairs:
-                continue
-            match_score = matching_ipv4.score_match(offer, req)
-            if match_score > 0:
-                candidates.append((offer, req, match_score))
-
-    # 2. My offers -> Others' requests
-    for offer in my_offers:
-        for req in others_requests:
-            if offer["profile_id"] == req["profile_id"]:
-                continue
-            if offer["category"] != req["category"]:
-                continue
-            if (offer["id"], req["id"]) in existing_pairs:
-                continue
-            match_score = matching_ipv4.score_match(offer, req)
-            if match_score > 0:
-                candidates.append((offer, req, match_score))
-
-    # Sort candidates by match_score descending and return top N
-    candidates.sort(key=lambda x: x[2], reverse=True)
-    return candidates[:top_n]
-
 
+def get_existing_match_pairs(supabase_client: SupabaseClient, profile_id: str) -> set:
+    """(offer_id, request_id) pairs that already have a match request involving the profile."""
+    return _match_pairs(_existing_match_pairs_query(supabase_client, profile_id).execute().data)
+
+
+def _active_counterparts(supabase_client: SupabaseClient, item: dict, counterpart_table: str):
+    """Active listings of other profiles in the item's category, fetched in id order one page at a time."""
+    rows, last_id = [], 0
+    while True:
+        query = supabase_client.table(counterpart_table)\
+            .select("*, profiles(postal_code)")\
+            .eq("is_active", True)\
+            .neq("profile_id", item["profile_id"])\
+            .gt("id", last_id)
+        if item.get("category") is not None:
+            query = query.eq("category", item["category"])
+        else:
+            query = query.is_("category", "null")
+        page = query.order("id").limit(MATCH_FETCH_PAGE_SIZE).execute().data or []
+        if not page:
+            return rows
+        rows.extend(page)
+        last_id = page[-1]["id"]
+
+
+def refresh_matches_for_item(supabase_client: SupabaseClient, item: dict, item_type: Literal["offer", "request"]):
+    """
+    Re-score one offer/request against all active counterparts in its category
+    and replace its rows in the matches table. Inactive items keep no rows.
+    """
+    own_key = f"{item_type}_id"
+    counterpart_table = "requests" if item_type == "offer" else "offers"
+
+    if not item.get("is_active", True):
+        remove_matches_for_item(supabase_client, item["id"], item_type=item_type)
+        return []
+
+    if not matching_ipv4.postal_code_of(item):
+        owner = get_profile(supabase_client, item["profile_id"])
+        item = {**item, "profiles": {"postal_code": owner.get("postal_code")} if owner else None}
+
+    counterparts = _active_counterparts(supabase_client, item, counterpart_table)
+    scores = matching_ipv4.score_matches(item, counterparts)
+    scored_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    rows = []
+    for counterpart, match_score in zip(counterparts, scores):
+        if match_score <= 0:
+            continue
+        offer, req = (item, counterpart) if item_type == "offer" else (counterpart, item)
+        rows.append({
+            "offer_id": offer["id"],
+            "request_id": req["id"],
+            "score": float(match_score),
+            "status": MatchStatus.pending.value,
+            "scored_at": scored_at,
+        })
+
+    # Upsert, then drop the pairs this run did not rewrite, so readers never
+    # see the item without matches (recompute_matches.py may be writing the
+    # same pairs; its newer rows are kept)
+    for start in range(0, len(rows), MATCH_WRITE_BATCH_SIZE):
+        supabase_client.table("matches")\
+            .upsert(rows[start:start + MATCH_WRITE_BATCH_SIZE], on_conflict="offer_id,request_id")\
+            .execute()
+    supabase_client.table("matches").delete().eq(own_key, item["id"]).lt("scored_at", scored_at).execute()
+    return rows
+
+
+def refresh_matches_for_profile(supabase_client: SupabaseClient, profile_id: str):
+    """Re-score every active offer and request of a profile, e.g. after its postal code changed."""
+    for table, item_type in (("offers", "offer"), ("requests", "request")):
+        items = supabase_client.table(table)\
+            .select("*, profiles(postal_code)")\
+            .eq("profile_id", profile_id)\
+            .eq("is_active", True)\
+            .execute().data or []
+        for item in items:
+            refresh_matches_for_item(supabase_client, item, item_type=item_type)
+
+
+def remove_matches_for_item(supabase_client: SupabaseClient, item_id: int, item_type: Literal["offer", "request"]):
+    supabase_client.table("matches").delete().eq(f"{item_type}_id", item_id).execute()
+
+
+def _active_item_ids_query(supabase_client: SupabaseClient, table: str, profile_id: str):
+    return supabase_client.table(table).select("id").eq("profile_id", profile_id).eq("is_active", True)
+
+
+def _owned_matches_filter(my_offers, my_requests):
+    """PostgREST or-filter for matches rows on any of the given offers/requests, or None."""
+    filters = []
+    if my_offers:
+        filters.append(f"offer_id.in.({','.join(str(o['id']) for o in my_offers)})")
+    if my_requests:
+        filters.append(f"request_id.in.({','.join(str(r['id']) for r in my_requests)})")
+    return ",".join(filters) or None
+
+
+def _stored_matches_query(supabase_client: SupabaseClient, filters: str, limit: int):
+    return supabase_client.table("matches")\
+        .select("score, offers:offer_id(*, profiles(id, full_name, postal_code, karma)), "
+                "requests:request_id(*, profiles(id, full_name, postal_code, karma))")\
+        .or_(filters)\
+        .order("score", desc=True)\
+        .limit(limit)
+
+
+def _potential_match_candidates(rows, existing_pairs: set, top_n: int):
+    candidates = []
+    for row in rows or []:
+        offer, req = row.get("offers"), row.get("requests")
+        if not offer or not req:
+            continue
+        if (offer["id"], req["id"]) in existing_pairs:
+            continue
+        candidates.append((offer, req, row["score"]))
+    return candidates[:top_n]
 
 
+def _potential_matches_params(profile_id: str, top_n: int) -> dict:
+    return {"p_profile_id": profile_id, "p_top_n": top_n, "p_half_km": geolocation.DISTANCE_HALF_KM}
 
 
 def accept_match_request(
@@ -647,33 +868,9 @@ def accept_match_request(
 ):
     """
     Accept a match request. The profile performing the acceptance can be either the offerer or requester.
-    Prevents accepting if the linked offer or request is deactivated.
+    Prevents accepting if the linked offer or request is deactivated (checked
+    inside the accept_match_request() Postgres function).
     """
-    # Fetch match request
-    resp = supabase_client.table("match_requests")\
-        .select("*")\
-        .eq("id", match_request_id)\
-        .execute()
-
-    match_req = resp.data[0] if resp.data else None
-    if not match_req:
-        return None
-
-    # --- Check if linked offer/request are active ---
-    offer_id = match_req.get("offer_id")
-    request_id = match_req.get("request_id")
-
-    if offer_id:
-        offer_resp = supabase_client.table("offers").select("is_active").eq("id", offer_id).execute()
-        if not offer_resp.data or not offer_resp.data[0].get("is_active", True):
-            raise Exception("Cannot accept match: the offer has been deactivated.")
-
-    if request_id:
-        request_resp = supabase_client.table("requests").select("is_active").eq("id", request_id).execute()
-        if not request_resp.data or not request_resp.data[0].get("is_active", True):
-            raise Exception("Cannot accept match: the request has been deactivated.")
-
-    # Call the central updater
     return update_match_request_status(
         supabase_client,
         match_request_id,
@@ -751,5 +948,6 @@ def report_post(
     supabase_client.table("profiles").update({
         "reports": owner_reports + [report_entry]
     }).eq("id", owner_id).execute()
+    invalidate_profiles(owner_id)
 
     return report_entry
@@ -0,0 +1,88 @@
+"""
+Async twin of the read paths in crud_ipv4, for pages that need several
+independent queries. Queries are built by the same helpers as the sync
+versions and awaited concurrently, so a page waits for its slowest query
+rather than the sum of all of them. Run through db_ipv4.run_async_db:
+
+    data = run_async_db(crud_async.load_matches_page, profile_id)
+"""
+import asyncio
+from supabase import AsyncClient
+from data import crud_ipv4 as crud
+
+MATCHES_PAGE_SECTIONS = ("potential", "sent", "received", "completed")
+
+
+# -----------------------------
+# Match Request reads
+# -----------------------------
+async def get_sent_match_requests(supabase_client: AsyncClient, profile_id: str, status: str = None):
+    resp = await crud._sent_match_requests_query(supabase_client, profile_id, status).execute()
+    return crud._with_active_item(resp.data)
+
+
+async def get_incoming_match_requests(supabase_client: AsyncClient, profile_id: str, status: str = None):
+    resp = await crud._incoming_match_requests_query(supabase_client, profile_id, status).execute()
+    return crud._with_active_item(resp.data)
+
+
+async def get_closed_match_requests(supabase_client: AsyncClient, profile_id: str):
+    """Accepted, completed and declined match requests the profile is part of."""
+    resp = await crud._closed_match_requests_query(supabase_client, profile_id).execute()
+    return resp.data or []
+
+
+async def get_existing_match_pairs(supabase_client: AsyncClient, profile_id: str) -> set:
+    resp = await crud._existing_match_pairs_query(supabase_client, profile_id).execute()
+    return crud._match_pairs(resp.data)
+
+
+# -----------------------------
+# MATCH reads
+# -----------------------------
+async def get_stored_potential_matches(supabase_client: AsyncClient, profile_id: str, top_n: int = 10):
+    """
+    Top N precomputed matches for the profile's active offers and requests,
+    skipping pairs that already have a match request; the three lookups run concurrently.
+    """
+    my_offers, my_requests, existing_pairs = await asyncio.gather(
+        crud._active_item_ids_query(supabase_client, "offers", profile_id).execute(),
+        crud._active_item_ids_query(supabase_client, "requests", profile_id).execute(),
+        get_existing_match_pairs(supabase_client, profile_id),
+    )
+    filters = crud._owned_matches_filter(my_offers.data, my_requests.data)
+    if not filters:
+        return []
+
+    resp = await crud._stored_matches_query(supabase_client, filters, top_n + len(existing_pairs)).execute()
+    return crud._potential_match_candidates(resp.data, existing_pairs, top_n)
+
+
+async def get_potential_matches_from_db(supabase_client: AsyncClient, profile_id: str, top_n: int = 10):
+    resp = await supabase_client.rpc("potential_matches", crud._potential_matches_params(profile_id, top_n)).execute()
+    return [(row["offer"], row["request"], row["score"]) for row in resp.data or []]
+
+
+async def get_potential_matches(supabase_client: AsyncClient, profile_id: str, top_n: int = 10):
+    """Potential matches from the backend selected by crud_ipv4.MATCH_SCORING_BACKEND."""
+    if crud.MATCH_SCORING_BACKEND == "database":
+        return await get_potential_matches_from_db(supabase_client, profile_id, top_n=top_n)
+    return await get_stored_potential_matches(supabase_client, profile_id, top_n=top_n)
+
+
+# -----------------------------
+# Page loaders
+# -----------------------------
+async def load_matches_page(supabase_client: AsyncClient, profile_id: str, sections=MATCHES_PAGE_SECTIONS) -> dict:
+    """
+    Fetch the data behind the Matches page sections concurrently.
+    Returns {section: data} for the requested sections.
+    """
+    loaders = {
+        "potential": lambda: get_potential_matches(supabase_client, profile_id),
+        "sent": lambda: get_sent_match_requests(supabase_client, profile_id, status="pending"),
+        "received": lambda: get_incoming_match_requests(supabase_client, profile_id, status="pending"),
+        "completed": lambda: get_closed_match_requests(supabase_client, profile_id),
+    }
+    results = await asyncio.gather(*(loaders[section]() for section in sections))
+    return dict(zip(sections, results))
@@ -1,5 +1,10 @@
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions, AsyncClient, AsyncClientOptions
+from supabase_auth.helpers import decode_jwt
+from collections import OrderedDict
 import streamlit as st
+import threading
+import asyncio
+import time
 import os
 
 # Get Supabase credentials from Streamlit secrets
@@ -9,23 +14,174 @@ SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY")
 if not SUPABASE_URL or not SUPABASE_ANON_KEY:
     raise RuntimeError("Supabase credentials are missing in Streamlit secrets.")
 
+CLIENT_CACHE_SIZE = int(os.environ.get("SUPABASE_CLIENT_CACHE_SIZE", "256"))
+CLIENT_IDLE_SECONDS = int(os.environ.get("SUPABASE_CLIENT_IDLE_SECONDS", "900"))
+# A session is refreshed (and its client rebuilt) once its token is this close to expiry
+AUTH_REFRESH_WINDOW_SECONDS = int(os.environ.get("AUTH_REFRESH_WINDOW_SECONDS", "120"))
+
+# access token -> (client, expires_at, last_used)
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def _new_client() -> Client:
+    # Sessions are refreshed by rebuilding the client, not by a timer thread per client.
+    # No shared httpx_client: postgrest and storage set their base URL and the
+    # user's Authorization header on the client they are given.
+    options = ClientOptions(auto_refresh_token=False, persist_session=False)
+    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY, options)
+
+
+def _token_expires_at(access_token: str) -> float:
+    try:
+        return float(decode_jwt(access_token)["payload"].get("exp") or 0)
+    except Exception:
+        return 0.0
+
+
+def _cached_client(access_token, now):
+    with _clients_lock:
+        # Drop idle clients, least recently used first
+        while _clients:
+            _, (_, _, last_used) = next(iter(_clients.items()))
+            if now - last_used <= CLIENT_IDLE_SECONDS:
+                break
+            _clients.popitem(last=False)
+
+        entry = _clients.get(access_token)
+        if entry is None:
+            return None
+        client, expires_at, _ = entry
+        if expires_at and expires_at - now < AUTH_REFRESH_WINDOW_SECONDS:
+            del _clients[access_token]
+            return None
+        _clients[access_token] = (client, expires_at, now)
+        _clients.move_to_end(access_token)
+        return client
+
+
+def _store_client(access_token, client, expires_at, now):
+    with _clients_lock:
+        _clients[access_token] = (client, expires_at, now)
+        _clients.move_to_end(access_token)
+        while len(_clients) > CLIENT_CACHE_SIZE:
+            _clients.popitem(last=False)
+
 
 def get_db() -> Client:
     """
     Returns a Supabase client bound to the current user's session.
-    Each call creates a new client so sessions are not shared between users.
+    Clients are cached per access token, so sessions are not shared between
+    users and a rerun reuses the client (and its connections) of the last one.
+    Anonymous clients are not cached: login signs in on them.
     """
-    client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    session = st.session_state.get("supabase_session")
+    if not session:
+        return _new_client()
+
+    access_token = session["access_token"]
+    now = time.time()
+    client = _cached_client(access_token, now)
+    if client is not None:
+        return client
 
-    # Rehydrate the user's session if it exists in st.session_state
-    if "supabase_session" in st.session_state:
-        session = st.session_state["supabase_session"]
-        try:
-            client.auth.set_session(
+    # Rehydrate the user's session from st.session_state, refreshing it if it is about to expire
+    client = _new_client()
+    try:
+        if _token_expires_at(access_token) - now < AUTH_REFRESH_WINDOW_SECONDS:
+            auth_resp = client.auth.refresh_session(session["refresh_token"])
+        else:
+            auth_resp = client.auth.set_session(
                 session["access_token"],
                 session["refresh_token"],
             )
-        except Exception as e:
-            st.warning(f"Could not restore Supabase session: {e}")
+    except Exception as e:
+        st.warning(f"Could not restore Supabase session: {e}")
+        return client
 
+    # Keep st.session_state in step when the token was refreshed
+    if auth_resp and auth_resp.session and auth_resp.session.access_token != access_token:
+        access_token = auth_resp.session.access_token
+        st.session_state["supabase_session"] = {
+            "access_token": access_token,
+            "refresh_token": auth_resp.session.refresh_token,
+        }
+    _store_client(access_token, client, _token_expires_at(access_token), now)
     return client
+
+
+def release_db():
+    """Forget the current session's cached client, e.g. after signing out."""
+    session = st.session_state.get("supabase_session")
+    if not session:
+        return
+    with _clients_lock:
+        _clients.pop(session["access_token"], None)
+
+
+# -----------------------------
+# Async clients (data/crud_ipv4_async.py)
+# All run on one background event loop and are cached per access token like
+# the sync clients, each with its own connections: postgrest sets the
+# Authorization header on the httpx client it is given, so sharing one would
+# mix users' tokens. Streamlit's script thread blocks on the result.
+# -----------------------------
+_async_loop = None
+_async_lock = threading.Lock()
+
+# access token -> (client, last_used); only touched on the async loop
+_async_clients = OrderedDict()
+
+
+def _async_runtime():
+    global _async_loop
+    with _async_lock:
+        if _async_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="supabase-async", daemon=True).start()
+            _async_loop = loop
+    return _async_loop
+
+
+def _new_async_client(access_token: str = None) -> AsyncClient:
+    # The token was already verified by ensure_authenticated, so it is used as-is
+    headers = {"Authorization": f"Bearer {access_token}"} if access_token else {}
+    options = AsyncClientOptions(
+        headers=headers,
+        auto_refresh_token=False,
+        persist_session=False,
+    )
+    return AsyncClient(SUPABASE_URL, SUPABASE_ANON_KEY, options)
+
+
+def _async_client(access_token: str = None) -> AsyncClient:
+    now = time.time()
+    # Drop idle clients, least recently used first
+    while _async_clients:
+        _, (_, last_used) = next(iter(_async_clients.items()))
+        if now - last_used <= CLIENT_IDLE_SECONDS:
+            break
+        _async_clients.popitem(last=False)
+
+    entry = _async_clients.get(access_token)
+    client = entry[0] if entry else _new_async_client(access_token)
+    _async_clients[access_token] = (client, now)
+    _async_clients.move_to_end(access_token)
+    while len(_async_clients) > CLIENT_CACHE_SIZE:
+        _async_clients.popitem(last=False)
+    return client
+
+
+def run_async_db(fn, *args, **kwargs):
+    """
+    Run `await fn(async_client, *args, **kwargs)` for the current user and return its result.
+    Call get_db() first in the same rerun so an expiring session is already refreshed.
+    """
+    session = st.session_state.get("supabase_session")
+    access_token = session["access_token"] if session else None
+    loop = _async_runtime()
+
+    async def _run():
+        return await fn(_async_client(access_token), *args, **kwargs)
+
+    return asyncio.run_coroutine_threadsafe(_run(), loop).result()
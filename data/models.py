@@ -1,5 +1,5 @@
 # data/models.py
-from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, Text, Float, DateTime, Enum
+from sqlalchemy import Column, String, Integer, ForeignKey, Boolean, Text, Float, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from data.db import Base
@@ -48,6 +48,12 @@ class Profile(Base):
 # -----------------------------
 class Offer(Base):
     __tablename__ = "offers"
+    __table_args__ = (
+        # Trigram index for ILIKE '%...%' title lookups (services/matching.py)
+        Index("ix_offers_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        # Owner-scoped listing (My Offers / My Requests)
+        Index("ix_offers_profile_id_is_active_created_at", "profile_id", "is_active", "created_at"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     profile_id = Column(String, ForeignKey("profiles.id"))
     title = Column(String(100), nullable=False)
@@ -71,6 +77,12 @@ class Offer(Base):
 # -----------------------------
 class Request(Base):
     __tablename__ = "requests"
+    __table_args__ = (
+        # Trigram index for ILIKE '%...%' title lookups (services/matching.py)
+        Index("ix_requests_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        # Owner-scoped listing (My Offers / My Requests)
+        Index("ix_requests_profile_id_is_active_created_at", "profile_id", "is_active", "created_at"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     profile_id = Column(String, ForeignKey("profiles.id"))
     title = Column(String(100), nullable=False)
@@ -94,12 +106,17 @@ class Request(Base):
 # -----------------------------
 class Match(Base):
     __tablename__ = "matches"
+    __table_args__ = (
+        # One row per pair, so concurrent writers upsert instead of duplicating
+        Index("ix_matches_offer_id_request_id", "offer_id", "request_id", unique=True),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    offer_id = Column(Integer, ForeignKey("offers.id"))
-    request_id = Column(Integer, ForeignKey("requests.id"))
-    score = Column(Float)
+    offer_id = Column(Integer, ForeignKey("offers.id"), index=True)
+    request_id = Column(Integer, ForeignKey("requests.id"), index=True)
+    score = Column(Float, index=True)
     status = Column(Enum(MatchStatus), default=MatchStatus.pending)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    scored_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     offer = relationship("Offer", back_populates="matches")
     request = relationship("Request", back_populates="matches")
@@ -147,3 +164,55 @@ class MatchRequest(Base):
     requester = relationship("Profile", foreign_keys=[requester_id])
     offerer = relationship("Profile", foreign_keys=[offerer_id])
     initiator = relationship("Profile", foreign_keys=[initiator_id])  # <--- new relationship
+
+
+# -----------------------------
+# Karma ledger (append-only)
+# -----------------------------
+class KarmaLedger(Base):
+    __tablename__ = "karma_ledger"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    profile_id = Column(String, ForeignKey("profiles.id"), nullable=False, index=True)
+    delta = Column(Integer, nullable=False)
+    reason = Column(String(50), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    profile = relationship("Profile")
+
+    def __repr__(self):
+        return f"<KarmaLedger(profile_id={self.profile_id}, delta={self.delta}, reason={self.reason})>"
+
+
+# -----------------------------
+# Email outbox (one row per recipient, filled by a trigger on match_requests, drained by email_worker.py)
+# -----------------------------
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+        Index("ix_email_outbox_recipient_id_status", "recipient_id", "status"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(30), nullable=False)  # "match_request" or "match_accepted"
+    match_request_id = Column(Integer, ForeignKey("match_requests.id", ondelete="CASCADE"), nullable=False)
+    recipient_id = Column(String, ForeignKey("profiles.id"), nullable=False)
+    status = Column(String(20), nullable=False, server_default="pending")  # "pending", "sent" or "failed"
+    attempts = Column(Integer, nullable=False, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # lease held by the worker that claimed it
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+
+# -----------------------------
+# PC4 postcode centroids (loaded from services/geolocation's dataset, used by the SQL match scorer)
+# -----------------------------
+class Pc4Coordinate(Base):
+    __tablename__ = "pc4_coordinates"
+
+    pc4 = Column(Integer, primary_key=True, autoincrement=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
@@ -0,0 +1,170 @@
+"""
+Delivery worker for the email outbox.
+
+Match request changes queue their notifications in `email_outbox` inside the
+same transaction, one row per recipient. This process coalesces each
+recipient's entries over a digest window into one summary email, sends
+the summaries of a batch in one bulk call, retries each recipient whose
+digest failed with exponential backoff, and sets `match_requests.notified`
+once the recipient has been told. Run it next to the app:
+
+    python email_worker.py
+"""
+import argparse
+import datetime
+import os
+import time
+from collections import defaultdict
+
+from supabase import create_client
+
+from data import crud_ipv4 as crud
+from services.email_service import send_digest_emails
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+# The outbox and every profile's email are read on behalf of all users;
+# email_outbox has RLS enabled without policies, so only the service role reaches it
+SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+DIGEST_WINDOW_MINUTES = float(os.environ.get("EMAIL_DIGEST_MINUTES", "15"))  # 0 sends as soon as possible
+BATCH_RECIPIENTS = 50
+LEASE_SECONDS = 300  # a claimed entry is retried if the worker dies before finishing it
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 6 * 60 * 60
+MAX_ATTEMPTS = 8
+
+
+def retry_delay(attempts: int) -> int:
+    """Seconds to wait after the given number of failed attempts: 30s, 1m, 2m, ... capped at 6h."""
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def digest_event(entry: dict, match_req: dict, profiles: dict):
+    """What one outbox entry tells its recipient, or None if it is no longer worth saying."""
+    if entry["kind"] == "match_request":
+        # Accepted or declined within the window: the acceptance (if any) says it all
+        if match_req.get("status") != "pending":
+            return None
+        return {"kind": "match_request", "other": profiles.get(match_req.get("initiator_id"))}
+
+    if entry["kind"] == "match_accepted":
+        # Use stored contact info from match_request
+        other_side = "offerer" if entry["recipient_id"] == match_req.get("requester_id") else "requester"
+        return {
+            "kind": "match_accepted",
+            "other": profiles.get(match_req.get(f"{other_side}_id")),
+            "contact": {
+                "mode": match_req.get(f"{other_side}_contact_mode"),
+                "value": match_req.get(f"{other_side}_contact_value"),
+            },
+        }
+
+    print(f"Warning: unknown outbox entry kind: {entry['kind']}")
+    return None
+
+
+def has_email(profile: dict) -> bool:
+    """Whether a profile has an address worth handing to the email provider."""
+    return "@" in (profile.get("email") or "")
+
+
+def drain_once(client, window_minutes: float = DIGEST_WINDOW_MINUTES, max_recipients: int = BATCH_RECIPIENTS) -> int:
+    """Claim, coalesce and send one batch of digests. Returns the number of entries claimed."""
+    entries = crud.claim_email_digests(client, int(window_minutes * 60), max_recipients, LEASE_SECONDS)
+    if not entries:
+        return 0
+
+    match_requests = crud.get_match_requests_by_ids(client, [e["match_request_id"] for e in entries])
+    profiles = crud.get_profiles(client, [e["recipient_id"] for e in entries] + [
+        profile_id
+        for mr in match_requests.values()
+        for profile_id in (mr.get("requester_id"), mr.get("offerer_id"))
+        if profile_id
+    ])
+
+    events_by_recipient = defaultdict(list)
+    skipped_ids = []
+    for entry in sorted(entries, key=lambda e: e["created_at"]):
+        match_req = match_requests.get(entry["match_request_id"])
+        event = digest_event(entry, match_req, profiles) if match_req else None
+        if event is None or event["other"] is None or entry["recipient_id"] not in profiles:
+            skipped_ids.append(entry["id"])
+            continue
+        event["other"] = crud.UserEmailObj(event["other"])
+        events_by_recipient[entry["recipient_id"]].append(event)
+
+    # Nothing to send for these, so they are done
+    crud.mark_emails_sent(client, skipped_ids)
+
+    skipped = set(skipped_ids)
+    sent_entries = [e for e in entries if e["id"] not in skipped]
+
+    # Retrying cannot help a recipient without an address
+    no_email = {recipient_id for recipient_id in events_by_recipient if not has_email(profiles[recipient_id])}
+    if no_email:
+        print(f"Warning: {len(no_email)} recipients have no email address")
+        crud.reschedule_emails(client, [e["id"] for e in sent_entries if e["recipient_id"] in no_email],
+                               "Recipient has no email address.")
+
+    digests = [
+        (crud.UserEmailObj(profiles[recipient_id]), events)
+        for recipient_id, events in events_by_recipient.items()
+        if recipient_id not in no_email
+    ]
+    if not digests:
+        return len(entries)
+
+    # A failure only holds back the recipients it concerns
+    failed_emails = set(send_digest_emails(digests))
+    failed = {
+        recipient_id for recipient_id in events_by_recipient
+        if recipient_id not in no_email and profiles[recipient_id]["email"] in failed_emails
+    }
+    delivered = [e for e in sent_entries if e["recipient_id"] not in no_email and e["recipient_id"] not in failed]
+    crud.mark_match_requests_notified(client, [e["match_request_id"] for e in delivered])
+    crud.mark_emails_sent(client, [e["id"] for e in delivered])
+
+    failed_entries = [e for e in sent_entries if e["recipient_id"] in failed]
+    if not failed_entries:
+        return len(entries)
+
+    error = "Email provider rejected the message."
+    exhausted = [e for e in failed_entries if e["attempts"] >= MAX_ATTEMPTS]
+    if exhausted:
+        print(f"Warning: giving up on {len(exhausted)} outbox entries after {MAX_ATTEMPTS} attempts")
+        crud.reschedule_emails(client, [e["id"] for e in exhausted], error)
+    retry_by_attempts = defaultdict(list)
+    for e in failed_entries:
+        if e["attempts"] < MAX_ATTEMPTS:
+            retry_by_attempts[e["attempts"]].append(e["id"])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for attempts, ids in retry_by_attempts.items():
+        crud.reschedule_emails(client, ids, error, retry_at=now + datetime.timedelta(seconds=retry_delay(attempts)))
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send queued BetterBarter notification emails.")
+    parser.add_argument("--window", type=float, default=DIGEST_WINDOW_MINUTES,
+                        help="minutes to coalesce a recipient's notifications into one digest (0 sends right away)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_RECIPIENTS, help="recipients claimed per round trip")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="seconds to sleep when the outbox is empty")
+    parser.add_argument("--once", action="store_true", help="drain what is due now and exit")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set.")
+
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    while True:
+        claimed = drain_once(client, args.window, args.batch_size)
+        if claimed:
+            print(f"Processed {claimed} outbox entries")
+        elif args.once:
+            break
+        else:
+            time.sleep(args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Load the PC4 postcode centroids into the pc4_coordinates table.
+
+potential_matches() and the matches backfill only use distance decay for
+postcodes found there; the rest fall back to the postcode prefix test. Run
+it once the dataset is in place (see services/geolocation.PC4_CSV_PATH),
+then recompute the stored scores:
+
+    python load_pc4_coordinates.py
+    python recompute_matches.py
+"""
+import argparse
+import os
+
+from supabase import create_client
+
+from services import geolocation
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+# pc4_coordinates is reference data, written with the service role key
+SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+WRITE_BATCH_SIZE = 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load PC4 postcode centroids into Postgres.")
+    parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set.")
+
+    rows = [
+        {"pc4": pc4, "latitude": latitude, "longitude": longitude}
+        for pc4, latitude, longitude in geolocation.pc4_coordinate_rows()
+    ]
+    if not rows:
+        raise RuntimeError(f"No PC4 coordinates found at {geolocation.PC4_CSV_PATH}.")
+
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        client.table("pc4_coordinates").upsert(rows[start:start + WRITE_BATCH_SIZE], on_conflict="pc4").execute()
+    print(f"Loaded {len(rows)} PC4 coordinates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""add match request lifecycle procedures
+
+Revision ID: 0a8e5d2c7b41
+Revises: f2c7a9b31e58
+Create Date: 2026-10-17 15:02:19.370882
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a8e5d2c7b41'
+down_revision: Union[str, Sequence[str], None] = 'f2c7a9b31e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Each function validates, writes and adjusts karma in one transaction and
+# returns the row with the profiles the caller needs for notifications.
+# Error messages match the ones crud_ipv4 raised before.
+CREATE_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION create_match_request(
+    p_caller_id text,
+    p_offer_id integer,
+    p_request_id integer,
+    p_message text,
+    p_contact_mode text,
+    p_contact_value text,
+    p_initiator_type text,
+    p_max_per_day integer
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_target record;
+    v_requester_id text;
+    v_offerer_id text;
+    v_row match_requests;
+BEGIN
+    -- Serialize a caller's concurrent submits so the limit and duplicate checks hold
+    PERFORM pg_advisory_xact_lock(hashtext('match_request:' || p_caller_id));
+
+    IF (
+        SELECT count(*) FROM match_requests
+        WHERE requester_id = p_caller_id
+          AND created_at >= date_trunc('day', now() AT TIME ZONE 'utc')
+    ) >= p_max_per_day THEN
+        RAISE EXCEPTION 'Daily limit of % match requests reached.', p_max_per_day;
+    END IF;
+
+    IF p_offer_id IS NULL AND p_request_id IS NULL THEN
+        RAISE EXCEPTION 'Either offer_id or request_id must be provided.';
+    END IF;
+
+    IF coalesce(p_contact_mode, '') = '' OR coalesce(p_contact_value, '') = '' THEN
+        RAISE EXCEPTION 'Contact mode and contact details must be provided.';
+    END IF;
+
+    IF p_initiator_type = 'request' THEN
+        IF p_offer_id IS NULL THEN
+            RAISE EXCEPTION 'offer_id must be provided when initiator_type=''request''';
+        END IF;
+        SELECT profile_id, is_active INTO v_target FROM offers WHERE id = p_offer_id FOR SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Offer not found';
+        END IF;
+        IF v_target.is_active IS FALSE THEN
+            RAISE EXCEPTION 'Cannot send a match request to a deactivated offer';
+        END IF;
+        IF v_target.profile_id = p_caller_id THEN
+            RAISE EXCEPTION 'Cannot send a match request to your own offer';
+        END IF;
+        v_requester_id := p_caller_id;
+        v_offerer_id := v_target.profile_id;
+    ELSIF p_initiator_type = 'offer' THEN
+        IF p_request_id IS NULL THEN
+            RAISE EXCEPTION 'request_id must be provided when initiator_type=''offer''';
+        END IF;
+        SELECT profile_id, is_active INTO v_target FROM requests WHERE id = p_request_id FOR SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Request not found';
+        END IF;
+        IF v_target.is_active IS FALSE THEN
+            RAISE EXCEPTION 'Cannot send a match request to a deactivated request';
+        END IF;
+        IF v_target.profile_id = p_caller_id THEN
+            RAISE EXCEPTION 'Cannot send a match request to your own request';
+        END IF;
+        v_offerer_id := p_caller_id;
+        v_requester_id := v_target.profile_id;
+    ELSE
+        RAISE EXCEPTION 'Invalid initiator_type. Must be ''request'' or ''offer''.';
+    END IF;
+
+    IF v_requester_id = v_offerer_id THEN
+        RAISE EXCEPTION 'Cannot send a match request to your own item';
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM match_requests
+        WHERE initiator_id = p_caller_id
+          AND (p_request_id IS NULL OR request_id = p_request_id)
+          AND (p_offer_id IS NULL OR offer_id = p_offer_id)
+    ) THEN
+        RAISE EXCEPTION 'You have already sent a match request here.';
+    END IF;
+
+    INSERT INTO match_requests (
+        requester_id, offerer_id, initiator_id, request_id, offer_id, message,
+        status, created_at, updated_at, notified,
+        requester_contact_mode, requester_contact_value,
+        offerer_contact_mode, offerer_contact_value
+    )
+    VALUES (
+        v_requester_id, v_offerer_id, p_caller_id, p_request_id, p_offer_id, p_message,
+        'pending', now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc', false,
+        CASE WHEN p_initiator_type = 'request' THEN p_contact_mode END,
+        CASE WHEN p_initiator_type = 'request' THEN p_contact_value END,
+        CASE WHEN p_initiator_type = 'offer' THEN p_contact_mode END,
+        CASE WHEN p_initiator_type = 'offer' THEN p_contact_value END
+    )
+    RETURNING * INTO v_row;
+
+    PERFORM * FROM apply_karma(jsonb_build_array(
+        jsonb_build_object('profile_id', p_caller_id, 'points', 1, 'reason', 'match_request_sent')
+    ));
+
+    RETURN to_jsonb(v_row) || jsonb_build_object(
+        'requester_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_requester_id),
+        'offerer_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_offerer_id)
+    );
+END;
+$$;
+"""
+
+ACCEPT_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION accept_match_request(
+    p_match_request_id integer,
+    p_profile_id text,
+    p_contact_mode text,
+    p_contact_value text
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_row match_requests;
+    v_owner text;
+    v_deltas jsonb := '[]'::jsonb;
+    v_share_contact boolean := p_contact_mode IS NOT NULL AND p_contact_value IS NOT NULL;
+BEGIN
+    SELECT * INTO v_row FROM match_requests WHERE id = p_match_request_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    IF v_row.offer_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM offers WHERE id = v_row.offer_id AND is_active IS NOT FALSE
+    ) THEN
+        RAISE EXCEPTION 'Cannot accept match: the offer has been deactivated.';
+    END IF;
+    IF v_row.request_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM requests WHERE id = v_row.request_id AND is_active IS NOT FALSE
+    ) THEN
+        RAISE EXCEPTION 'Cannot accept match: the request has been deactivated.';
+    END IF;
+
+    UPDATE match_requests SET
+        status = 'accepted',
+        updated_at = now() AT TIME ZONE 'utc',
+        offerer_contact_mode = CASE WHEN v_share_contact AND p_profile_id = offerer_id
+                                    THEN p_contact_mode ELSE offerer_contact_mode END,
+        offerer_contact_value = CASE WHEN v_share_contact AND p_profile_id = offerer_id
+                                     THEN p_contact_value ELSE offerer_contact_value END,
+        requester_contact_mode = CASE WHEN v_share_contact AND p_profile_id = requester_id AND p_profile_id IS DISTINCT FROM offerer_id
+                                      THEN p_contact_mode ELSE requester_contact_mode END,
+        requester_contact_value = CASE WHEN v_share_contact AND p_profile_id = requester_id AND p_profile_id IS DISTINCT FROM offerer_id
+                                       THEN p_contact_value ELSE requester_contact_value END
+    WHERE id = p_match_request_id
+    RETURNING * INTO v_row;
+
+    -- Deactivate the matched items and reward both sides
+    IF v_row.offer_id IS NOT NULL THEN
+        UPDATE offers SET is_active = false WHERE id = v_row.offer_id RETURNING profile_id INTO v_owner;
+        DELETE FROM matches WHERE offer_id = v_row.offer_id;
+        v_deltas := v_deltas
+            || jsonb_build_array(jsonb_build_object('profile_id', v_owner, 'points', 5, 'reason', 'match_accepted'))
+            || jsonb_build_array(jsonb_build_object('profile_id', v_row.requester_id, 'points', 5, 'reason', 'match_accepted'));
+    END IF;
+    IF v_row.request_id IS NOT NULL THEN
+        UPDATE requests SET is_active = false WHERE id = v_row.request_id RETURNING profile_id INTO v_owner;
+        DELETE FROM matches WHERE request_id = v_row.request_id;
+        v_deltas := v_deltas
+            || jsonb_build_array(jsonb_build_object('profile_id', v_owner, 'points', 5, 'reason', 'match_accepted'))
+            || jsonb_build_array(jsonb_build_object('profile_id', v_row.offerer_id, 'points', 5, 'reason', 'match_accepted'));
+    END IF;
+    PERFORM * FROM apply_karma(v_deltas);
+
+    RETURN to_jsonb(v_row) || jsonb_build_object(
+        'requester_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_row.requester_id),
+        'offerer_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_row.offerer_id)
+    );
+END;
+$$;
+"""
+
+DECLINE_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION decline_match_request(p_match_request_id integer, p_profile_id text)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_row match_requests;
+BEGIN
+    UPDATE match_requests
+    SET status = 'rejected', updated_at = now() AT TIME ZONE 'utc'
+    WHERE id = p_match_request_id
+    RETURNING * INTO v_row;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    RETURN to_jsonb(v_row);
+END;
+$$;
+"""
+
+CANCEL_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION cancel_match_request(p_match_request_id integer, p_requester_id text)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM match_requests
+    WHERE id = p_match_request_id
+      AND requester_id = p_requester_id
+      AND status = 'pending';
+    IF NOT FOUND THEN
+        RETURN false;
+    END IF;
+
+    PERFORM * FROM apply_karma(jsonb_build_array(
+        jsonb_build_object('profile_id', p_requester_id, 'points', -1, 'reason', 'match_request_cancelled')
+    ));
+    RETURN true;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(CREATE_MATCH_REQUEST_SQL)
+    op.execute(ACCEPT_MATCH_REQUEST_SQL)
+    op.execute(DECLINE_MATCH_REQUEST_SQL)
+    op.execute(CANCEL_MATCH_REQUEST_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS cancel_match_request(integer, text)")
+    op.execute("DROP FUNCTION IF EXISTS decline_match_request(integer, text)")
+    op.execute("DROP FUNCTION IF EXISTS accept_match_request(integer, text, text, text)")
+    op.execute("DROP FUNCTION IF EXISTS create_match_request(text, integer, integer, text, text, text, text, integer)")
@@ -0,0 +1,64 @@
+"""backfill matches for existing listings
+
+Revision ID: 3357431b0f16
+Revises: b52b69479fb5
+Create Date: 2026-10-17 19:12:05.731942
+
+"""
+from typing import Sequence, Union
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3357431b0f16'
+down_revision: Union[str, Sequence[str], None] = 'b52b69479fb5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Listings created before the matches table was maintained on write have no
+# rows, so the Matches page shows nothing for them. Score every active pair
+# with the SQL functions potential_matches() uses (the same score as
+# services/matching_ipv4); recompute_matches.py rewrites the same rows.
+BACKFILL_MATCHES_SQL = """
+INSERT INTO matches (offer_id, request_id, score, status, scored_at)
+SELECT s.offer_id, s.request_id, s.score, 'pending', now()
+FROM (
+    WITH o AS MATERIALIZED (
+        SELECT o.id, o.profile_id, o.category, o.subcategory, title_ngrams(o.title) AS grams, p.postal_code
+        FROM offers o JOIN profiles p ON p.id = o.profile_id
+        WHERE o.is_active
+    ), r AS MATERIALIZED (
+        SELECT r.id, r.profile_id, r.category, r.subcategory, title_ngrams(r.title) AS grams, p.postal_code
+        FROM requests r JOIN profiles p ON p.id = r.profile_id
+        WHERE r.is_active
+    )
+    SELECT
+        o.id AS offer_id,
+        r.id AS request_id,
+        0.4 * (o.subcategory IS NOT DISTINCT FROM r.subcategory)::int
+        + 0.35 * title_similarity(o.grams, r.grams)
+        + 0.25 * postal_proximity(o.postal_code, r.postal_code, :half_km) AS score
+    FROM o
+    JOIN r ON r.category IS NOT DISTINCT FROM o.category
+    WHERE o.profile_id <> r.profile_id
+) s
+WHERE s.score > 0
+ON CONFLICT (offer_id, request_id) DO UPDATE SET score = EXCLUDED.score, scored_at = EXCLUDED.scored_at
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Same setting and default as services/geolocation.DISTANCE_HALF_KM
+    half_km = float(os.environ.get("DISTANCE_HALF_KM", 5.0))
+    op.get_bind().execute(sa.text(BACKFILL_MATCHES_SQL), {"half_km": half_km})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Data only: the rows are kept up to date on write from here on
+    pass
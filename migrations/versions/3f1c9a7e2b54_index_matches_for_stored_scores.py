@@ -0,0 +1,32 @@
+"""index matches for stored scores
+
+Revision ID: 3f1c9a7e2b54
+Revises: 628cd4d6a846
+Create Date: 2026-10-17 10:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7e2b54'
+down_revision: Union[str, Sequence[str], None] = '628cd4d6a846'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_matches_offer_id'), 'matches', ['offer_id'], unique=False)
+    op.create_index(op.f('ix_matches_request_id'), 'matches', ['request_id'], unique=False)
+    op.create_index(op.f('ix_matches_score'), 'matches', ['score'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_matches_score'), table_name='matches')
+    op.drop_index(op.f('ix_matches_request_id'), table_name='matches')
+    op.drop_index(op.f('ix_matches_offer_id'), table_name='matches')
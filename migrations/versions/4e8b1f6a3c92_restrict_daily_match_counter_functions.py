@@ -0,0 +1,170 @@
+"""keep the daily match request counter out of clients' reach
+
+Revision ID: 4e8b1f6a3c92
+Revises: d93a6c1e7f20
+Create Date: 2026-10-17 21:19:45.203817
+
+"""
+from typing import Sequence, Union
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8b1f6a3c92'
+down_revision: Union[str, Sequence[str], None] = 'd93a6c1e7f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# claim/release_daily_match_request take any profile id and are only meant
+# to be called from create/cancel_match_request, so clients lose EXECUTE on
+# them. The limit itself moves into create_match_request as well, instead
+# of being a parameter the client sets.
+CREATE_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION create_match_request(
+    p_offer_id integer,
+    p_request_id integer,
+    p_message text,
+    p_contact_mode text,
+    p_contact_value text,
+    p_initiator_type text
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_caller text := auth.uid()::text;
+    v_max_per_day constant integer := 3;  -- crud_ipv4.MAX_MATCH_REQUESTS_PER_DAY
+    v_target record;
+    v_requester_id text;
+    v_offerer_id text;
+    v_row match_requests;
+BEGIN
+    IF v_caller IS NULL THEN
+        RAISE EXCEPTION 'Sign in to send a match request.';
+    END IF;
+
+    -- Serialize a caller's concurrent submits so the duplicate check holds
+    PERFORM pg_advisory_xact_lock(hashtext('match_request:' || v_caller));
+
+    -- O(1) counter on the profile; rolled back with everything else if a later check fails
+    IF NOT claim_daily_match_request(v_caller, v_max_per_day) THEN
+        RAISE EXCEPTION 'Daily limit of % match requests reached.', v_max_per_day;
+    END IF;
+
+    IF p_offer_id IS NULL AND p_request_id IS NULL THEN
+        RAISE EXCEPTION 'Either offer_id or request_id must be provided.';
+    END IF;
+
+    IF coalesce(p_contact_mode, '') = '' OR coalesce(p_contact_value, '') = '' THEN
+        RAISE EXCEPTION 'Contact mode and contact details must be provided.';
+    END IF;
+
+    IF p_initiator_type = 'request' THEN
+        IF p_offer_id IS NULL THEN
+            RAISE EXCEPTION 'offer_id must be provided when initiator_type=''request''';
+        END IF;
+        SELECT profile_id, is_active INTO v_target FROM offers WHERE id = p_offer_id FOR SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Offer not found';
+        END IF;
+        IF v_target.is_active IS FALSE THEN
+            RAISE EXCEPTION 'Cannot send a match request to a deactivated offer';
+        END IF;
+        IF v_target.profile_id = v_caller THEN
+            RAISE EXCEPTION 'Cannot send a match request to your own offer';
+        END IF;
+        v_requester_id := v_caller;
+        v_offerer_id := v_target.profile_id;
+    ELSIF p_initiator_type = 'offer' THEN
+        IF p_request_id IS NULL THEN
+            RAISE EXCEPTION 'request_id must be provided when initiator_type=''offer''';
+        END IF;
+        SELECT profile_id, is_active INTO v_target FROM requests WHERE id = p_request_id FOR SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Request not found';
+        END IF;
+        IF v_target.is_active IS FALSE THEN
+            RAISE EXCEPTION 'Cannot send a match request to a deactivated request';
+        END IF;
+        IF v_target.profile_id = v_caller THEN
+            RAISE EXCEPTION 'Cannot send a match request to your own request';
+        END IF;
+        v_offerer_id := v_caller;
+        v_requester_id := v_target.profile_id;
+    ELSE
+        RAISE EXCEPTION 'Invalid initiator_type. Must be ''request'' or ''offer''.';
+    END IF;
+
+    IF v_requester_id = v_offerer_id THEN
+        RAISE EXCEPTION 'Cannot send a match request to your own item';
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM match_requests
+        WHERE initiator_id = v_caller
+          AND (p_request_id IS NULL OR request_id = p_request_id)
+          AND (p_offer_id IS NULL OR offer_id = p_offer_id)
+    ) THEN
+        RAISE EXCEPTION 'You have already sent a match request here.';
+    END IF;
+
+    INSERT INTO match_requests (
+        requester_id, offerer_id, initiator_id, request_id, offer_id, message,
+        status, created_at, updated_at, notified,
+        requester_contact_mode, requester_contact_value,
+        offerer_contact_mode, offerer_contact_value
+    )
+    VALUES (
+        v_requester_id, v_offerer_id, v_caller, p_request_id, p_offer_id, p_message,
+        'pending', now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc', false,
+        CASE WHEN p_initiator_type = 'request' THEN p_contact_mode END,
+        CASE WHEN p_initiator_type = 'request' THEN p_contact_value END,
+        CASE WHEN p_initiator_type = 'offer' THEN p_contact_mode END,
+        CASE WHEN p_initiator_type = 'offer' THEN p_contact_value END
+    )
+    RETURNING * INTO v_row;
+
+    PERFORM * FROM apply_karma(jsonb_build_array(
+        jsonb_build_object('profile_id', v_caller, 'points', 1, 'reason', 'match_request_sent')
+    ));
+
+    RETURN to_jsonb(v_row) || jsonb_build_object(
+        'requester_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_requester_id),
+        'offerer_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_offerer_id)
+    );
+END;
+$$;
+"""
+
+
+def _previous_revision():
+    """Load the 6b0f3d9e2a57 migration module to restore its function definition."""
+    path = os.path.join(os.path.dirname(__file__), "6b0f3d9e2a57_take_match_request_caller_from_auth_uid.py")
+    spec = importlib.util.spec_from_file_location("_take_match_request_caller_from_auth_uid", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("REVOKE EXECUTE ON FUNCTION claim_daily_match_request(text, integer) FROM PUBLIC, anon, authenticated")
+    op.execute("REVOKE EXECUTE ON FUNCTION release_daily_match_request(text) FROM PUBLIC, anon, authenticated")
+    op.execute("DROP FUNCTION IF EXISTS create_match_request(integer, integer, text, text, text, text, integer)")
+    op.execute(CREATE_MATCH_REQUEST_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    previous = _previous_revision()
+    op.execute("DROP FUNCTION IF EXISTS create_match_request(integer, integer, text, text, text, text)")
+    op.execute(previous.CREATE_MATCH_REQUEST_SQL)
+    op.execute("GRANT EXECUTE ON FUNCTION release_daily_match_request(text) TO PUBLIC, anon, authenticated")
+    op.execute("GRANT EXECUTE ON FUNCTION claim_daily_match_request(text, integer) TO PUBLIC, anon, authenticated")
@@ -0,0 +1,233 @@
+"""use daily_match_count for the match request limit
+
+Revision ID: 5c3d8e1f0a72
+Revises: 0a8e5d2c7b41
+Create Date: 2026-10-17 16:18:44.261093
+
+"""
+from typing import Sequence, Union
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c3d8e1f0a72'
+down_revision: Union[str, Sequence[str], None] = '0a8e5d2c7b41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# profiles.daily_match_count counts today's (UTC) match requests;
+# daily_match_count_reset holds the UTC midnight the count belongs to.
+# The increment only succeeds while the count is below the limit, or when
+# the stored day is over, in which case the count restarts at 1.
+CLAIM_DAILY_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION claim_daily_match_request(p_profile_id text, p_max_per_day integer)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_today timestamp := date_trunc('day', now() AT TIME ZONE 'utc');
+BEGIN
+    UPDATE profiles SET
+        daily_match_count = CASE
+            WHEN daily_match_count_reset IS NULL OR daily_match_count_reset < v_today THEN 1
+            ELSE coalesce(daily_match_count, 0) + 1
+        END,
+        daily_match_count_reset = v_today
+    WHERE id = p_profile_id
+      AND (
+          daily_match_count_reset IS NULL
+          OR daily_match_count_reset < v_today
+          OR coalesce(daily_match_count, 0) < p_max_per_day
+      );
+    RETURN FOUND;
+END;
+$$;
+"""
+
+RELEASE_DAILY_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION release_daily_match_request(p_profile_id text)
+RETURNS void
+LANGUAGE sql
+AS $$
+    UPDATE profiles
+    SET daily_match_count = daily_match_count - 1
+    WHERE id = p_profile_id
+      AND daily_match_count > 0
+      AND daily_match_count_reset = date_trunc('day', now() AT TIME ZONE 'utc');
+$$;
+"""
+
+CREATE_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION create_match_request(
+    p_caller_id text,
+    p_offer_id integer,
+    p_request_id integer,
+    p_message text,
+    p_contact_mode text,
+    p_contact_value text,
+    p_initiator_type text,
+    p_max_per_day integer
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_target record;
+    v_requester_id text;
+    v_offerer_id text;
+    v_row match_requests;
+BEGIN
+    -- Serialize a caller's concurrent submits so the duplicate check holds
+    PERFORM pg_advisory_xact_lock(hashtext('match_request:' || p_caller_id));
+
+    -- O(1) counter on the profile; rolled back with everything else if a later check fails
+    IF NOT claim_daily_match_request(p_caller_id, p_max_per_day) THEN
+        RAISE EXCEPTION 'Daily limit of % match requests reached.', p_max_per_day;
+    END IF;
+
+    IF p_offer_id IS NULL AND p_request_id IS NULL THEN
+        RAISE EXCEPTION 'Either offer_id or request_id must be provided.';
+    END IF;
+
+    IF coalesce(p_contact_mode, '') = '' OR coalesce(p_contact_value, '') = '' THEN
+        RAISE EXCEPTION 'Contact mode and contact details must be provided.';
+    END IF;
+
+    IF p_initiator_type = 'request' THEN
+        IF p_offer_id IS NULL THEN
+            RAISE EXCEPTION 'offer_id must be provided when initiator_type=''request''';
+        END IF;
+        SELECT profile_id, is_active INTO v_target FROM offers WHERE id = p_offer_id FOR SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Offer not found';
+        END IF;
+        IF v_target.is_active IS FALSE THEN
+            RAISE EXCEPTION 'Cannot send a match request to a deactivated offer';
+        END IF;
+        IF v_target.profile_id = p_caller_id THEN
+            RAISE EXCEPTION 'Cannot send a match request to your own offer';
+        END IF;
+        v_requester_id := p_caller_id;
+        v_offerer_id := v_target.profile_id;
+    ELSIF p_initiator_type = 'offer' THEN
+        IF p_request_id IS NULL THEN
+            RAISE EXCEPTION 'request_id must be provided when initiator_type=''offer''';
+        END IF;
+        SELECT profile_id, is_active INTO v_target FROM requests WHERE id = p_request_id FOR SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Request not found';
+        END IF;
+        IF v_target.is_active IS FALSE THEN
+            RAISE EXCEPTION 'Cannot send a match request to a deactivated request';
+        END IF;
+        IF v_target.profile_id = p_caller_id THEN
+            RAISE EXCEPTION 'Cannot send a match request to your own request';
+        END IF;
+        v_offerer_id := p_caller_id;
+        v_requester_id := v_target.profile_id;
+    ELSE
+        RAISE EXCEPTION 'Invalid initiator_type. Must be ''request'' or ''offer''.';
+    END IF;
+
+    IF v_requester_id = v_offerer_id THEN
+        RAISE EXCEPTION 'Cannot send a match request to your own item';
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM match_requests
+        WHERE initiator_id = p_caller_id
+          AND (p_request_id IS NULL OR request_id = p_request_id)
+          AND (p_offer_id IS NULL OR offer_id = p_offer_id)
+    ) THEN
+        RAISE EXCEPTION 'You have already sent a match request here.';
+    END IF;
+
+    INSERT INTO match_requests (
+        requester_id, offerer_id, initiator_id, request_id, offer_id, message,
+        status, created_at, updated_at, notified,
+        requester_contact_mode, requester_contact_value,
+        offerer_contact_mode, offerer_contact_value
+    )
+    VALUES (
+        v_requester_id, v_offerer_id, p_caller_id, p_request_id, p_offer_id, p_message,
+        'pending', now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc', false,
+        CASE WHEN p_initiator_type = 'request' THEN p_contact_mode END,
+        CASE WHEN p_initiator_type = 'request' THEN p_contact_value END,
+        CASE WHEN p_initiator_type = 'offer' THEN p_contact_mode END,
+        CASE WHEN p_initiator_type = 'offer' THEN p_contact_value END
+    )
+    RETURNING * INTO v_row;
+
+    PERFORM * FROM apply_karma(jsonb_build_array(
+        jsonb_build_object('profile_id', p_caller_id, 'points', 1, 'reason', 'match_request_sent')
+    ));
+
+    RETURN to_jsonb(v_row) || jsonb_build_object(
+        'requester_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_requester_id),
+        'offerer_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_offerer_id)
+    );
+END;
+$$;
+"""
+
+# Cancelling a request sent today gives the slot back, as deleting the row did
+# when the limit was a count over match_requests.
+CANCEL_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION cancel_match_request(p_match_request_id integer, p_requester_id text)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_row match_requests;
+BEGIN
+    DELETE FROM match_requests
+    WHERE id = p_match_request_id
+      AND requester_id = p_requester_id
+      AND status = 'pending'
+    RETURNING * INTO v_row;
+    IF NOT FOUND THEN
+        RETURN false;
+    END IF;
+
+    IF v_row.created_at >= date_trunc('day', now() AT TIME ZONE 'utc') THEN
+        PERFORM release_daily_match_request(v_row.initiator_id);
+    END IF;
+
+    PERFORM * FROM apply_karma(jsonb_build_array(
+        jsonb_build_object('profile_id', p_requester_id, 'points', -1, 'reason', 'match_request_cancelled')
+    ));
+    RETURN true;
+END;
+$$;
+"""
+
+
+def _previous_revision():
+    """Load the 0a8e5d2c7b41 migration module to restore its function definitions."""
+    path = os.path.join(os.path.dirname(__file__), "0a8e5d2c7b41_add_match_request_procedures.py")
+    spec = importlib.util.spec_from_file_location("_match_request_procedures", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(CLAIM_DAILY_MATCH_REQUEST_SQL)
+    op.execute(RELEASE_DAILY_MATCH_REQUEST_SQL)
+    op.execute(CREATE_MATCH_REQUEST_SQL)
+    op.execute(CANCEL_MATCH_REQUEST_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    previous = _previous_revision()
+    op.execute(previous.CANCEL_MATCH_REQUEST_SQL)
+    op.execute(previous.CREATE_MATCH_REQUEST_SQL)
+    op.execute("DROP FUNCTION IF EXISTS release_daily_match_request(text)")
+    op.execute("DROP FUNCTION IF EXISTS claim_daily_match_request(text, integer)")
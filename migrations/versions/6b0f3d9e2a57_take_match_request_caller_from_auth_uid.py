@@ -0,0 +1,325 @@
+"""take the caller of the match request procedures from auth.uid()
+
+Revision ID: 6b0f3d9e2a57
+Revises: e2d5b7a90c14
+Create Date: 2026-10-17 20:41:03.118264
+
+"""
+from typing import Sequence, Union
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b0f3d9e2a57'
+down_revision: Union[str, Sequence[str], None] = 'e2d5b7a90c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# These are called over RPC, so a profile id passed by the client proves
+# nothing: the caller is the signed-in user (profiles.id is the auth user
+# id). They run as their owner, so the checks in them are what keeps a
+# client away from other users' match requests.
+CREATE_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION create_match_request(
+    p_offer_id integer,
+    p_request_id integer,
+    p_message text,
+    p_contact_mode text,
+    p_contact_value text,
+    p_initiator_type text,
+    p_max_per_day integer
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_caller text := auth.uid()::text;
+    v_target record;
+    v_requester_id text;
+    v_offerer_id text;
+    v_row match_requests;
+BEGIN
+    IF v_caller IS NULL THEN
+        RAISE EXCEPTION 'Sign in to send a match request.';
+    END IF;
+
+    -- Serialize a caller's concurrent submits so the duplicate check holds
+    PERFORM pg_advisory_xact_lock(hashtext('match_request:' || v_caller));
+
+    -- O(1) counter on the profile; rolled back with everything else if a later check fails
+    IF NOT claim_daily_match_request(v_caller, p_max_per_day) THEN
+        RAISE EXCEPTION 'Daily limit of % match requests reached.', p_max_per_day;
+    END IF;
+
+    IF p_offer_id IS NULL AND p_request_id IS NULL THEN
+        RAISE EXCEPTION 'Either offer_id or request_id must be provided.';
+    END IF;
+
+    IF coalesce(p_contact_mode, '') = '' OR coalesce(p_contact_value, '') = '' THEN
+        RAISE EXCEPTION 'Contact mode and contact details must be provided.';
+    END IF;
+
+    IF p_initiator_type = 'request' THEN
+        IF p_offer_id IS NULL THEN
+            RAISE EXCEPTION 'offer_id must be provided when initiator_type=''request''';
+        END IF;
+        SELECT profile_id, is_active INTO v_target FROM offers WHERE id = p_offer_id FOR SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Offer not found';
+        END IF;
+        IF v_target.is_active IS FALSE THEN
+            RAISE EXCEPTION 'Cannot send a match request to a deactivated offer';
+        END IF;
+        IF v_target.profile_id = v_caller THEN
+            RAISE EXCEPTION 'Cannot send a match request to your own offer';
+        END IF;
+        v_requester_id := v_caller;
+        v_offerer_id := v_target.profile_id;
+    ELSIF p_initiator_type = 'offer' THEN
+        IF p_request_id IS NULL THEN
+            RAISE EXCEPTION 'request_id must be provided when initiator_type=''offer''';
+        END IF;
+        SELECT profile_id, is_active INTO v_target FROM requests WHERE id = p_request_id FOR SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Request not found';
+        END IF;
+        IF v_target.is_active IS FALSE THEN
+            RAISE EXCEPTION 'Cannot send a match request to a deactivated request';
+        END IF;
+        IF v_target.profile_id = v_caller THEN
+            RAISE EXCEPTION 'Cannot send a match request to your own request';
+        END IF;
+        v_offerer_id := v_caller;
+        v_requester_id := v_target.profile_id;
+    ELSE
+        RAISE EXCEPTION 'Invalid initiator_type. Must be ''request'' or ''offer''.';
+    END IF;
+
+    IF v_requester_id = v_offerer_id THEN
+        RAISE EXCEPTION 'Cannot send a match request to your own item';
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM match_requests
+        WHERE initiator_id = v_caller
+          AND (p_request_id IS NULL OR request_id = p_request_id)
+          AND (p_offer_id IS NULL OR offer_id = p_offer_id)
+    ) THEN
+        RAISE EXCEPTION 'You have already sent a match request here.';
+    END IF;
+
+    INSERT INTO match_requests (
+        requester_id, offerer_id, initiator_id, request_id, offer_id, message,
+        status, created_at, updated_at, notified,
+        requester_contact_mode, requester_contact_value,
+        offerer_contact_mode, offerer_contact_value
+    )
+    VALUES (
+        v_requester_id, v_offerer_id, v_caller, p_request_id, p_offer_id, p_message,
+        'pending', now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc', false,
+        CASE WHEN p_initiator_type = 'request' THEN p_contact_mode END,
+        CASE WHEN p_initiator_type = 'request' THEN p_contact_value END,
+        CASE WHEN p_initiator_type = 'offer' THEN p_contact_mode END,
+        CASE WHEN p_initiator_type = 'offer' THEN p_contact_value END
+    )
+    RETURNING * INTO v_row;
+
+    PERFORM * FROM apply_karma(jsonb_build_array(
+        jsonb_build_object('profile_id', v_caller, 'points', 1, 'reason', 'match_request_sent')
+    ));
+
+    RETURN to_jsonb(v_row) || jsonb_build_object(
+        'requester_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_requester_id),
+        'offerer_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_offerer_id)
+    );
+END;
+$$;
+"""
+
+ACCEPT_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION accept_match_request(
+    p_match_request_id integer,
+    p_contact_mode text,
+    p_contact_value text
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_caller text := auth.uid()::text;
+    v_row match_requests;
+    v_owner text;
+    v_deltas jsonb := '[]'::jsonb;
+    v_share_contact boolean := p_contact_mode IS NOT NULL AND p_contact_value IS NOT NULL;
+BEGIN
+    SELECT * INTO v_row FROM match_requests WHERE id = p_match_request_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    IF v_caller IS NULL
+       OR v_caller IS NOT DISTINCT FROM v_row.initiator_id
+       OR v_caller IS DISTINCT FROM v_row.requester_id AND v_caller IS DISTINCT FROM v_row.offerer_id THEN
+        RAISE EXCEPTION 'Only the recipient of a match request can accept it.';
+    END IF;
+    IF v_row.status IS DISTINCT FROM 'pending' THEN
+        RAISE EXCEPTION 'This match request is no longer pending.';
+    END IF;
+
+    IF v_row.offer_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM offers WHERE id = v_row.offer_id AND is_active IS NOT FALSE
+    ) THEN
+        RAISE EXCEPTION 'Cannot accept match: the offer has been deactivated.';
+    END IF;
+    IF v_row.request_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM requests WHERE id = v_row.request_id AND is_active IS NOT FALSE
+    ) THEN
+        RAISE EXCEPTION 'Cannot accept match: the request has been deactivated.';
+    END IF;
+
+    UPDATE match_requests SET
+        status = 'accepted',
+        updated_at = now() AT TIME ZONE 'utc',
+        offerer_contact_mode = CASE WHEN v_share_contact AND v_caller = offerer_id
+                                    THEN p_contact_mode ELSE offerer_contact_mode END,
+        offerer_contact_value = CASE WHEN v_share_contact AND v_caller = offerer_id
+                                     THEN p_contact_value ELSE offerer_contact_value END,
+        requester_contact_mode = CASE WHEN v_share_contact AND v_caller = requester_id AND v_caller IS DISTINCT FROM offerer_id
+                                      THEN p_contact_mode ELSE requester_contact_mode END,
+        requester_contact_value = CASE WHEN v_share_contact AND v_caller = requester_id AND v_caller IS DISTINCT FROM offerer_id
+                                       THEN p_contact_value ELSE requester_contact_value END
+    WHERE id = p_match_request_id
+    RETURNING * INTO v_row;
+
+    -- Deactivate the matched items and reward both sides
+    IF v_row.offer_id IS NOT NULL THEN
+        UPDATE offers SET is_active = false WHERE id = v_row.offer_id RETURNING profile_id INTO v_owner;
+        DELETE FROM matches WHERE offer_id = v_row.offer_id;
+        v_deltas := v_deltas
+            || jsonb_build_array(jsonb_build_object('profile_id', v_owner, 'points', 5, 'reason', 'match_accepted'))
+            || jsonb_build_array(jsonb_build_object('profile_id', v_row.requester_id, 'points', 5, 'reason', 'match_accepted'));
+    END IF;
+    IF v_row.request_id IS NOT NULL THEN
+        UPDATE requests SET is_active = false WHERE id = v_row.request_id RETURNING profile_id INTO v_owner;
+        DELETE FROM matches WHERE request_id = v_row.request_id;
+        v_deltas := v_deltas
+            || jsonb_build_array(jsonb_build_object('profile_id', v_owner, 'points', 5, 'reason', 'match_accepted'))
+            || jsonb_build_array(jsonb_build_object('profile_id', v_row.offerer_id, 'points', 5, 'reason', 'match_accepted'));
+    END IF;
+    PERFORM * FROM apply_karma(v_deltas);
+
+    RETURN to_jsonb(v_row) || jsonb_build_object(
+        'requester_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_row.requester_id),
+        'offerer_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_row.offerer_id)
+    );
+END;
+$$;
+"""
+
+DECLINE_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION decline_match_request(p_match_request_id integer)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_caller text := auth.uid()::text;
+    v_row match_requests;
+BEGIN
+    SELECT * INTO v_row FROM match_requests WHERE id = p_match_request_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    IF v_caller IS NULL
+       OR v_caller IS NOT DISTINCT FROM v_row.initiator_id
+       OR v_caller IS DISTINCT FROM v_row.requester_id AND v_caller IS DISTINCT FROM v_row.offerer_id THEN
+        RAISE EXCEPTION 'Only the recipient of a match request can decline it.';
+    END IF;
+    IF v_row.status IS DISTINCT FROM 'pending' THEN
+        RAISE EXCEPTION 'This match request is no longer pending.';
+    END IF;
+
+    UPDATE match_requests
+    SET status = 'rejected', updated_at = now() AT TIME ZONE 'utc'
+    WHERE id = p_match_request_id
+    RETURNING * INTO v_row;
+    RETURN to_jsonb(v_row);
+END;
+$$;
+"""
+
+CANCEL_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION cancel_match_request(p_match_request_id integer)
+RETURNS boolean
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_caller text := auth.uid()::text;
+    v_row match_requests;
+BEGIN
+    DELETE FROM match_requests
+    WHERE id = p_match_request_id
+      AND requester_id = v_caller
+      AND status = 'pending'
+    RETURNING * INTO v_row;
+    IF NOT FOUND THEN
+        RETURN false;
+    END IF;
+
+    IF v_row.created_at >= date_trunc('day', now() AT TIME ZONE 'utc') THEN
+        PERFORM release_daily_match_request(v_row.initiator_id);
+    END IF;
+
+    PERFORM * FROM apply_karma(jsonb_build_array(
+        jsonb_build_object('profile_id', v_caller, 'points', -1, 'reason', 'match_request_cancelled')
+    ));
+    RETURN true;
+END;
+$$;
+"""
+
+
+def _load_revision(file_name: str):
+    """Load an earlier migration module to restore its function definitions."""
+    path = os.path.join(os.path.dirname(__file__), file_name)
+    spec = importlib.util.spec_from_file_location(f"_{os.path.splitext(file_name)[0]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS create_match_request(text, integer, integer, text, text, text, text, integer)")
+    op.execute("DROP FUNCTION IF EXISTS accept_match_request(integer, text, text, text)")
+    op.execute("DROP FUNCTION IF EXISTS decline_match_request(integer, text)")
+    op.execute("DROP FUNCTION IF EXISTS cancel_match_request(integer, text)")
+    op.execute(CREATE_MATCH_REQUEST_SQL)
+    op.execute(ACCEPT_MATCH_REQUEST_SQL)
+    op.execute(DECLINE_MATCH_REQUEST_SQL)
+    op.execute(CANCEL_MATCH_REQUEST_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    limit = _load_revision("5c3d8e1f0a72_use_daily_match_count_for_limit.py")
+    answers = _load_revision("f7b8c8744240_check_caller_in_match_request_answers.py")
+    op.execute("DROP FUNCTION IF EXISTS create_match_request(integer, integer, text, text, text, text, integer)")
+    op.execute("DROP FUNCTION IF EXISTS accept_match_request(integer, text, text)")
+    op.execute("DROP FUNCTION IF EXISTS decline_match_request(integer)")
+    op.execute("DROP FUNCTION IF EXISTS cancel_match_request(integer)")
+    op.execute(limit.CREATE_MATCH_REQUEST_SQL)
+    op.execute(answers.ACCEPT_MATCH_REQUEST_SQL)
+    op.execute(answers.DECLINE_MATCH_REQUEST_SQL)
+    op.execute(limit.CANCEL_MATCH_REQUEST_SQL)
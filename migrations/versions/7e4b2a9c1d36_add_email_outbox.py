@@ -0,0 +1,92 @@
+"""add email outbox
+
+Revision ID: 7e4b2a9c1d36
+Revises: 5c3d8e1f0a72
+Create Date: 2026-10-17 16:52:07.918305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e4b2a9c1d36'
+down_revision: Union[str, Sequence[str], None] = '5c3d8e1f0a72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Notifications are queued by a trigger, so they commit or roll back together
+# with the match request change that caused them, whichever path wrote it.
+ENQUEUE_MATCH_REQUEST_EMAIL_SQL = """
+CREATE OR REPLACE FUNCTION enqueue_match_request_email()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.status = 'pending' THEN
+        INSERT INTO email_outbox (kind, match_request_id) VALUES ('match_request', NEW.id);
+    ELSIF TG_OP = 'UPDATE' AND NEW.status = 'accepted' AND OLD.status IS DISTINCT FROM 'accepted' THEN
+        INSERT INTO email_outbox (kind, match_request_id) VALUES ('match_accepted', NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER match_requests_enqueue_email
+AFTER INSERT OR UPDATE OF status ON match_requests
+FOR EACH ROW EXECUTE FUNCTION enqueue_match_request_email();
+"""
+
+# Hands out due entries to one worker at a time. Claimed rows are pushed
+# p_lease_seconds into the future, so a crashed worker's batch is retried.
+CLAIM_EMAIL_OUTBOX_SQL = """
+CREATE OR REPLACE FUNCTION claim_email_outbox(p_batch_size integer, p_lease_seconds integer)
+RETURNS SETOF email_outbox
+LANGUAGE sql
+AS $$
+    UPDATE email_outbox o SET
+        attempts = o.attempts + 1,
+        next_attempt_at = now() + make_interval(secs => p_lease_seconds)
+    FROM (
+        SELECT id FROM email_outbox
+        WHERE status = 'pending' AND next_attempt_at <= now()
+        ORDER BY next_attempt_at
+        LIMIT p_batch_size
+        FOR UPDATE SKIP LOCKED
+    ) due
+    WHERE o.id = due.id
+    RETURNING o.*;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('email_outbox',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('kind', sa.String(length=30), nullable=False),
+    sa.Column('match_request_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['match_request_id'], ['match_requests.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_email_outbox_status_next_attempt_at', 'email_outbox', ['status', 'next_attempt_at'], unique=False)
+    op.execute(ENQUEUE_MATCH_REQUEST_EMAIL_SQL)
+    op.execute(CLAIM_EMAIL_OUTBOX_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS claim_email_outbox(integer, integer)")
+    op.execute("DROP TRIGGER IF EXISTS match_requests_enqueue_email ON match_requests")
+    op.execute("DROP FUNCTION IF EXISTS enqueue_match_request_email()")
+    op.drop_index('ix_email_outbox_status_next_attempt_at', table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,149 @@
+"""add email outbox recipients for digests
+
+Revision ID: 9d1f6b3e8a25
+Revises: 7e4b2a9c1d36
+Create Date: 2026-10-17 17:48:31.504127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d1f6b3e8a25'
+down_revision: Union[str, Sequence[str], None] = '7e4b2a9c1d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# One outbox row per recipient, so a recipient's events can be coalesced:
+# a new request notifies the side that did not send it, an acceptance both.
+ENQUEUE_MATCH_REQUEST_EMAIL_SQL = """
+CREATE OR REPLACE FUNCTION enqueue_match_request_email()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.status = 'pending' THEN
+        INSERT INTO email_outbox (kind, match_request_id, recipient_id)
+        VALUES ('match_request', NEW.id,
+                CASE WHEN NEW.initiator_id = NEW.requester_id THEN NEW.offerer_id ELSE NEW.requester_id END);
+    ELSIF TG_OP = 'UPDATE' AND NEW.status = 'accepted' AND OLD.status IS DISTINCT FROM 'accepted' THEN
+        INSERT INTO email_outbox (kind, match_request_id, recipient_id)
+        VALUES ('match_accepted', NEW.id, NEW.requester_id),
+               ('match_accepted', NEW.id, NEW.offerer_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+"""
+
+# Claims every pending entry of up to p_max_recipients recipients whose
+# oldest pending entry has waited p_window_seconds. A recipient is skipped
+# while any of its entries is leased or backing off after a failure.
+CLAIM_EMAIL_DIGESTS_SQL = """
+CREATE OR REPLACE FUNCTION claim_email_digests(p_window_seconds integer, p_max_recipients integer, p_lease_seconds integer)
+RETURNS SETOF email_outbox
+LANGUAGE sql
+AS $$
+    WITH due AS (
+        SELECT recipient_id FROM email_outbox
+        WHERE status = 'pending'
+        GROUP BY recipient_id
+        HAVING min(created_at) <= now() - make_interval(secs => p_window_seconds)
+           AND max(next_attempt_at) <= now()
+        ORDER BY min(created_at)
+        LIMIT p_max_recipients
+    ), claimed AS (
+        SELECT o.id FROM email_outbox o
+        JOIN due ON due.recipient_id = o.recipient_id
+        WHERE o.status = 'pending'
+        FOR UPDATE OF o SKIP LOCKED
+    )
+    UPDATE email_outbox o SET
+        attempts = o.attempts + 1,
+        next_attempt_at = now() + make_interval(secs => p_lease_seconds)
+    FROM claimed
+    WHERE o.id = claimed.id
+    RETURNING o.*;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('email_outbox', sa.Column('recipient_id', sa.String(), nullable=True))
+    op.create_foreign_key('email_outbox_recipient_id_fkey', 'email_outbox', 'profiles', ['recipient_id'], ['id'])
+
+    # Address the entries still waiting: acceptances get a second row for the offerer
+    op.execute("""
+        UPDATE email_outbox o SET recipient_id = CASE
+            WHEN o.kind = 'match_accepted' OR mr.initiator_id <> mr.requester_id THEN mr.requester_id
+            ELSE mr.offerer_id
+        END
+        FROM match_requests mr
+        WHERE mr.id = o.match_request_id
+    """)
+    op.execute("""
+        INSERT INTO email_outbox (kind, match_request_id, recipient_id, status, attempts, next_attempt_at, created_at)
+        SELECT o.kind, o.match_request_id, mr.offerer_id, o.status, o.attempts, o.next_attempt_at, o.created_at
+        FROM email_outbox o JOIN match_requests mr ON mr.id = o.match_request_id
+        WHERE o.kind = 'match_accepted' AND o.status = 'pending'
+    """)
+    op.execute("DELETE FROM email_outbox WHERE recipient_id IS NULL")
+    op.alter_column('email_outbox', 'recipient_id', nullable=False)
+
+    op.create_index('ix_email_outbox_recipient_id_status', 'email_outbox', ['recipient_id', 'status'], unique=False)
+    op.execute(ENQUEUE_MATCH_REQUEST_EMAIL_SQL)
+    op.execute(CLAIM_EMAIL_DIGESTS_SQL)
+    op.execute("DROP FUNCTION IF EXISTS claim_email_outbox(integer, integer)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Restore the 7e4b2a9c1d36 trigger function and claim_email_outbox()
+    op.execute("""
+        CREATE OR REPLACE FUNCTION enqueue_match_request_email()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' AND NEW.status = 'pending' THEN
+                INSERT INTO email_outbox (kind, match_request_id) VALUES ('match_request', NEW.id);
+            ELSIF TG_OP = 'UPDATE' AND NEW.status = 'accepted' AND OLD.status IS DISTINCT FROM 'accepted' THEN
+                INSERT INTO email_outbox (kind, match_request_id) VALUES ('match_accepted', NEW.id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION claim_email_outbox(p_batch_size integer, p_lease_seconds integer)
+        RETURNS SETOF email_outbox
+        LANGUAGE sql
+        AS $$
+            UPDATE email_outbox o SET
+                attempts = o.attempts + 1,
+                next_attempt_at = now() + make_interval(secs => p_lease_seconds)
+            FROM (
+                SELECT id FROM email_outbox
+                WHERE status = 'pending' AND next_attempt_at <= now()
+                ORDER BY next_attempt_at
+                LIMIT p_batch_size
+                FOR UPDATE SKIP LOCKED
+            ) due
+            WHERE o.id = due.id
+            RETURNING o.*;
+        $$;
+    """)
+    op.execute("DROP FUNCTION IF EXISTS claim_email_digests(integer, integer, integer)")
+    # The old worker emailed both sides of an acceptance from a single row
+    op.execute("""
+        DELETE FROM email_outbox o USING match_requests mr
+        WHERE mr.id = o.match_request_id AND o.kind = 'match_accepted' AND o.recipient_id = mr.offerer_id
+    """)
+    op.drop_index('ix_email_outbox_recipient_id_status', table_name='email_outbox')
+    op.drop_constraint('email_outbox_recipient_id_fkey', 'email_outbox', type_='foreignkey')
+    op.drop_column('email_outbox', 'recipient_id')
@@ -0,0 +1,149 @@
+"""score title grams once per row in potential_matches
+
+Revision ID: a0c4e7d25b81
+Revises: 4e8b1f6a3c92
+Create Date: 2026-10-17 21:38:52.774105
+
+"""
+from typing import Sequence, Union
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a0c4e7d25b81'
+down_revision: Union[str, Sequence[str], None] = '4e8b1f6a3c92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Parts of title_similarity, so a listing's norm is computed once rather
+# than for every pair it is in
+TITLE_NORM_SQL = """
+CREATE OR REPLACE FUNCTION title_norm(a jsonb)
+RETURNS double precision
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT coalesce(sqrt(sum(x.value::float8 ^ 2)), 0) FROM jsonb_each_text(a) x;
+$$;
+"""
+
+TITLE_DOT_SQL = """
+CREATE OR REPLACE FUNCTION title_dot(a jsonb, b jsonb)
+RETURNS double precision
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT coalesce(sum(x.value::float8 * (b ->> x.key)::float8), 0) FROM jsonb_each_text(a) x WHERE b ? x.key;
+$$;
+"""
+
+# Same score as before. The grams and norm of each listing that can pair
+# with one of the profile's are built once, in materialized CTEs, instead
+# of title_ngrams() running on both titles of every candidate pair.
+POTENTIAL_MATCHES_SQL = """
+CREATE OR REPLACE FUNCTION potential_matches(
+    p_profile_id text,
+    p_top_n integer DEFAULT 10,
+    p_half_km double precision DEFAULT 5.0
+)
+RETURNS TABLE (offer jsonb, request jsonb, score double precision)
+LANGUAGE plpgsql STABLE
+AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH o AS MATERIALIZED (
+        SELECT o.id, o.profile_id, o.category, o.subcategory, g.grams, title_norm(g.grams) AS norm, p.postal_code
+        FROM offers o
+        JOIN profiles p ON p.id = o.profile_id
+        CROSS JOIN LATERAL (SELECT title_ngrams(o.title) AS grams) g
+        WHERE o.is_active
+          AND (
+              o.profile_id = p_profile_id
+              OR EXISTS (
+                  SELECT 1 FROM requests mine
+                  WHERE mine.profile_id = p_profile_id AND mine.is_active
+                    AND mine.category IS NOT DISTINCT FROM o.category
+              )
+          )
+    ), r AS MATERIALIZED (
+        SELECT r.id, r.profile_id, r.category, r.subcategory, g.grams, title_norm(g.grams) AS norm, p.postal_code
+        FROM requests r
+        JOIN profiles p ON p.id = r.profile_id
+        CROSS JOIN LATERAL (SELECT title_ngrams(r.title) AS grams) g
+        WHERE r.is_active
+          AND (
+              r.profile_id = p_profile_id
+              OR EXISTS (
+                  SELECT 1 FROM offers mine
+                  WHERE mine.profile_id = p_profile_id AND mine.is_active
+                    AND mine.category IS NOT DISTINCT FROM r.category
+              )
+          )
+    ), scored AS (
+        SELECT
+            o.id AS offer_id,
+            r.id AS request_id,
+            0.4 * (o.subcategory IS NOT DISTINCT FROM r.subcategory)::int
+            + 0.35 * coalesce(title_dot(o.grams, r.grams) / nullif(o.norm * r.norm, 0), 0)
+            + 0.25 * postal_proximity(o.postal_code, r.postal_code, p_half_km) AS score
+        FROM o
+        JOIN r ON r.category IS NOT DISTINCT FROM o.category
+        WHERE o.profile_id <> r.profile_id
+          AND (o.profile_id = p_profile_id OR r.profile_id = p_profile_id)
+          AND NOT EXISTS (
+              SELECT 1 FROM match_requests mr
+              WHERE mr.offer_id = o.id
+                AND mr.request_id = r.id
+                AND (mr.requester_id = p_profile_id OR mr.offerer_id = p_profile_id)
+          )
+    ), top AS (
+        SELECT * FROM scored s
+        WHERE s.score > 0
+        ORDER BY s.score DESC
+        LIMIT p_top_n
+    )
+    SELECT
+        to_jsonb(o) || jsonb_build_object('profiles', jsonb_build_object(
+            'id', op.id, 'full_name', op.full_name, 'postal_code', op.postal_code, 'karma', op.karma
+        )),
+        to_jsonb(r) || jsonb_build_object('profiles', jsonb_build_object(
+            'id', rp.id, 'full_name', rp.full_name, 'postal_code', rp.postal_code, 'karma', rp.karma
+        )),
+        t.score
+    FROM top t
+    JOIN offers o ON o.id = t.offer_id
+    JOIN requests r ON r.id = t.request_id
+    JOIN profiles op ON op.id = o.profile_id
+    JOIN profiles rp ON rp.id = r.profile_id
+    ORDER BY t.score DESC;
+END;
+$$;
+"""
+
+
+def _previous_revision():
+    """Load the a686c0a59103 migration module to restore its function definition."""
+    path = os.path.join(os.path.dirname(__file__), "a686c0a59103_add_pc4_coordinates.py")
+    spec = importlib.util.spec_from_file_location("_add_pc4_coordinates", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(TITLE_NORM_SQL)
+    op.execute(TITLE_DOT_SQL)
+    op.execute(POTENTIAL_MATCHES_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    previous = _previous_revision()
+    op.execute(previous.POTENTIAL_MATCHES_SQL)
+    op.execute("DROP FUNCTION IF EXISTS title_dot(jsonb, jsonb)")
+    op.execute("DROP FUNCTION IF EXISTS title_norm(jsonb)")
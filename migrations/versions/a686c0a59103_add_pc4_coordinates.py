@@ -0,0 +1,133 @@
+"""add pc4 coordinates and distance decay to potential_matches
+
+Revision ID: a686c0a59103
+Revises: ea16d9701f24
+Create Date: 2026-10-17 18:31:12.664091
+
+"""
+from typing import Sequence, Union
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a686c0a59103'
+down_revision: Union[str, Sequence[str], None] = 'ea16d9701f24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# matching_ipv4.proximity_scores: distance decay between PC4 centroids
+# (0.5 at p_half_km) when both postcodes are geocoded, else the prefix test.
+# The table is filled by load_pc4_coordinates.py; until then every pair
+# uses the prefix test, as the Python scorer does without the dataset.
+POSTAL_PROXIMITY_SQL = """
+CREATE OR REPLACE FUNCTION postal_proximity(a text, b text, p_half_km double precision)
+RETURNS double precision
+LANGUAGE sql STABLE
+AS $$
+    SELECT CASE
+        WHEN ca.pc4 IS NOT NULL AND cb.pc4 IS NOT NULL THEN exp(-ln(2) * (
+            2 * 6371 * asin(sqrt(least(greatest(
+                sin(radians(cb.latitude - ca.latitude) / 2) ^ 2
+                + cos(radians(ca.latitude)) * cos(radians(cb.latitude)) * sin(radians(cb.longitude - ca.longitude) / 2) ^ 2,
+            0), 1)))
+        ) / p_half_km)
+        ELSE (coalesce(a, '') <> '' AND coalesce(b, '') <> '' AND left(a, 3) = left(b, 3))::int::float8
+    END
+    FROM (SELECT 1) one
+    LEFT JOIN pc4_coordinates ca ON ca.pc4 = substring(a FROM '^\\s*(\\d{4})')::int
+    LEFT JOIN pc4_coordinates cb ON cb.pc4 = substring(b FROM '^\\s*(\\d{4})')::int;
+$$;
+"""
+
+POTENTIAL_MATCHES_SQL = """
+CREATE OR REPLACE FUNCTION potential_matches(
+    p_profile_id text,
+    p_top_n integer DEFAULT 10,
+    p_half_km double precision DEFAULT 5.0
+)
+RETURNS TABLE (offer jsonb, request jsonb, score double precision)
+LANGUAGE plpgsql STABLE
+AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH scored AS (
+        SELECT
+            o.id AS offer_id,
+            r.id AS request_id,
+            0.4 * (o.subcategory IS NOT DISTINCT FROM r.subcategory)::int
+            + 0.35 * title_similarity(title_ngrams(o.title), title_ngrams(r.title))
+            + 0.25 * postal_proximity(op.postal_code, rp.postal_code, p_half_km) AS score
+        FROM offers o
+        JOIN requests r ON r.category IS NOT DISTINCT FROM o.category
+        JOIN profiles op ON op.id = o.profile_id
+        JOIN profiles rp ON rp.id = r.profile_id
+        WHERE o.is_active
+          AND r.is_active
+          AND o.profile_id <> r.profile_id
+          AND (o.profile_id = p_profile_id OR r.profile_id = p_profile_id)
+          AND NOT EXISTS (
+              SELECT 1 FROM match_requests mr
+              WHERE mr.offer_id = o.id
+                AND mr.request_id = r.id
+                AND (mr.requester_id = p_profile_id OR mr.offerer_id = p_profile_id)
+          )
+    )
+    SELECT
+        to_jsonb(o) || jsonb_build_object('profiles', jsonb_build_object(
+            'id', op.id, 'full_name', op.full_name, 'postal_code', op.postal_code, 'karma', op.karma
+        )),
+        to_jsonb(r) || jsonb_build_object('profiles', jsonb_build_object(
+            'id', rp.id, 'full_name', rp.full_name, 'postal_code', rp.postal_code, 'karma', rp.karma
+        )),
+        s.score
+    FROM scored s
+    JOIN offers o ON o.id = s.offer_id
+    JOIN requests r ON r.id = s.request_id
+    JOIN profiles op ON op.id = o.profile_id
+    JOIN profiles rp ON rp.id = r.profile_id
+    WHERE s.score > 0
+    ORDER BY s.score DESC
+    LIMIT p_top_n;
+END;
+$$;
+"""
+
+
+def _previous_revision():
+    """Load the ea16d9701f24 migration module to restore its function definitions."""
+    path = os.path.join(os.path.dirname(__file__), "ea16d9701f24_score_potential_matches_like_python.py")
+    spec = importlib.util.spec_from_file_location("_score_potential_matches_like_python", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('pc4_coordinates',
+    sa.Column('pc4', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('pc4')
+    )
+
+    op.execute("DROP FUNCTION IF EXISTS potential_matches(text, integer)")
+    op.execute("DROP FUNCTION IF EXISTS postal_proximity(text, text)")
+    op.execute(POSTAL_PROXIMITY_SQL)
+    op.execute(POTENTIAL_MATCHES_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    previous = _previous_revision()
+    op.execute("DROP FUNCTION IF EXISTS potential_matches(text, integer, double precision)")
+    op.execute("DROP FUNCTION IF EXISTS postal_proximity(text, text, double precision)")
+    op.execute(previous.POSTAL_PROXIMITY_SQL)
+    op.execute(previous.POTENTIAL_MATCHES_SQL)
+    op.drop_table('pc4_coordinates')
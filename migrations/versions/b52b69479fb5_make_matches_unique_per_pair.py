@@ -0,0 +1,64 @@
+"""make matches unique per pair and add prune_stale_matches
+
+Revision ID: b52b69479fb5
+Revises: a686c0a59103
+Create Date: 2026-10-17 18:54:37.208815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b52b69479fb5'
+down_revision: Union[str, Sequence[str], None] = 'a686c0a59103'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Deletes rows last scored before p_scored_before whose offer is in one of
+# p_categories (NULL in the array for uncategorized offers); a NULL array
+# means every category. recompute_matches.py calls it after rewriting.
+PRUNE_STALE_MATCHES_SQL = """
+CREATE OR REPLACE FUNCTION prune_stale_matches(p_scored_before timestamptz, p_categories text[] DEFAULT NULL)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_deleted integer;
+BEGIN
+    DELETE FROM matches m
+    WHERE m.scored_at < p_scored_before
+      AND (
+          p_categories IS NULL
+          OR EXISTS (
+              SELECT 1 FROM offers o
+              WHERE o.id = m.offer_id AND array_position(p_categories, o.category::text) IS NOT NULL
+          )
+      );
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    RETURN v_deleted;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the newest row of each duplicated pair
+    op.execute("""
+        DELETE FROM matches a USING matches b
+        WHERE a.offer_id = b.offer_id AND a.request_id = b.request_id AND a.id < b.id
+    """)
+    op.add_column('matches', sa.Column('scored_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.create_index('ix_matches_offer_id_request_id', 'matches', ['offer_id', 'request_id'], unique=True)
+    op.execute(PRUNE_STALE_MATCHES_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS prune_stale_matches(timestamptz, text[])")
+    op.drop_index('ix_matches_offer_id_request_id', table_name='matches')
+    op.drop_column('matches', 'scored_at')
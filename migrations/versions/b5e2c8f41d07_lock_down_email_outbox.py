@@ -0,0 +1,41 @@
+"""keep the email outbox out of clients' reach
+
+Revision ID: b5e2c8f41d07
+Revises: a0c4e7d25b81
+Create Date: 2026-10-17 22:41:12.618304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e2c8f41d07'
+down_revision: Union[str, Sequence[str], None] = 'a0c4e7d25b81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# email_outbox holds every user's pending notifications and is only read by
+# email_worker.py with the service role key, which bypasses RLS. With RLS on
+# and no policies, anon/authenticated clients see and change nothing, so the
+# trigger that queues entries from a client's match request update now runs
+# as its owner.
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE email_outbox ENABLE ROW LEVEL SECURITY")
+    op.execute("ALTER FUNCTION enqueue_match_request_email() SECURITY DEFINER SET search_path = public")
+    op.execute("REVOKE EXECUTE ON FUNCTION enqueue_match_request_email() FROM PUBLIC, anon, authenticated")
+    op.execute("REVOKE EXECUTE ON FUNCTION claim_email_digests(integer, integer, integer) FROM PUBLIC, anon, authenticated")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("GRANT EXECUTE ON FUNCTION claim_email_digests(integer, integer, integer) TO PUBLIC, anon, authenticated")
+    op.execute("GRANT EXECUTE ON FUNCTION enqueue_match_request_email() TO PUBLIC, anon, authenticated")
+    op.execute("ALTER FUNCTION enqueue_match_request_email() SECURITY INVOKER RESET search_path")
+    op.execute("ALTER TABLE email_outbox DISABLE ROW LEVEL SECURITY")
@@ -0,0 +1,81 @@
+"""add potential_matches function
+
+Revision ID: b7d2e4f19c06
+Revises: 3f1c9a7e2b54
+Create Date: 2026-10-17 11:04:52.918337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e4f19c06'
+down_revision: Union[str, Sequence[str], None] = '3f1c9a7e2b54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Same weights as services/matching_ipv4.WEIGHTS: subcategory 0.4,
+# title similarity 0.35 (pg_trgm), postal code prefix 0.25.
+POTENTIAL_MATCHES_SQL = """
+CREATE OR REPLACE FUNCTION potential_matches(p_profile_id text, p_top_n integer DEFAULT 10)
+RETURNS TABLE (offer jsonb, request jsonb, score double precision)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        to_jsonb(o) || jsonb_build_object('profiles', jsonb_build_object(
+            'id', op.id, 'full_name', op.full_name, 'postal_code', op.postal_code, 'karma', op.karma
+        )) AS offer,
+        to_jsonb(r) || jsonb_build_object('profiles', jsonb_build_object(
+            'id', rp.id, 'full_name', rp.full_name, 'postal_code', rp.postal_code, 'karma', rp.karma
+        )) AS request,
+        s.score
+    FROM (
+        SELECT
+            o.id AS offer_id,
+            r.id AS request_id,
+            0.4 * (o.subcategory IS NOT DISTINCT FROM r.subcategory)::int
+            + 0.35 * similarity(lower(o.title), lower(r.title))
+            + 0.25 * coalesce(
+                nullif(op.postal_code, '') IS NOT NULL
+                AND left(op.postal_code, 3) = left(rp.postal_code, 3),
+                false
+            )::int AS score
+        FROM offers o
+        JOIN requests r ON r.category IS NOT DISTINCT FROM o.category
+        JOIN profiles op ON op.id = o.profile_id
+        JOIN profiles rp ON rp.id = r.profile_id
+        WHERE o.is_active
+          AND r.is_active
+          AND o.profile_id <> r.profile_id
+          AND (o.profile_id = p_profile_id OR r.profile_id = p_profile_id)
+          AND NOT EXISTS (
+              SELECT 1 FROM match_requests mr
+              WHERE mr.offer_id = o.id
+                AND mr.request_id = r.id
+                AND (mr.requester_id = p_profile_id OR mr.offerer_id = p_profile_id)
+          )
+    ) s
+    JOIN offers o ON o.id = s.offer_id
+    JOIN requests r ON r.id = s.request_id
+    JOIN profiles op ON op.id = o.profile_id
+    JOIN profiles rp ON rp.id = r.profile_id
+    WHERE s.score > 0
+    ORDER BY s.score DESC
+    LIMIT p_top_n;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(POTENTIAL_MATCHES_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS potential_matches(text, integer)")
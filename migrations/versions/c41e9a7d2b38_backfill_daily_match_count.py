@@ -0,0 +1,49 @@
+"""backfill daily_match_count from today's match requests
+
+Revision ID: c41e9a7d2b38
+Revises: f7b8c8744240
+Create Date: 2026-10-17 19:48:21.507316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e9a7d2b38'
+down_revision: Union[str, Sequence[str], None] = 'f7b8c8744240'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Requests sent today (UTC) before create_match_request kept the counter
+# were never counted, so those profiles could send a full quota again.
+# claim_daily_match_request charges the initiator; older rows may not
+# have one, in which case the requester sent them.
+BACKFILL_DAILY_MATCH_COUNT_SQL = """
+UPDATE profiles p SET
+    daily_match_count = t.n,
+    daily_match_count_reset = t.today
+FROM (
+    SELECT coalesce(initiator_id, requester_id) AS profile_id,
+           date_trunc('day', now() AT TIME ZONE 'utc') AS today,
+           count(*) AS n
+    FROM match_requests
+    WHERE created_at >= date_trunc('day', now() AT TIME ZONE 'utc')
+    GROUP BY 1
+) t
+WHERE p.id = t.profile_id
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(BACKFILL_DAILY_MATCH_COUNT_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Data only: the counters stay valid for the previous revision
+    pass
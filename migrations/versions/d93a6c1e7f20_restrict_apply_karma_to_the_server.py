@@ -0,0 +1,71 @@
+"""restrict apply_karma to the server and award listing karma in triggers
+
+Revision ID: d93a6c1e7f20
+Revises: 6b0f3d9e2a57
+Create Date: 2026-10-17 21:02:17.650428
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd93a6c1e7f20'
+down_revision: Union[str, Sequence[str], None] = '6b0f3d9e2a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# apply_karma takes any {profile_id, points}, so clients may no longer call
+# it; only the match request procedures and these triggers do. Creating and
+# deleting a listing is worth a fixed amount: offers 3, requests 1.
+LISTING_KARMA_SQL = """
+CREATE OR REPLACE FUNCTION award_listing_karma()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_points integer := CASE TG_TABLE_NAME WHEN 'offers' THEN 3 ELSE 1 END;
+    v_kind text := CASE TG_TABLE_NAME WHEN 'offers' THEN 'offer' ELSE 'request' END;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM * FROM apply_karma(jsonb_build_array(
+            jsonb_build_object('profile_id', NEW.profile_id, 'points', v_points, 'reason', v_kind || '_created')
+        ));
+        RETURN NEW;
+    END IF;
+    PERFORM * FROM apply_karma(jsonb_build_array(
+        jsonb_build_object('profile_id', OLD.profile_id, 'points', -v_points, 'reason', v_kind || '_deleted')
+    ));
+    RETURN OLD;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("REVOKE EXECUTE ON FUNCTION apply_karma(jsonb) FROM PUBLIC, anon, authenticated")
+    op.execute(LISTING_KARMA_SQL)
+    op.execute("REVOKE EXECUTE ON FUNCTION award_listing_karma() FROM PUBLIC, anon, authenticated")
+    for table in ("offers", "requests"):
+        op.execute(f"""
+            CREATE TRIGGER {table}_award_karma
+            AFTER INSERT OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION award_listing_karma()
+        """)
+    # Written only by SECURITY DEFINER functions; no client policies
+    op.execute("ALTER TABLE karma_ledger ENABLE ROW LEVEL SECURITY")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE karma_ledger DISABLE ROW LEVEL SECURITY")
+    for table in ("offers", "requests"):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_award_karma ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS award_listing_karma()")
+    op.execute("GRANT EXECUTE ON FUNCTION apply_karma(jsonb) TO PUBLIC, anon, authenticated")
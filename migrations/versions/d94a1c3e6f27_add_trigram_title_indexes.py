@@ -0,0 +1,33 @@
+"""add trigram title indexes
+
+Revision ID: d94a1c3e6f27
+Revises: b7d2e4f19c06
+Create Date: 2026-10-17 12:21:08.553604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd94a1c3e6f27'
+down_revision: Union[str, Sequence[str], None] = 'b7d2e4f19c06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_offers_title_trgm', 'offers', ['title'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_requests_title_trgm', 'requests', ['title'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_requests_title_trgm', table_name='requests')
+    op.drop_index('ix_offers_title_trgm', table_name='offers')
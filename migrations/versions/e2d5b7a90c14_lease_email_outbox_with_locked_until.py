@@ -0,0 +1,78 @@
+"""lease email outbox entries with locked_until
+
+Revision ID: e2d5b7a90c14
+Revises: c41e9a7d2b38
+Create Date: 2026-10-17 20:06:39.842710
+
+"""
+from typing import Sequence, Union
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2d5b7a90c14'
+down_revision: Union[str, Sequence[str], None] = 'c41e9a7d2b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# A claim leases entries through locked_until rather than next_attempt_at,
+# which is left to the retry backoff. The lease is checked in the locking
+# subquery, so Postgres re-evaluates it on rows another worker claimed and
+# committed meanwhile, and two workers never get the same entry.
+CLAIM_EMAIL_DIGESTS_SQL = """
+CREATE OR REPLACE FUNCTION claim_email_digests(p_window_seconds integer, p_max_recipients integer, p_lease_seconds integer)
+RETURNS SETOF email_outbox
+LANGUAGE sql
+AS $$
+    WITH due AS (
+        SELECT recipient_id FROM email_outbox
+        WHERE status = 'pending'
+        GROUP BY recipient_id
+        HAVING min(created_at) <= now() - make_interval(secs => p_window_seconds)
+           AND max(next_attempt_at) <= now()
+           AND coalesce(max(locked_until), '-infinity') <= now()
+        ORDER BY min(created_at)
+        LIMIT p_max_recipients
+    ), claimed AS (
+        SELECT o.id FROM email_outbox o
+        JOIN due ON due.recipient_id = o.recipient_id
+        WHERE o.status = 'pending'
+          AND o.next_attempt_at <= now()
+          AND (o.locked_until IS NULL OR o.locked_until <= now())
+        FOR UPDATE OF o SKIP LOCKED
+    )
+    UPDATE email_outbox o SET
+        attempts = o.attempts + 1,
+        locked_until = now() + make_interval(secs => p_lease_seconds)
+    FROM claimed
+    WHERE o.id = claimed.id
+    RETURNING o.*;
+$$;
+"""
+
+
+def _previous_revision():
+    """Load the 9d1f6b3e8a25 migration module to restore its function definition."""
+    path = os.path.join(os.path.dirname(__file__), "9d1f6b3e8a25_add_email_outbox_recipients.py")
+    spec = importlib.util.spec_from_file_location("_email_outbox_recipients", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('email_outbox', sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True))
+    op.execute(CLAIM_EMAIL_DIGESTS_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    previous = _previous_revision()
+    op.execute(previous.CLAIM_EMAIL_DIGESTS_SQL)
+    op.drop_column('email_outbox', 'locked_until')
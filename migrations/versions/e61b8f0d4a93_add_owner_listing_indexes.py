@@ -0,0 +1,32 @@
+"""add owner listing indexes
+
+Revision ID: e61b8f0d4a93
+Revises: d94a1c3e6f27
+Create Date: 2026-10-17 13:02:47.118290
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e61b8f0d4a93'
+down_revision: Union[str, Sequence[str], None] = 'd94a1c3e6f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_offers_profile_id_is_active_created_at', 'offers',
+                    ['profile_id', 'is_active', 'created_at'], unique=False)
+    op.create_index('ix_requests_profile_id_is_active_created_at', 'requests',
+                    ['profile_id', 'is_active', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_requests_profile_id_is_active_created_at', table_name='requests')
+    op.drop_index('ix_offers_profile_id_is_active_created_at', table_name='offers')
@@ -0,0 +1,139 @@
+"""score potential_matches like services/matching_ipv4
+
+Revision ID: ea16d9701f24
+Revises: 9d1f6b3e8a25
+Create Date: 2026-10-17 18:02:44.120583
+
+"""
+from typing import Sequence, Union
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ea16d9701f24'
+down_revision: Union[str, Sequence[str], None] = '9d1f6b3e8a25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Character trigram counts of a lower-cased, space-padded title, as
+# matching_ipv4._ngrams builds them: {"gram": count}.
+TITLE_NGRAMS_SQL = """
+CREATE OR REPLACE FUNCTION title_ngrams(p_title text)
+RETURNS jsonb
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT coalesce(jsonb_object_agg(gram, n), '{}'::jsonb)
+    FROM (
+        SELECT substr(padded, i, 3) AS gram, count(*) AS n
+        FROM (SELECT ' ' || lower(p_title) || ' ' AS padded WHERE coalesce(p_title, '') <> '') t,
+             generate_series(1, greatest(length(padded) - 2, 1)) i
+        GROUP BY 1
+    ) g;
+$$;
+"""
+
+# Cosine similarity of two title_ngrams() vectors, as TitleMatrix.similarity
+TITLE_SIMILARITY_SQL = """
+CREATE OR REPLACE FUNCTION title_similarity(a jsonb, b jsonb)
+RETURNS double precision
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT coalesce(
+        (SELECT sum(x.value::float8 * (b ->> x.key)::float8) FROM jsonb_each_text(a) x WHERE b ? x.key)
+        / nullif(sqrt(
+            (SELECT sum(x.value::float8 ^ 2) FROM jsonb_each_text(a) x)
+            * (SELECT sum(y.value::float8 ^ 2) FROM jsonb_each_text(b) y)
+        ), 0),
+        0
+    );
+$$;
+"""
+
+# matching_ipv4.is_nearby
+POSTAL_PROXIMITY_SQL = """
+CREATE OR REPLACE FUNCTION postal_proximity(a text, b text)
+RETURNS double precision
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT (coalesce(a, '') <> '' AND coalesce(b, '') <> '' AND left(a, 3) = left(b, 3))::int::float8;
+$$;
+"""
+
+# Same score as matching_ipv4.score_matches (WEIGHTS: subcategory 0.4,
+# title 0.35, postal code 0.25), so both backends rank alike.
+POTENTIAL_MATCHES_SQL = """
+CREATE OR REPLACE FUNCTION potential_matches(p_profile_id text, p_top_n integer DEFAULT 10)
+RETURNS TABLE (offer jsonb, request jsonb, score double precision)
+LANGUAGE sql STABLE
+AS $$
+    WITH scored AS (
+        SELECT
+            o.id AS offer_id,
+            r.id AS request_id,
+            0.4 * (o.subcategory IS NOT DISTINCT FROM r.subcategory)::int
+            + 0.35 * title_similarity(title_ngrams(o.title), title_ngrams(r.title))
+            + 0.25 * postal_proximity(op.postal_code, rp.postal_code) AS score
+        FROM offers o
+        JOIN requests r ON r.category IS NOT DISTINCT FROM o.category
+        JOIN profiles op ON op.id = o.profile_id
+        JOIN profiles rp ON rp.id = r.profile_id
+        WHERE o.is_active
+          AND r.is_active
+          AND o.profile_id <> r.profile_id
+          AND (o.profile_id = p_profile_id OR r.profile_id = p_profile_id)
+          AND NOT EXISTS (
+              SELECT 1 FROM match_requests mr
+              WHERE mr.offer_id = o.id
+                AND mr.request_id = r.id
+                AND (mr.requester_id = p_profile_id OR mr.offerer_id = p_profile_id)
+          )
+    )
+    SELECT
+        to_jsonb(o) || jsonb_build_object('profiles', jsonb_build_object(
+            'id', op.id, 'full_name', op.full_name, 'postal_code', op.postal_code, 'karma', op.karma
+        )) AS offer,
+        to_jsonb(r) || jsonb_build_object('profiles', jsonb_build_object(
+            'id', rp.id, 'full_name', rp.full_name, 'postal_code', rp.postal_code, 'karma', rp.karma
+        )) AS request,
+        s.score
+    FROM scored s
+    JOIN offers o ON o.id = s.offer_id
+    JOIN requests r ON r.id = s.request_id
+    JOIN profiles op ON op.id = o.profile_id
+    JOIN profiles rp ON rp.id = r.profile_id
+    WHERE s.score > 0
+    ORDER BY s.score DESC
+    LIMIT p_top_n;
+$$;
+"""
+
+
+def _previous_revision():
+    """Load the b7d2e4f19c06 migration module to restore its function definition."""
+    path = os.path.join(os.path.dirname(__file__), "b7d2e4f19c06_add_potential_matches_function.py")
+    spec = importlib.util.spec_from_file_location("_potential_matches_function", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(TITLE_NGRAMS_SQL)
+    op.execute(TITLE_SIMILARITY_SQL)
+    op.execute(POSTAL_PROXIMITY_SQL)
+    op.execute(POTENTIAL_MATCHES_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    previous = _previous_revision()
+    op.execute(previous.POTENTIAL_MATCHES_SQL)
+    op.execute("DROP FUNCTION IF EXISTS postal_proximity(text, text)")
+    op.execute("DROP FUNCTION IF EXISTS title_similarity(jsonb, jsonb)")
+    op.execute("DROP FUNCTION IF EXISTS title_ngrams(text)")
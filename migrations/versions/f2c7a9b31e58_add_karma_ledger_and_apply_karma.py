@@ -0,0 +1,68 @@
+"""add karma ledger and apply_karma function
+
+Revision ID: f2c7a9b31e58
+Revises: e61b8f0d4a93
+Create Date: 2026-10-17 14:10:36.704415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c7a9b31e58'
+down_revision: Union[str, Sequence[str], None] = 'e61b8f0d4a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# p_deltas: [{"profile_id": ..., "points": ..., "reason": ...}, ...]
+APPLY_KARMA_SQL = """
+CREATE OR REPLACE FUNCTION apply_karma(p_deltas jsonb)
+RETURNS TABLE (profile_id text, karma integer)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+    INSERT INTO karma_ledger (profile_id, delta, reason)
+    SELECT d->>'profile_id', (d->>'points')::int, d->>'reason'
+    FROM jsonb_array_elements(p_deltas) AS d
+    JOIN profiles p ON p.id = d->>'profile_id';
+
+    RETURN QUERY
+    UPDATE profiles p
+    SET karma = coalesce(p.karma, 0) + t.points
+    FROM (
+        SELECT d->>'profile_id' AS id, sum((d->>'points')::int)::int AS points
+        FROM jsonb_array_elements(p_deltas) AS d
+        GROUP BY 1
+    ) t
+    WHERE p.id = t.id
+    RETURNING p.id::text, p.karma;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('karma_ledger',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('profile_id', sa.String(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['profile_id'], ['profiles.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_karma_ledger_profile_id'), 'karma_ledger', ['profile_id'], unique=False)
+    op.execute(APPLY_KARMA_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS apply_karma(jsonb)")
+    op.drop_index(op.f('ix_karma_ledger_profile_id'), table_name='karma_ledger')
+    op.drop_table('karma_ledger')
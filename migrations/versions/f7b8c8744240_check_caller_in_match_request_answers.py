@@ -0,0 +1,154 @@
+"""check the caller and status in accept/decline_match_request
+
+Revision ID: f7b8c8744240
+Revises: 3357431b0f16
+Create Date: 2026-10-17 19:31:48.290516
+
+"""
+from typing import Sequence, Union
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7b8c8744240'
+down_revision: Union[str, Sequence[str], None] = '3357431b0f16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Only the side that did not initiate a request may answer it, and only
+# while it is pending; anything else raises instead of updating the row.
+ACCEPT_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION accept_match_request(
+    p_match_request_id integer,
+    p_profile_id text,
+    p_contact_mode text,
+    p_contact_value text
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_row match_requests;
+    v_owner text;
+    v_deltas jsonb := '[]'::jsonb;
+    v_share_contact boolean := p_contact_mode IS NOT NULL AND p_contact_value IS NOT NULL;
+BEGIN
+    SELECT * INTO v_row FROM match_requests WHERE id = p_match_request_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    IF p_profile_id IS NULL
+       OR p_profile_id IS NOT DISTINCT FROM v_row.initiator_id
+       OR p_profile_id IS DISTINCT FROM v_row.requester_id AND p_profile_id IS DISTINCT FROM v_row.offerer_id THEN
+        RAISE EXCEPTION 'Only the recipient of a match request can accept it.';
+    END IF;
+    IF v_row.status IS DISTINCT FROM 'pending' THEN
+        RAISE EXCEPTION 'This match request is no longer pending.';
+    END IF;
+
+    IF v_row.offer_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM offers WHERE id = v_row.offer_id AND is_active IS NOT FALSE
+    ) THEN
+        RAISE EXCEPTION 'Cannot accept match: the offer has been deactivated.';
+    END IF;
+    IF v_row.request_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM requests WHERE id = v_row.request_id AND is_active IS NOT FALSE
+    ) THEN
+        RAISE EXCEPTION 'Cannot accept match: the request has been deactivated.';
+    END IF;
+
+    UPDATE match_requests SET
+        status = 'accepted',
+        updated_at = now() AT TIME ZONE 'utc',
+        offerer_contact_mode = CASE WHEN v_share_contact AND p_profile_id = offerer_id
+                                    THEN p_contact_mode ELSE offerer_contact_mode END,
+        offerer_contact_value = CASE WHEN v_share_contact AND p_profile_id = offerer_id
+                                     THEN p_contact_value ELSE offerer_contact_value END,
+        requester_contact_mode = CASE WHEN v_share_contact AND p_profile_id = requester_id AND p_profile_id IS DISTINCT FROM offerer_id
+                                      THEN p_contact_mode ELSE requester_contact_mode END,
+        requester_contact_value = CASE WHEN v_share_contact AND p_profile_id = requester_id AND p_profile_id IS DISTINCT FROM offerer_id
+                                       THEN p_contact_value ELSE requester_contact_value END
+    WHERE id = p_match_request_id
+    RETURNING * INTO v_row;
+
+    -- Deactivate the matched items and reward both sides
+    IF v_row.offer_id IS NOT NULL THEN
+        UPDATE offers SET is_active = false WHERE id = v_row.offer_id RETURNING profile_id INTO v_owner;
+        DELETE FROM matches WHERE offer_id = v_row.offer_id;
+        v_deltas := v_deltas
+            || jsonb_build_array(jsonb_build_object('profile_id', v_owner, 'points', 5, 'reason', 'match_accepted'))
+            || jsonb_build_array(jsonb_build_object('profile_id', v_row.requester_id, 'points', 5, 'reason', 'match_accepted'));
+    END IF;
+    IF v_row.request_id IS NOT NULL THEN
+        UPDATE requests SET is_active = false WHERE id = v_row.request_id RETURNING profile_id INTO v_owner;
+        DELETE FROM matches WHERE request_id = v_row.request_id;
+        v_deltas := v_deltas
+            || jsonb_build_array(jsonb_build_object('profile_id', v_owner, 'points', 5, 'reason', 'match_accepted'))
+            || jsonb_build_array(jsonb_build_object('profile_id', v_row.offerer_id, 'points', 5, 'reason', 'match_accepted'));
+    END IF;
+    PERFORM * FROM apply_karma(v_deltas);
+
+    RETURN to_jsonb(v_row) || jsonb_build_object(
+        'requester_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_row.requester_id),
+        'offerer_profile', (SELECT to_jsonb(p) FROM profiles p WHERE p.id = v_row.offerer_id)
+    );
+END;
+$$;
+"""
+
+DECLINE_MATCH_REQUEST_SQL = """
+CREATE OR REPLACE FUNCTION decline_match_request(p_match_request_id integer, p_profile_id text)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_row match_requests;
+BEGIN
+    SELECT * INTO v_row FROM match_requests WHERE id = p_match_request_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    IF p_profile_id IS NULL
+       OR p_profile_id IS NOT DISTINCT FROM v_row.initiator_id
+       OR p_profile_id IS DISTINCT FROM v_row.requester_id AND p_profile_id IS DISTINCT FROM v_row.offerer_id THEN
+        RAISE EXCEPTION 'Only the recipient of a match request can decline it.';
+    END IF;
+    IF v_row.status IS DISTINCT FROM 'pending' THEN
+        RAISE EXCEPTION 'This match request is no longer pending.';
+    END IF;
+
+    UPDATE match_requests
+    SET status = 'rejected', updated_at = now() AT TIME ZONE 'utc'
+    WHERE id = p_match_request_id
+    RETURNING * INTO v_row;
+    RETURN to_jsonb(v_row);
+END;
+$$;
+"""
+
+
+def _previous_revision():
+    """Load the 0a8e5d2c7b41 migration module to restore its function definitions."""
+    path = os.path.join(os.path.dirname(__file__), "0a8e5d2c7b41_add_match_request_procedures.py")
+    spec = importlib.util.spec_from_file_location("_match_request_procedures", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(ACCEPT_MATCH_REQUEST_SQL)
+    op.execute(DECLINE_MATCH_REQUEST_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    previous = _previous_revision()
+    op.execute(previous.ACCEPT_MATCH_REQUEST_SQL)
+    op.execute(previous.DECLINE_MATCH_REQUEST_SQL)
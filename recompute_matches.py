@@ -0,0 +1,163 @@
+"""
+Offline recomputation of the matches table.
+
+Scores every active offer against every active request, one category per
+worker process (plus one for uncategorized listings and one for categories
+outside CATEGORIES), and upserts the results into `matches`. Pairs the
+run did not rewrite are then pruned. Run nightly or after bulk imports:
+
+    python recompute_matches.py --workers 4
+"""
+import argparse
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from supabase import create_client
+
+from services.matching_ipv4 import score_shard
+from utils.helpers import CATEGORIES
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+# The job writes on behalf of every profile, so prefer the service role key
+SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("SUPABASE_ANON_KEY")
+
+WRITE_BATCH_SIZE = 500
+FETCH_PAGE_SIZE = 1000  # at most PostgREST's max-rows, or pages come back short
+
+# Work units besides the CATEGORIES keys
+UNCATEGORIZED = "(uncategorized)"
+OTHER_CATEGORIES = "(other categories)"  # categories no longer (or never) in CATEGORIES
+BUCKETS = list(CATEGORIES.keys()) + [UNCATEGORIZED, OTHER_CATEGORIES]
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _in_bucket(query, bucket: str):
+    if bucket == UNCATEGORIZED:
+        return query.is_("category", "null")
+    if bucket == OTHER_CATEGORIES:
+        return query.not_.in_("category", list(CATEGORIES.keys()))
+    return query.eq("category", bucket)
+
+
+def _fetch_active(client, table: str, bucket: str):
+    """Active listings of one bucket, fetched in id order one page at a time."""
+    rows, last_id = [], 0
+    while True:
+        query = client.table(table)\
+            .select("id, profile_id, title, category, subcategory, profiles(postal_code)")\
+            .eq("is_active", True)\
+            .gt("id", last_id)
+        page = _in_bucket(query, bucket).order("id").limit(FETCH_PAGE_SIZE).execute().data or []
+        if not page:
+            return rows
+        rows.extend(page)
+        last_id = page[-1]["id"]
+
+
+def _by_category(items) -> dict:
+    grouped = {}
+    for item in items:
+        grouped.setdefault(item.get("category"), []).append(item)
+    return grouped
+
+
+def recompute_category(bucket: str, scored_at: str) -> dict:
+    """
+    Worker entry point: rescore one bucket and upsert its matches with
+    `scored_at`. Rows it no longer produces are left for prune_stale_matches.
+    """
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    offers = _by_category(_fetch_active(client, "offers", bucket))
+    requests = _by_category(_fetch_active(client, "requests", bucket))
+
+    started = time.perf_counter()
+    pairs, pairs_scored = [], 0
+    for category, category_offers in offers.items():
+        category_requests = requests.get(category, [])
+        pairs.extend(score_shard(category_offers, category_requests))
+        pairs_scored += len(category_offers) * len(category_requests)
+    elapsed = time.perf_counter() - started
+
+    rows = [
+        {"offer_id": offer_id, "request_id": request_id, "score": score, "status": "pending", "scored_at": scored_at}
+        for offer_id, request_id, score in pairs
+    ]
+    for batch in _chunks(rows, WRITE_BATCH_SIZE):
+        client.table("matches").upsert(batch, on_conflict="offer_id,request_id").execute()
+
+    if bucket == UNCATEGORIZED:
+        categories = [None]
+    elif bucket == OTHER_CATEGORIES:
+        categories = list(set(offers) | set(requests))
+    else:
+        categories = [bucket]
+
+    return {
+        "category": bucket,
+        "categories": categories,
+        "pid": os.getpid(),
+        "pairs_scored": pairs_scored,
+        "matches_written": len(rows),
+        "scoring_seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute potential matches for all profiles.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--category", action="append", choices=BUCKETS,
+                        help="only recompute these categories (repeatable)")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY (or SUPABASE_ANON_KEY) must be set.")
+
+    buckets = args.category or BUCKETS
+    scored_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    started = time.perf_counter()
+    total_pairs = 0
+    pruned_categories, failed = [], []
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(recompute_category, bucket, scored_at): bucket for bucket in buckets}
+        for future in as_completed(futures):
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"{futures[future]}: failed: {e}")
+                failed.append(futures[future])
+                continue
+            rate = stats["pairs_scored"] / stats["scoring_seconds"] if stats["scoring_seconds"] else 0.0
+            total_pairs += stats["pairs_scored"]
+            pruned_categories.extend(stats["categories"])
+            print(
+                f"{stats['category']} [worker {stats['pid']}]: "
+                f"{stats['pairs_scored']} pairs, {stats['matches_written']} matches, "
+                f"{rate:,.0f} pairs/s"
+            )
+
+    # Drop pairs this run did not rewrite: deactivated or recategorized
+    # listings, or scores that fell to zero. A complete run clears every
+    # category, including ones nothing is listed in any more.
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    complete = not failed and set(buckets) == set(BUCKETS)
+    if complete or pruned_categories:
+        pruned = client.rpc("prune_stale_matches", {
+            "p_scored_before": scored_at,
+            "p_categories": None if complete else pruned_categories,
+        }).execute().data
+        print(f"Pruned {pruned} stale matches")
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {total_pairs} pairs in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
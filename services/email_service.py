@@ -1,7 +1,12 @@
 # services/email_service.py
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from sendgrid.helpers.mail import Mail, Personalization, To, Substitution
 import ssl, certifi, os
+import json
+import smtplib
+import threading
+import datetime
+from email.message import EmailMessage
+import httpx
 
 # Force Python to use certifi’s CA bundle
 os.environ["SSL_CERT_FILE"] = certifi.where()
@@ -18,22 +23,177 @@ except Exception:
     SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
     FROM_EMAIL = os.getenv("FROM_EMAIL")
 
+# "sendgrid" in production; "smtp" (e.g. a local MailHog) or "file" for development and tests
+EMAIL_TRANSPORT = os.environ.get("EMAIL_TRANSPORT", "sendgrid")
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "1025"))
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
+EMAIL_FILE_PATH = os.environ.get("EMAIL_FILE_PATH", "sent_emails.jsonl")
 
-def send_email(to_email, subject, html_content):
-    message = Mail(
-        from_email=FROM_EMAIL,
-        to_emails=to_email,
-        subject=subject,
-        html_content=html_content
-    )
-    try:
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        response = sg.send(message)
-        print(f"Email sent to {to_email}: {response.status_code}")
+
+def _substitutions(substitutions):
+    # SendGrid only accepts string values
+    return {tag: "" if value is None else str(value) for tag, value in (substitutions or {}).items()}
+
+
+def _render(text, substitutions):
+    for tag, value in _substitutions(substitutions).items():
+        text = text.replace(tag, value)
+    return text
+
+
+# -----------------------------
+# Transports
+# A transport sends one subject/body to many recipients; each recipient is
+# (email, substitutions) and the substitutions fill the -tags- in both.
+# send() returns the emails it could not deliver.
+# -----------------------------
+class SendGridTransport:
+    """Posts to the SendGrid v3 API over one pooled keep-alive connection."""
+    API_URL = "https://api.sendgrid.com/v3/mail/send"
+    MAX_PERSONALIZATIONS = 1000  # SendGrid's per-request limit
+
+    def __init__(self, api_key, from_email):
+        self.from_email = from_email
+        self._http = httpx.Client(
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=10.0,
+        )
+
+    def _post(self, subject, html_content, batch):
+        message = Mail(from_email=self.from_email, html_content=html_content)
+        for to_email, substitutions in batch:
+            personalization = Personalization()
+            personalization.add_to(To(to_email))
+            personalization.subject = _render(subject, substitutions)
+            for tag, value in _substitutions(substitutions).items():
+                personalization.add_substitution(Substitution(tag, value))
+            message.add_personalization(personalization)
+        emails = ", ".join(to_email for to_email, _ in batch)
+        try:
+            response = self._http.post(self.API_URL, json=message.get())
+            response.raise_for_status()
+            print(f"Email sent to {emails}: {response.status_code}")
+            return True
+        except Exception as e:
+            print(f"Error sending email to {emails}: {e}")
+            return False
+
+    def send(self, subject, html_content, recipients):
+        failed = []
+        for start in range(0, len(recipients), self.MAX_PERSONALIZATIONS):
+            batch = recipients[start:start + self.MAX_PERSONALIZATIONS]
+            if self._post(subject, html_content, batch):
+                continue
+            # SendGrid rejects the whole request for one bad address, so
+            # retry one recipient at a time to find the ones that fail
+            if len(batch) == 1:
+                failed.append(batch[0][0])
+                continue
+            for recipient in batch:
+                if not self._post(subject, html_content, [recipient]):
+                    failed.append(recipient[0])
+        return failed
+
+
+class SmtpTransport:
+    """Sends rendered messages over one SMTP connection, reconnecting when the server drops it."""
+
+    def __init__(self, host, port, from_email, username=None, password=None):
+        self.host = host
+        self.port = port
+        self.from_email = from_email
+        self.username = username
+        self.password = password
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+        self._smtp = smtplib.SMTP(self.host, self.port, timeout=10)
+        if self.username:
+            self._smtp.starttls()
+            self._smtp.login(self.username, self.password)
+        return self._smtp
+
+    def send(self, subject, html_content, recipients):
+        failed = []
+        with self._lock:
+            for to_email, substitutions in recipients:
+                message = EmailMessage()
+                message["From"] = self.from_email
+                message["To"] = to_email
+                message["Subject"] = _render(subject, substitutions)
+                message.set_content(_render(html_content, substitutions), subtype="html")
+                try:
+                    self._connection().send_message(message)
+                except Exception as e:
+                    print(f"Error sending email to {to_email}: {e}")
+                    self._smtp = None
+                    failed.append(to_email)
+        return failed
+
+
+class FileTransport:
+    """Appends rendered messages to a JSON-lines file instead of sending them."""
+
+    def __init__(self, path, from_email):
+        self.path = path
+        self.from_email = from_email
+        self._lock = threading.Lock()
+
+    def send(self, subject, html_content, recipients):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for to_email, substitutions in recipients:
+                f.write(json.dumps({
+                    "from": self.from_email,
+                    "to": to_email,
+                    "subject": _render(subject, substitutions),
+                    "html": _render(html_content, substitutions),
+                    "sent_at": datetime.datetime.utcnow().isoformat(),
+                }) + "\n")
+        return []
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Process-wide transport, created on first use from EMAIL_TRANSPORT."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                if EMAIL_TRANSPORT == "smtp":
+                    _transport = SmtpTransport(SMTP_HOST, SMTP_PORT, FROM_EMAIL, SMTP_USERNAME, SMTP_PASSWORD)
+                elif EMAIL_TRANSPORT == "file":
+                    _transport = FileTransport(EMAIL_FILE_PATH, FROM_EMAIL)
+                else:
+                    _transport = SendGridTransport(SENDGRID_API_KEY, FROM_EMAIL)
+    return _transport
+
+
+def set_transport(transport):
+    """Replace the transport, e.g. with a FileTransport in tests."""
+    global _transport
+    _transport = transport
+
+
+def send_bulk_email(subject, html_content, recipients):
+    """
+    Send one message to many recipients in as few API calls as possible.
+    recipients: list of (email, substitutions) where substitutions maps -tags- to values.
+    """
+    if not recipients:
         return True
-    except Exception as e:
-        print(f"Error sending email to {to_email}: {e}")
-        return False
+    return not get_transport().send(subject, html_content, recipients)
 
 
 def format_contact_info(profile, contact=None):
@@ -53,45 +213,46 @@ def format_contact_info(profile, contact=None):
     return "<br>".join(lines)
 
 
-def send_match_request_email(receiver, sender):
-    """
-    Notify receiver that someone sent them a match request.
-    No contact details are shared at this stage.
-    """
-    subject = "New match request waiting for your response on BetterBarter!"
-    html_content = f"""
-    Hi {receiver.name},<br><br>
-    {sender.name} has sent you a match request on BetterBarter at betterbarter.streamlit.app <br>
-    Log in to your account to review and respond.<br><br>
-    Happy helping! :)
-    """
-    send_email(receiver.email, subject, html_content)
+def _digest_item(event):
+    other = event["other"]
+    if event["kind"] == "match_accepted":
+        return (
+            f"Your match with {other.name} has been accepted. Contact Info to reach {other.name}:<br>"
+            f"{format_contact_info(other, event.get('contact'))}"
+        )
+    return f"{other.name} has sent you a match request."
 
 
-def send_match_accepted_email(user1, user2, user1_contact=None, user2_contact=None):
+def send_digest_emails(digests):
     """
-    Send email to both users when a match is accepted.
-    Contact details are exchanged at this stage.
+    Send each recipient one summary of their pending notifications, all in one bulk send.
+    - digests: list of (receiver, events); an event is a dict with 'kind'
+      ("match_request" or "match_accepted"), 'other' (the user on the other side)
+      and, for acceptances, 'contact' (their preferred contact)
+    Returns the emails of the receivers whose digest could not be delivered.
     """
-    subject = "Your match request was accepted on BetterBarter!"
-
-    html_content_user1 = f"""
-    Hi {user1.name},<br><br>
-    Good news! Your match with {user2.name} has been accepted.<br>
-    Contact Info to reach {user2.name}:<br>
-    {format_contact_info(user2, user2_contact)}<br><br>
-    Please feel free to contact {user2.name}.<br><br>
-    Happy helping!
-    """
-
-    html_content_user2 = f"""
-    Hi {user2.name},<br><br>
-    Good news! Your match with {user1.name} has been accepted.<br>
-    Contact Info to reach {user1.name}:<br>
-    {format_contact_info(user1, user1_contact)}<br><br>
-    Please feel free to contact {user1.name}.<br><br>
-    Happy helping!
+    html_content = """
+    Hi -name-,<br><br>
+    Here is what's new for you on BetterBarter at betterbarter.streamlit.app:<br><br>
+    -items-<br><br>
+    Log in to your account to review and respond.<br><br>
+    Happy helping! :)
     """
 
-    send_email(user1.email, subject, html_content_user1)
-    send_email(user2.email, subject, html_content_user2)
+    recipients = []
+    for receiver, events in digests:
+        kinds = {event["kind"] for event in events}
+        if len(events) > 1:
+            subject = f"You have {len(events)} updates on BetterBarter!"
+        elif kinds == {"match_accepted"}:
+            subject = "Your match request was accepted on BetterBarter!"
+        else:
+            subject = "New match request waiting for your response on BetterBarter!"
+        recipients.append((receiver.email, {
+            "-subject-": subject,
+            "-name-": receiver.name,
+            "-items-": "<br><br>".join(_digest_item(event) for event in events),
+        }))
+    if not recipients:
+        return []
+    return get_transport().send("-subject-", html_content, recipients)
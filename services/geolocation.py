@@ -10,6 +10,9 @@
 # Keep matching rules flexible — you could then match by distance radius (e.g., 5 km) instead of only “same first 2 digits of pin code.”
 
 import math
+import os
+import re
+import numpy as np
 
 def haversine_distance(lat1, lon1, lat2, lon2):
     """Return distance in kilometers between two lat/lon points."""
@@ -28,3 +31,100 @@ def is_within_radius(user1, user2, radius_km: float = 10.0):
     if not user1.latitude or not user1.longitude or not user2.latitude or not user2.longitude:
         return False
     return haversine_distance(user1.latitude, user1.longitude, user2.latitude, user2.longitude) <= radius_km
+
+
+# -----------------------------
+# Offline PC4 geocoding
+# -----------------------------
+EARTH_RADIUS_KM = 6371
+DISTANCE_HALF_KM = float(os.environ.get("DISTANCE_HALF_KM", 5.0))  # distance at which proximity decays to 0.5
+
+# CSV with header "pc4,latitude,longitude" (e.g. the CBS/PDOK PC4 centroids).
+# It is converted to a .npy lookup table next to it and memory-mapped from then on;
+# the table is rebuilt whenever the CSV is newer.
+# Without it no postcode is geocoded and proximity falls back to the postcode prefix test;
+# load_pc4_coordinates.py copies it into Postgres for the SQL scorer.
+PC4_CSV_PATH = os.environ.get(
+    "PC4_COORDINATES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "pc4_coordinates.csv"),
+)
+
+_PC4_PATTERN = re.compile(r"^\s*(\d{4})")
+_pc4_table = None
+
+
+def _load_pc4_table():
+    """
+    Return a (10000, 2) lat/lon array indexed by the 4-digit postcode number,
+    NaN where unknown (everywhere if the dataset has not been provisioned).
+    """
+    global _pc4_table
+    if _pc4_table is not None:
+        return _pc4_table
+
+    npy_path = os.path.splitext(PC4_CSV_PATH)[0] + ".npy"
+    npy_is_current = os.path.exists(npy_path) and (
+        not os.path.exists(PC4_CSV_PATH) or os.path.getmtime(npy_path) >= os.path.getmtime(PC4_CSV_PATH)
+    )
+    if npy_is_current:
+        _pc4_table = np.load(npy_path, mmap_mode="r")
+    elif os.path.exists(PC4_CSV_PATH):
+        rows = np.loadtxt(PC4_CSV_PATH, delimiter=",", skiprows=1, ndmin=2)
+        table = np.full((10000, 2), np.nan)
+        table[rows[:, 0].astype(int)] = rows[:, 1:3]
+        try:
+            np.save(npy_path, table)
+        except OSError:
+            pass
+        _pc4_table = table
+    else:
+        print(
+            f"Warning: PC4 coordinate dataset not found at {PC4_CSV_PATH}; postal proximity uses the "
+            "postcode prefix. Download the CBS/PDOK PC4 centroids as a 'pc4,latitude,longitude' CSV "
+            "there, or point PC4_COORDINATES_PATH at it."
+        )
+        _pc4_table = np.full((10000, 2), np.nan)
+    return _pc4_table
+
+
+def pc4_coordinate_rows():
+    """(pc4, latitude, longitude) for every geocoded postcode, e.g. to load into Postgres."""
+    table = _load_pc4_table()
+    known = np.flatnonzero(~np.isnan(table[:, 0]))
+    return [(int(pc4), float(table[pc4, 0]), float(table[pc4, 1])) for pc4 in known]
+
+
+def postal_to_coordinates(postal_code: str):
+    """Return (lat, lon) for a Dutch postcode like '1012AB', or None if unknown."""
+    table = _load_pc4_table()
+    match = _PC4_PATTERN.match(postal_code or "")
+    if not match:
+        return None
+    lat, lon = table[int(match.group(1))]
+    if np.isnan(lat):
+        return None
+    return float(lat), float(lon)
+
+
+def postals_to_coordinates(postal_codes) -> np.ndarray:
+    """Vectorized postal_to_coordinates: (n, 2) array with NaN rows for unknown postcodes."""
+    coordinates = np.full((len(postal_codes), 2), np.nan)
+    table = _load_pc4_table()
+    for i, postal_code in enumerate(postal_codes):
+        match = _PC4_PATTERN.match(postal_code or "")
+        if match:
+            coordinates[i] = table[int(match.group(1))]
+    return coordinates
+
+
+def haversine_distances(lat, lon, lats, lons) -> np.ndarray:
+    """Distances in kilometers from one point to arrays of points."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_decay(distances_km, half_km: float = DISTANCE_HALF_KM) -> np.ndarray:
+    """Map distances to a 0-1 proximity score, 1 at 0 km and 0.5 at `half_km`."""
+    return np.exp(-np.log(2) * np.asarray(distances_km) / half_km)
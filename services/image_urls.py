@@ -0,0 +1,88 @@
+# services/image_urls.py
+"""
+Signed URLs for images in the private storage buckets.
+
+URLs are cached per (bucket, file_name) for the whole process and reused
+until shortly before they expire, so the same URL is served across reruns
+and sessions and browsers can cache the image. Missing URLs are signed in
+bulk with create_signed_urls.
+"""
+import threading
+import time
+
+from services.images import rendition_name
+
+SIGNED_URL_TTL_SEC = 60 * 60 * 24
+REFRESH_MARGIN_SEC = 60 * 60  # re-sign URLs with less than this left
+
+_cache = {}  # (bucket, file_name) -> (url, expires_at)
+_lock = threading.Lock()
+
+
+def _signed_url_from(resp) -> str | None:
+    if not resp:
+        return None
+    return resp.get("signedURL") or resp.get("signedUrl")
+
+
+def get_signed_urls(db, bucket: str, file_names) -> dict:
+    """Return {file_name: signed_url} for the given files, signing only uncached ones."""
+    now = time.time()
+    urls = {}
+    missing = []
+    with _lock:
+        for file_name in dict.fromkeys(f for f in file_names if f):
+            cached = _cache.get((bucket, file_name))
+            if cached and cached[1] - REFRESH_MARGIN_SEC > now:
+                if cached[0]:
+                    urls[file_name] = cached[0]
+            else:
+                missing.append(file_name)
+
+    if missing:
+        try:
+            signed = db.storage.from_(bucket).create_signed_urls(missing, SIGNED_URL_TTL_SEC)
+        except Exception as e:
+            print(f"Warning: could not sign images in {bucket}: {e}")
+            signed = []
+
+        expires_at = now + SIGNED_URL_TTL_SEC
+        with _lock:
+            for file_name, resp in zip(missing, signed):
+                url = _signed_url_from(resp)
+                if url and not resp.get("error"):
+                    _cache[(bucket, file_name)] = (url, expires_at)
+                    urls[file_name] = url
+                else:
+                    # Missing object (e.g. no rendition yet): don't ask again for a while
+                    _cache[(bucket, file_name)] = (None, now + 2 * REFRESH_MARGIN_SEC)
+    return urls
+
+
+def get_signed_url(db, bucket: str, file_name: str) -> str | None:
+    """Signed URL for a single stored file, or None on failure."""
+    if not file_name:
+        return None
+    return get_signed_urls(db, bucket, [file_name]).get(file_name)
+
+
+def get_rendition_urls(db, bucket: str, file_names, rendition: str = "thumb") -> dict:
+    """
+    Return {file_name: signed_url} pointing at the given rendition of each
+    file, falling back to the original for images uploaded without one.
+    """
+    file_names = [f for f in file_names if f]
+    renditions = {f: rendition_name(f, rendition) for f in file_names}
+    signed = get_signed_urls(db, bucket, renditions.values())
+    urls = {f: signed[r] for f, r in renditions.items() if r in signed}
+
+    originals = [f for f in file_names if f not in urls]
+    if originals:
+        urls.update(get_signed_urls(db, bucket, originals))
+    return urls
+
+
+def get_rendition_url(db, bucket: str, file_name: str, rendition: str = "thumb") -> str | None:
+    if not file_name:
+        return None
+    return get_rendition_urls(db, bucket, [file_name], rendition).get(file_name)
@@ -0,0 +1,104 @@
+# services/images.py
+"""
+Upload-time image processing.
+
+Uploaded offer/request images are decoded, auto-rotated, stripped of
+metadata and re-encoded as WebP renditions stored next to the original:
+
+    <name>.<ext>          original upload, upright and without metadata
+    <name>_thumb.webp     for feed and match cards
+    <name>_detail.webp    for larger views
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+
+# HEIC/HEIF uploads need the optional pillow-heif plugin
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+RENDITIONS = {
+    "thumb": 320,
+    "detail": 1024,
+}
+WEBP_QUALITY = 80
+ORIGINAL_JPEG_QUALITY = 90  # the stored original is re-encoded to drop its metadata
+
+
+def rendition_name(file_name: str, rendition: str) -> str:
+    """Storage path of a rendition of `file_name`."""
+    return f"{os.path.splitext(file_name)[0]}_{rendition}.webp"
+
+
+def rendition_names(file_name: str) -> list:
+    return [rendition_name(file_name, rendition) for rendition in RENDITIONS]
+
+
+def decode_image(data: bytes):
+    """
+    Decode an upload and apply its EXIF orientation. Returns (image, format);
+    raises with a message for the user if the file is not a readable image.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+    except (OSError, Image.DecompressionBombError) as e:
+        print(f"Warning: could not decode image: {e}")
+        raise Exception("Could not read the image. Please upload a PNG, JPEG or HEIC file.")
+    return image, image_format
+
+
+def strip_metadata(image, image_format: str) -> bytes:
+    """Re-encode the (already upright) image in its own format without EXIF/GPS metadata."""
+    buffer = io.BytesIO()
+    options = {"quality": ORIGINAL_JPEG_QUALITY} if image_format == "JPEG" else {}
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def make_renditions(image) -> dict:
+    """
+    Return {rendition: webp_bytes} for a decoded image. Renditions keep the
+    aspect ratio, never upscale and carry no EXIF/metadata.
+    """
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    renditions = {}
+    for rendition, max_side in RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+        renditions[rendition] = buffer.getvalue()
+    return renditions
+
+
+def upload_image(db, bucket: str, file_name: str, data: bytes):
+    """
+    Upload the image without its metadata, plus its renditions. Everything
+    is encoded before the first upload, so an unreadable file stores nothing.
+    Returns the storage response for the original; rendition upload failures
+    are logged, not raised, since readers fall back to the original.
+    """
+    image, image_format = decode_image(data)
+    original = strip_metadata(image, image_format)
+    renditions = make_renditions(image)
+
+    res = db.storage.from_(bucket).upload(file_name, original)
+
+    for rendition, rendition_data in renditions.items():
+        try:
+            db.storage.from_(bucket).upload(
+                rendition_name(file_name, rendition),
+                rendition_data,
+                {"content-type": "image/webp"},
+            )
+        except Exception as e:
+            print(f"Warning: could not upload {rendition} rendition of {file_name}: {e}")
+    return res
@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased, contains_eager
 from data.models import Profile, Offer, Request
 
 def is_nearby(postal1: str, postal2: str, level: int = 3) -> bool:
@@ -24,48 +25,55 @@ def find_matches_for_user(
         return []
 
     matches = []
+    my_offer = aliased(Offer)
+    my_request = aliased(Request)
 
     # --- Match profile's offers to other profiles' requests ---
-    for offer in profile.offers:
-        potential_requests = (
-            db.query(Request)
-            .join(Profile, Profile.id == Request.profile_id)
-            .filter(Request.profile_id != profile_id)
-            .filter(Request.title.ilike(f"%{offer.title}%"))
-            .all()
-        )
-        for req in potential_requests:
-            score = 1.0 if is_nearby(profile.postal_code, req.profile.postal_code, level=proximity_level) else 0.5
-            matches.append({
-                "offer_title": offer.title,
-                "offer_profile_name": profile.full_name,
-                "offer_postal": profile.postal_code,
-                "request_title": req.title,
-                "request_profile_name": req.profile.full_name,
-                "request_postal": req.profile.postal_code,
-                "score": score
-            })
+    # One join for all offers; the trigram index on requests.title backs the ILIKE
+    offer_matches = (
+        db.query(my_offer.title, Request)
+        .join(Request, Request.title.ilike(func.concat("%", my_offer.title, "%")))
+        .join(Request.profile)
+        .options(contains_eager(Request.profile))
+        .filter(my_offer.profile_id == profile_id)
+        .filter(Request.profile_id != profile_id)
+        .order_by(my_offer.id, Request.id)
+        .all()
+    )
+    for offer_title, req in offer_matches:
+        score = 1.0 if is_nearby(profile.postal_code, req.profile.postal_code, level=proximity_level) else 0.5
+        matches.append({
+            "offer_title": offer_title,
+            "offer_profile_name": profile.full_name,
+            "offer_postal": profile.postal_code,
+            "request_title": req.title,
+            "request_profile_name": req.profile.full_name,
+            "request_postal": req.profile.postal_code,
+            "score": score
+        })
 
     # --- Match profile's requests to other profiles' offers ---
-    for req in profile.requests:
-        potential_offers = (
-            db.query(Offer)
-            .join(Profile, Profile.id == Offer.profile_id)
-            .filter(Offer.profile_id != profile_id)
-            .filter(Offer.title.ilike(f"%{req.title}%"))
-            .all()
-        )
-        for offer in potential_offers:
-            score = 1.0 if is_nearby(profile.postal_code, offer.profile.postal_code, level=proximity_level) else 0.5
-            matches.append({
-                "offer_title": offer.title,
-                "offer_profile_name": offer.profile.full_name,
-                "offer_postal": offer.profile.postal_code,
-                "request_title": req.title,
-                "request_profile_name": profile.full_name,
-                "request_postal": profile.postal_code,
-                "score": score
-            })
+    request_matches = (
+        db.query(my_request.title, Offer)
+        .join(Offer, Offer.title.ilike(func.concat("%", my_request.title, "%")))
+        .join(Offer.profile)
+        .options(contains_eager(Offer.profile))
+        .filter(my_request.profile_id == profile_id)
+        .filter(Offer.profile_id != profile_id)
+        .order_by(my_request.id, Offer.id)
+        .all()
+    )
+    for request_title, offer in request_matches:
+        score = 1.0 if is_nearby(profile.postal_code, offer.profile.postal_code, level=proximity_level) else 0.5
+        matches.append({
+            "offer_title": offer.title,
+            "offer_profile_name": offer.profile.full_name,
+            "offer_postal": offer.profile.postal_code,
+            "request_title": request_title,
+            "request_profile_name": profile.full_name,
+            "request_postal": profile.postal_code,
+            "score": score
+        })
 
     # Sort matches by score descending
     matches.sort(key=lambda x: x["score"], reverse=True)
@@ -1,4 +1,15 @@
-from difflib import SequenceMatcher
+import heapq
+import itertools
+import numpy as np
+from services import geolocation
+
+NGRAM_SIZE = 3
+
+WEIGHTS = {
+    "subcategory" : 0.4,
+    "title": 0.35,
+    "pincode": 0.25
+}
 
 def is_nearby(postal1: str, postal2: str, level: int = 3) -> bool:
     """Check if two postal codes are 'nearby' based on first N digits."""
@@ -6,29 +17,318 @@ def is_nearby(postal1: str, postal2: str, level: int = 3) -> bool:
         return False
     return postal1[:level] == postal2[:level]
 
+
+def postal_code_of(item) -> str:
+    """An item's postal code, falling back to its embedded owner profile."""
+    if item.get("postal_code"):
+        return item["postal_code"]
+    profile = item.get("profiles")
+    if isinstance(profile, list):
+        profile = profile[0] if profile else None
+    return profile.get("postal_code") if profile else None
+
+
+def proximity_scores(item, candidates) -> np.ndarray:
+    """
+    0-1 proximity of each candidate to `item`: distance decay between PC4
+    centroids when both postcodes are geocoded, else the is_nearby prefix test.
+    """
+    item_postal = postal_code_of(item)
+    candidate_postals = [postal_code_of(c) for c in candidates]
+    prefix = np.fromiter(
+        (is_nearby(item_postal, p) for p in candidate_postals), dtype=float, count=len(candidate_postals)
+    )
+
+    origin = geolocation.postal_to_coordinates(item_postal)
+    if origin is None:
+        return prefix
+
+    coordinates = geolocation.postals_to_coordinates(candidate_postals)
+    known = ~np.isnan(coordinates[:, 0])
+    if not known.any():
+        return prefix
+    distances = geolocation.haversine_distances(origin[0], origin[1], coordinates[:, 0], coordinates[:, 1])
+    return np.where(known, geolocation.distance_decay(distances), prefix)
+
+
+def _ngrams(title: str, n: int = NGRAM_SIZE):
+    """Character n-grams of a lower-cased, space-padded title."""
+    padded = f" {title.lower()} "
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+class TitleMatrix:
+    """
+    Character n-gram count vectors for a fixed list of titles, stored as
+    sparse (row, column, count) arrays sorted by row. Titles are vectorized
+    once; a query title is then compared against all rows, or a chosen
+    subset of them, in a single NumPy pass.
+    """
+
+    def __init__(self, titles, n: int = NGRAM_SIZE):
+        self.n = n
+        self.size = len(titles)
+        self.vocabulary = {}
+
+        rows, cols = [], []
+        for row, title in enumerate(titles):
+            if not title:
+                continue
+            for gram in _ngrams(title, n):
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+
+        # Collapse repeated n-grams within a title into counts
+        width = max(len(self.vocabulary), 1)
+        keys = np.asarray(rows, dtype=np.int64) * width + np.asarray(cols, dtype=np.int64)
+        keys, counts = np.unique(keys, return_counts=True)
+        self.rows = keys // width
+        self.cols = keys % width
+        self.counts = counts.astype(np.float64)
+        self.norms = np.sqrt(np.bincount(self.rows, weights=self.counts ** 2, minlength=self.size))
+        # Row r's entries are [indptr[r], indptr[r + 1])
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(self.rows, minlength=self.size))))
+
+    def _query_vector(self, title: str):
+        query = np.zeros(max(len(self.vocabulary), 1))
+        query_counts = {}
+        for gram in _ngrams(title, self.n):
+            query_counts[gram] = query_counts.get(gram, 0) + 1
+        for gram, count in query_counts.items():
+            col = self.vocabulary.get(gram)
+            if col is not None:
+                query[col] = count
+        return query, np.sqrt(sum(c * c for c in query_counts.values()))
+
+    def similarity(self, title: str, rows=None) -> np.ndarray:
+        """
+        Cosine similarity (0-1) between `title` and every row, or only the
+        given `rows` (in that order). Work is proportional to the n-grams of
+        the rows compared, not of the whole matrix.
+        """
+        size = self.size if rows is None else len(rows)
+        if not title or not size:
+            return np.zeros(size)
+
+        query, query_norm = self._query_vector(title)
+        if rows is None:
+            dots = np.bincount(self.rows, weights=self.counts * query[self.cols], minlength=size)
+            norms = self.norms
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            starts = self.indptr[rows]
+            lengths = self.indptr[rows + 1] - starts
+            # Positions of the selected rows' entries, and which selected row each belongs to
+            owner = np.repeat(np.arange(size), lengths)
+            entries = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+            dots = np.bincount(owner, weights=self.counts[entries] * query[self.cols[entries]], minlength=size)
+            norms = self.norms[rows]
+
+        denominator = norms * query_norm
+        return np.divide(dots, denominator, out=np.zeros(size), where=denominator > 0)
+
+
+def base_scores(item, candidates) -> np.ndarray:
+    """
+    The cheap part of the score (subcategory and proximity weights) for one
+    item against a list of counterpart items. Adding WEIGHTS["title"] gives
+    an upper bound on the full score.
+    """
+    count = len(candidates)
+    same_subcategory = np.fromiter(
+        (c.get("subcategory") == item.get("subcategory") for c in candidates), dtype=bool, count=count
+    )
+    return WEIGHTS["subcategory"] * same_subcategory + WEIGHTS["pincode"] * proximity_scores(item, candidates)
+
+
+def score_matches(item, candidates, title_similarities=None) -> np.ndarray:
+    """
+    Score one offer/request against a list of counterpart items in one pass.
+    Uses the same subcategory/title/pin code weights as score_match.
+    `title_similarities` may be passed in when the candidates' titles are
+    already vectorized in a TitleMatrix.
+    """
+    if not candidates:
+        return np.zeros(0)
+
+    if title_similarities is None:
+        matrix = TitleMatrix([c.get("title", "") for c in candidates])
+        title_similarities = matrix.similarity(item.get("title", ""))
+
+    return base_scores(item, candidates) + WEIGHTS["title"] * title_similarities
+
+
+class TopMatches:
+    """
+    Bounded min-heap keeping the N best (offer, request, score) triples.
+    Ties keep the earliest pushed pair, like a stable sort would.
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self._heap = []
+        self._counter = itertools.count()
+
+    @property
+    def threshold(self) -> float:
+        """Score a new pair has to beat to enter the top N."""
+        if self.n <= 0:
+            return float("inf")
+        if len(self._heap) < self.n:
+            return 0.0
+        return self._heap[0][0]
+
+    def push(self, offer, request, score: float):
+        if score <= self.threshold:
+            return
+        # Negated sequence number: among equal scores the latest push is evicted first
+        entry = (score, -next(self._counter), offer, request)
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, entry)
+        else:
+            heapq.heapreplace(self._heap, entry)
+
+    def results(self):
+        """Kept pairs as (offer, request, score), best first."""
+        ordered = sorted(self._heap, key=lambda e: (-e[0], -e[1]))
+        return [(offer, request, score) for score, _, offer, request in ordered]
+
+
 def score_match(offer, request):
     """
-    Score a potential match based on subcategory, title similarity, and pin code proximity.
-    Returns 0 if subcategory doesn't match.
-    """
-    weights = {
-        "subcategory" : 0.4,
-        "title": 0.35,
-        "pincode": 0.25
-    }
-    score = 0.0
-    if offer.get("subcategory") == request.get("subcategory"):
-        score += weights["subcategory"]
-
-    # Title similarity
-    title1 = offer.get("title", "").lower()
-    title2 = request.get("title", "").lower()
-    if title1 and title2:
-        seq_ratio = SequenceMatcher(None, title1, title2).ratio()  # 0-1
-        score += weights["title"] * seq_ratio
-
-    # Pin code proximity
-    if is_nearby(offer.get("postal_code"), request.get("postal_code")):
-        score += weights["pincode"]
-
-    return score
+    Score a potential match based on subcategory, title similarity, and postcode distance.
+    Single-pair wrapper around score_matches.
+    """
+    return float(score_matches(offer, [request])[0])
+
+
+def build_candidate_index(items):
+    """
+    Bucket items by (category, subcategory) so a listing is only ever compared
+    against listings from its own category.
+    Returns {category: {subcategory: [items]}}.
+    """
+    index = {}
+    for item in items:
+        index.setdefault(item.get("category"), {})\
+            .setdefault(item.get("subcategory"), [])\
+            .append(item)
+    return index
+
+
+def iter_candidates(index, item):
+    """
+    Yield indexed items in the same category as `item`: its own subcategory
+    bucket first, then the remaining subcategories of that category.
+    """
+    by_subcategory = index.get(item.get("category"))
+    if not by_subcategory:
+        return
+    subcategory = item.get("subcategory")
+    yield from by_subcategory.get(subcategory, ())
+    for other_subcategory, bucket in by_subcategory.items():
+        if other_subcategory != subcategory:
+            yield from bucket
+
+
+def category_title_matrix(cache, index, category):
+    """
+    TitleMatrix over every indexed item of one category, built on first use
+    and kept in `cache`. Returns (matrix, {item id: row}).
+    """
+    if category not in cache:
+        items = [item for bucket in index.get(category, {}).values() for item in bucket]
+        cache[category] = (
+            TitleMatrix([item.get("title", "") for item in items]),
+            {item["id"]: row for row, item in enumerate(items)},
+        )
+    return cache[category]
+
+
+def score_shard(offers, requests):
+    """
+    Score every offer against every request of one category slice.
+    Returns (offer_id, request_id, score) for pairs with a positive score
+    and different owners.
+    """
+    if not offers or not requests:
+        return []
+
+    offers_titles = TitleMatrix([o.get("title", "") for o in offers])
+    pairs = []
+    for req in requests:
+        similarities = offers_titles.similarity(req.get("title", ""))
+        scores = score_matches(req, offers, similarities)
+        for i in np.flatnonzero(scores > 0):
+            offer = offers[i]
+            if offer["profile_id"] == req["profile_id"]:
+                continue
+            pairs.append((offer["id"], req["id"], float(scores[i])))
+    return pairs
+
+
+def rank_potential_matches(profile_id: str, all_offers, all_requests, existing_pairs=(), top_n: int = 10):
+    """
+    Rank the profile's active offers/requests against everyone else's and
+    return the top N (offer, request, score) triples. Pairs in
+    `existing_pairs` (offer_id, request_id) are skipped.
+    """
+    # Separate my vs others
+    my_offers = [o for o in all_offers if o["profile_id"] == profile_id]
+    my_requests = [r for r in all_requests if r["profile_id"] == profile_id]
+
+    others_offers = [o for o in all_offers if o["profile_id"] != profile_id]
+    others_requests = [r for r in all_requests if r["profile_id"] != profile_id]
+
+    # Bucket others' items by (category, subcategory) so each of my items is
+    # only compared against listings from its own category
+    offers_index = build_candidate_index(others_offers)
+    requests_index = build_candidate_index(others_requests)
+
+    # Others' titles are vectorized once per category, and only for the
+    # categories my items are in; each of my items is then scored against
+    # the rows of its candidate pool only, in a single NumPy pass
+    offer_matrices, request_matrices = {}, {}
+
+    top = TopMatches(top_n)
+
+    # 1. My requests -> Others' offers
+    for req in my_requests:
+        pool = [
+            offer for offer in iter_candidates(offers_index, req)
+            if offer["profile_id"] != req["profile_id"]
+            and (offer["id"], req["id"]) not in existing_pairs
+        ]
+        if not pool:
+            continue
+        base = base_scores(req, pool)
+        # Skip the title pass when even a perfect title can't beat the current Nth best
+        if base.max() + WEIGHTS["title"] <= top.threshold:
+            continue
+        titles, rows = category_title_matrix(offer_matrices, offers_index, req.get("category"))
+        similarities = titles.similarity(req.get("title", ""), [rows[o["id"]] for o in pool])
+        scores = base + WEIGHTS["title"] * similarities
+        for i in np.flatnonzero(scores > top.threshold):
+            top.push(pool[i], req, float(scores[i]))
+
+    # 2. My offers -> Others' requests
+    for offer in my_offers:
+        pool = [
+            req for req in iter_candidates(requests_index, offer)
+            if req["profile_id"] != offer["profile_id"]
+            and (offer["id"], req["id"]) not in existing_pairs
+        ]
+        if not pool:
+            continue
+        base = base_scores(offer, pool)
+        if base.max() + WEIGHTS["title"] <= top.threshold:
+            continue
+        titles, rows = category_title_matrix(request_matrices, requests_index, offer.get("category"))
+        similarities = titles.similarity(offer.get("title", ""), [rows[r["id"]] for r in pool])
+        scores = base + WEIGHTS["title"] * similarities
+        for i in np.flatnonzero(scores > top.threshold):
+            top.push(offer, pool[i], float(scores[i]))
+
+    return top.results()
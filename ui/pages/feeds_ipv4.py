@@ -3,28 +3,48 @@ from data import crud_ipv4 as crud
 from data.db_ipv4 import get_db
 from utils import auth
 from utils import helpers
+from services import image_urls
 
 REQUEST_BUCKET_NAME = "request-images"
 OFFER_BUCKET_NAME = "offer-images"
+FEED_PAGE_SIZE = 20
 
 
-def create_signed_url(db, bucket: str, file_name: str, expires_sec: int = 60 * 60 * 24) -> str | None:
-    """Return a signed URL for a stored file name, or None on failure."""
-    if not file_name:
-        return None
-    try:
-        resp = db.storage.from_(bucket).create_signed_url(file_name, expires_sec)
-        return resp.get("signedURL") or resp.get("signedUrl")
-    except Exception:
-        return None
+def create_signed_url(db, bucket: str, file_name: str) -> str | None:
+    """Return a (cached) signed URL for a stored file's thumbnail, or None on failure."""
+    return image_urls.get_rendition_url(db, bucket, file_name, "thumb")
 
 
-def display_feed_item(db, caller_id, item, item_type="request"):
+def hydrate_feed(db, caller_id, items, item_type="request"):
+    """
+    Fetch everything display_feed_item needs for a page of items in two
+    queries: the owners' profiles and the caller's existing match requests.
+    """
+    profiles = crud.get_profiles(db, [item["profile_id"] for item in items])
+    # Sign all of the page's images in one call; display_feed_item then hits the cache
+    bucket = REQUEST_BUCKET_NAME if item_type == "request" else OFFER_BUCKET_NAME
+    image_urls.get_rendition_urls(db, bucket, [item.get("image_file_name") for item in items])
+    item_ids = [item["id"] for item in items]
+    existing_matches = crud.get_existing_match_requests(
+        db,
+        initiator_id=caller_id,
+        request_ids=item_ids if item_type == "request" else None,
+        offer_ids=item_ids if item_type == "offer" else None,
+    )
+    return profiles, existing_matches
+
+
+def display_feed_item(db, caller_id, item, item_type="request", profiles=None, existing_matches=None):
     """
     Display a single request or offer in a card-like layout with karma info,
     match request section, and report post functionality.
+    `profiles` and `existing_matches` come from hydrate_feed; without them
+    the item is looked up on its own.
     """
-    profile = crud.get_profile(db, item["profile_id"])
+    if profiles is not None and item["profile_id"] in profiles:
+        profile = profiles[item["profile_id"]]
+    else:
+        profile = crud.get_profile(db, item["profile_id"])
     icon = "🙏" if item_type == "request" else "🤗"
     expander_label = f"{icon} {item['title']}"
 
@@ -57,12 +77,15 @@ def display_feed_item(db, caller_id, item, item_type="request"):
         st.markdown("---")
 
         # ---- Match request section ----
-        existing_match = crud.get_existing_match_request(
-            db,
-            initiator_id=caller_id,
-            request_id=item["id"] if item_type == "request" else None,
-            offer_id=item["id"] if item_type == "offer" else None
-        )
+        if existing_matches is not None:
+            existing_match = existing_matches.get((item_type, item["id"]))
+        else:
+            existing_match = crud.get_existing_match_request(
+                db,
+                initiator_id=caller_id,
+                request_id=item["id"] if item_type == "request" else None,
+                offer_id=item["id"] if item_type == "offer" else None
+            )
 
         toggle_key = f"{item_type}_toggle_{item['id']}"
         if existing_match:
@@ -95,6 +118,8 @@ def display_feed_item(db, caller_id, item, item_type="request"):
                 if st.button("Submit Request", key=f"{item_type}_submit_{item['id']}"):
                     if not contact_mode or not contact_value:
                         st.error("Please provide both contact mode and contact info.")
+                    elif not crud.can_send_match_request(db, caller_id):
+                        st.error("⚠️ Daily limit reached")
                     else:
                         try:
                             initiator_type = "offer" if item_type == "request" else "request"
@@ -150,6 +175,54 @@ def display_feed_item(db, caller_id, item, item_type="request"):
 
 
 
+def display_feed(db, profile_id, item_type, category, subcategory):
+    """
+    Render the loaded pages of a feed with a "Load more" button.
+    Pages are kept in session state per filter so reruns don't refetch them.
+    """
+    table = "requests" if item_type == "request" else "offers"
+    state_key = f"feed_{item_type}_{category}_{subcategory}"
+
+    if state_key not in st.session_state:
+        items, cursor = crud.get_feed_page(
+            db, table, exclude_profile_id=profile_id,
+            category=category, subcategory=subcategory, page_size=FEED_PAGE_SIZE
+        )
+        st.session_state[state_key] = {"items": items, "cursor": cursor}
+    feed = st.session_state[state_key]
+
+    # Items render above the buttons but after they are handled, so a
+    # "Load more" click shows the new page in the same run
+    items_container = st.container()
+
+    col_more, col_refresh = st.columns([3, 1])
+    with col_more:
+        if feed["cursor"] and st.button("Load more", key=f"{item_type}_load_more"):
+            items, cursor = crud.get_feed_page(
+                db, table, exclude_profile_id=profile_id,
+                category=category, subcategory=subcategory,
+                cursor=feed["cursor"], page_size=FEED_PAGE_SIZE
+            )
+            feed["items"].extend(items)
+            feed["cursor"] = cursor
+    with col_refresh:
+        if st.button("🔄 Refresh", key=f"{item_type}_refresh"):
+            feed["items"], feed["cursor"] = crud.get_feed_page(
+                db, table, exclude_profile_id=profile_id,
+                category=category, subcategory=subcategory, page_size=FEED_PAGE_SIZE
+            )
+
+    with items_container:
+        if not feed["items"]:
+            st.info(f"No {table} available for the selected filter.")
+        profiles, existing_matches = hydrate_feed(db, profile_id, feed["items"], item_type=item_type)
+        for item in feed["items"]:
+            display_feed_item(
+                db, profile_id, item, item_type=item_type,
+                profiles=profiles, existing_matches=existing_matches
+            )
+
+
 def main():
     st.title("📰 Feeds")
 
@@ -181,47 +254,15 @@ def main():
             subcategories = ["All"]
         selected_subcategory = st.selectbox("Subcategory", subcategories, index=0)
 
-    # Tabs for separation
-    tabs = st.tabs(["🙏 Requests", "🤗 Offers"])
-
-    # -------------------------
-    # Requests Tab
-    # -------------------------
-    with tabs[0]:
-        requests = crud.get_all_requests(db, exclude_profile_id=profile_id)
-
-        
-
-        # Apply filters
-        if selected_category != "All":
-            requests = [r for r in requests if r.get("category") == selected_category]
-        if selected_subcategory != "All":
-            requests = [r for r in requests if r.get("subcategory") == selected_subcategory]
-
-        if requests:
-            for req in requests:
-                display_feed_item(db, profile_id, req, item_type="request")
-        else:
-            st.info("No requests available for the selected filter.")
+    category = selected_category if selected_category != "All" else None
+    subcategory = selected_subcategory if selected_subcategory != "All" else None
 
     # -------------------------
-    # Offers Tab
+    # Requests / Offers: only the selected feed is fetched
     # -------------------------
-    with tabs[1]:
-        offers = crud.get_all_offers(db, exclude_profile_id=profile_id)
-
-        # Apply filters
-        if selected_category != "All":
-            offers = [o for o in offers if o.get("category") == selected_category]
-        if selected_subcategory != "All":
-            offers = [o for o in offers if o.get("subcategory") == selected_subcategory]
-
-        if offers:
-            for off in offers:
-                display_feed_item(db, profile_id, off, item_type="offer")
-        else:
-            st.info("No offers available for the selected filter.")
-
+    feed = helpers.section_selector(["🙏 Requests", "🤗 Offers"], "feeds_section")
+    item_type = "request" if feed == "🙏 Requests" else "offer"
+    display_feed(db, profile_id, item_type, category, subcategory)
 
 
 if __name__ == "__main__":
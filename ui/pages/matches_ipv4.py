@@ -1,20 +1,30 @@
 import streamlit as st
 from data import crud_ipv4 as crud
-from data.db_ipv4 import get_db
+from data import crud_ipv4_async as crud_async
+from data.db_ipv4 import get_db, run_async_db
 from data.ui_models import UIMatch
-from utils import auth
+from utils import auth, helpers
 from datetime import datetime
 from services.mappers import (
     build_ui_match_from_match,
     build_ui_match_from_match_request,
     build_ui_match_from_offer_request_pair
 )
+from services import image_urls
 from supabase import Client
 
 # Storage buckets
 OFFER_BUCKET_NAME = "offer-images"
 REQUEST_BUCKET_NAME = "request-images"
 
+# Section label -> crud_ipv4_async.load_matches_page section
+MATCH_SECTIONS = {
+    "💡 Potential Matches": "potential",
+    "📤 Sent Match Requests": "sent",
+    "📥 Received Match Requests": "received",
+    "🎯 Completed Matches": "completed",
+}
+
 
 def main():
     st.set_page_config(page_title="Matches", layout="wide")
@@ -32,20 +42,16 @@ def main():
         st.info(f"🌟 Your Karma: **{profile['karma']}**")
 
     # -------------------------
-    # Tabs for sections
+    # Sections: only the selected one is loaded and rendered
     # -------------------------
-    tabs = st.tabs([
-        "💡 Potential Matches",
-        "📤 Sent Match Requests",
-        "📥 Received Match Requests",
-        "🎯 Completed Matches"
-    ])
+    section = MATCH_SECTIONS[helpers.section_selector(list(MATCH_SECTIONS), "matches_section")]
+    page_data = run_async_db(crud_async.load_matches_page, profile_id, sections=(section,))
 
     # -------------------------
-    # Tab 1: Potential Matches
+    # Section 1: Potential Matches
     # -------------------------
-    with tabs[0]:
-        potential_matches = crud.get_potential_matches(db, profile_id)
+    if section == "potential":
+        potential_matches = page_data["potential"]
 
         matches_for_my_requests = [
             build_ui_match_from_offer_request_pair(o, r, score=score)
@@ -59,6 +65,8 @@ def main():
             if o["profile_id"] == profile_id
         ]
 
+        prefetch_match_images(db, matches_for_my_requests + matches_for_my_offers)
+
         st.subheader(f"✨ Potential Matches for Your Requests ({len(matches_for_my_requests)})")
         if matches_for_my_requests:
             for idx, match in enumerate(matches_for_my_requests):
@@ -74,11 +82,12 @@ def main():
             st.info("No requests found matching your offers right now!")
 
     # -------------------------
-    # Tab 2: Sent Requests
+    # Section 2: Sent Requests
     # -------------------------
-    with tabs[1]:
-        sent_requests = crud.get_sent_match_requests(db, profile_id, status="pending")
+    elif section == "sent":
+        sent_requests = page_data["sent"]
         ui_sent_requests = [build_ui_match_from_match_request(mr, db) for mr in sent_requests]
+        prefetch_match_images(db, ui_sent_requests)
 
         st.subheader(f"Sent Requests ({len(ui_sent_requests)})")
         if ui_sent_requests:
@@ -88,11 +97,12 @@ def main():
             st.info("No match requests have been sent yet.")
 
     # -------------------------
-    # Tab 3: Incoming Requests
+    # Section 3: Incoming Requests
     # -------------------------
-    with tabs[2]:
-        incoming_requests = crud.get_incoming_match_requests(db, profile_id, status="pending")
+    elif section == "received":
+        incoming_requests = page_data["received"]
         ui_incoming_requests = [build_ui_match_from_match_request(mr, db) for mr in incoming_requests]
+        prefetch_match_images(db, ui_incoming_requests)
 
         st.subheader(f"Received Requests ({len(ui_incoming_requests)})")
         if ui_incoming_requests:
@@ -102,25 +112,15 @@ def main():
             st.info("No incoming match requests for review.")
 
     # -------------------------
-    # Tab 4: Completed Matches
+    # Section 4: Completed Matches
     # -------------------------
-    with tabs[3]:
-        all_matches = db.table("match_requests").select("""
-            *,
-            offers:offer_id (
-                id, title, description, image_file_name, category, subcategory,
-                profiles:profile_id (id, full_name, postal_code, karma)
-            ),
-            requests:request_id (
-                id, title, description, image_file_name, category, subcategory,
-                profiles:profile_id (id, full_name, postal_code, karma)
-            )
-        """).or_(
-            f"requester_id.eq.{profile_id},offerer_id.eq.{profile_id}"
-        ).execute().data
+    elif section == "completed":
+        all_matches = page_data["completed"]
 
         matched_requests = [m for m in all_matches if m.get("status") in ("accepted", "completed")]
         rejected_requests = [m for m in all_matches if m.get("status") == "rejected"]
+        image_urls.get_rendition_urls(db, OFFER_BUCKET_NAME, [(m.get("offers") or {}).get("image_file_name") for m in all_matches])
+        image_urls.get_rendition_urls(db, REQUEST_BUCKET_NAME, [(m.get("requests") or {}).get("image_file_name") for m in all_matches])
 
         st.subheader(f"🙌 Successful Matches ({len(matched_requests)})")
         if matched_requests:
@@ -138,6 +138,12 @@ def main():
                 display_match(db, ui_match, section="matched", profile_id=profile_id, idx=idx + 10000)
 
 
+def prefetch_match_images(db: Client, matches):
+    """Bulk-sign the images of a list of UIMatch objects before they are displayed."""
+    image_urls.get_rendition_urls(db, OFFER_BUCKET_NAME, [m.offer_image for m in matches])
+    image_urls.get_rendition_urls(db, REQUEST_BUCKET_NAME, [m.request_image for m in matches])
+
+
 # -------------------------
 # Redesigned display_match
 # -------------------------
@@ -155,8 +161,9 @@ def display_match(db: Client, match: UIMatch, section: str, profile_id: str, idx
         with col_offer:
             st.markdown("### 🤗 Offer")
             if match.offer_image:
-                signed_url = db.storage.from_(OFFER_BUCKET_NAME).create_signed_url(match.offer_image, 60*60*24)
-                st.image(signed_url.get("signedURL"), width=160)
+                signed_url = image_urls.get_rendition_url(db, OFFER_BUCKET_NAME, match.offer_image)
+                if signed_url:
+                    st.image(signed_url, width=160)
 
             st.markdown(f"**{match.offer_title or 'No Title'}**")
             st.caption(match.offer_description or "No Description")
@@ -168,8 +175,9 @@ def display_match(db: Client, match: UIMatch, section: str, profile_id: str, idx
         with col_request:
             st.markdown("### 🙏 Request")
             if match.request_image:
-                signed_url = db.storage.from_(REQUEST_BUCKET_NAME).create_signed_url(match.request_image, 60*60*24)
-                st.image(signed_url.get("signedURL"), width=160)
+                signed_url = image_urls.get_rendition_url(db, REQUEST_BUCKET_NAME, match.request_image)
+                if signed_url:
+                    st.image(signed_url, width=160)
 
             st.markdown(f"**{match.request_title or 'No Title'}**")
             st.caption(match.request_description or "No Description")
@@ -208,20 +216,25 @@ def display_match(db: Client, match: UIMatch, section: str, profile_id: str, idx
                 if st.button("Submit Request", key=f"submit-{idx}"):
                     if not contact_value:
                         st.error("Please provide your contact details.")
+                    elif not crud.can_send_match_request(db, profile_id):
+                        st.error("⚠️ Daily limit reached")
                     else:
-                        initiator_type = "request" if profile_id == match.requester_id else "offer"
-                        crud.create_match_request(
-                            db,
-                            caller_id=profile_id,
-                            offer_id=match.offer_id,
-                            request_id=match.request_id,
-                            message=custom_message,
-                            contact_mode=contact_mode,
-                            contact_value=contact_value,
-                            initiator_type=initiator_type
-                        )
-                        st.success("✅ Match request sent successfully!")
-                        st.session_state[toggle_key] = False
+                        try:
+                            initiator_type = "request" if profile_id == match.requester_id else "offer"
+                            crud.create_match_request(
+                                db,
+                                caller_id=profile_id,
+                                offer_id=match.offer_id,
+                                request_id=match.request_id,
+                                message=custom_message,
+                                contact_mode=contact_mode,
+                                contact_value=contact_value,
+                                initiator_type=initiator_type
+                            )
+                            st.success("✅ Match request sent successfully!")
+                            st.session_state[toggle_key] = False
+                        except Exception as e:
+                            st.error(f"❌ {str(e)}")
 
         elif section == "sent":
             # Determine the other party
@@ -281,20 +294,26 @@ def display_match(db: Client, match: UIMatch, section: str, profile_id: str, idx
                         if not contact_value:
                             st.error("Please provide contact details to accept the match.")
                         else:
-                            crud.accept_match_request(
-                                db,
-                                match_request_id=match.id,
-                                profile_id=profile_id,
-                                contact_mode=contact_mode,
-                                contact_value=contact_value
-                            )
-                            st.success("Request accepted!")
+                            try:
+                                crud.accept_match_request(
+                                    db,
+                                    match_request_id=match.id,
+                                    profile_id=profile_id,
+                                    contact_mode=contact_mode,
+                                    contact_value=contact_value
+                                )
+                                st.success("Request accepted!")
+                            except Exception as e:
+                                st.error(f"❌ {str(e)}")
                             st.session_state[accept_key] = False
 
             with col2:
                 if st.button("Decline", key=f"decline-{idx}"):
-                    crud.decline_match_request(db, match.id, profile_id)
-                    st.warning("Request declined!")
+                    try:
+                        crud.decline_match_request(db, match.id, profile_id)
+                        st.warning("Request declined!")
+                    except Exception as e:
+                        st.error(f"❌ {str(e)}")
 
         elif section == "matched":
             if match.status == "rejected":
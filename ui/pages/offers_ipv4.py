@@ -2,6 +2,7 @@ import streamlit as st
 from data import crud_ipv4 as crud
 from data.db_ipv4 import get_db
 from utils import auth, helpers
+from services import image_urls, images
 import uuid
 
 MAX_IMAGE_SIZE_MB = 2
@@ -88,8 +89,8 @@ def main():
                     image_file_name = f"{profile_id}_{uuid.uuid4().hex}.{ext}"
 
                     try:
-                        res = db.storage.from_(OFFER_BUCKET_NAME).upload(
-                            image_file_name, image_file.getvalue()
+                        res = images.upload_image(
+                            db, OFFER_BUCKET_NAME, image_file_name, image_file.getvalue()
                         )
                         if res and isinstance(res, dict) and res.get("error"):
                             st.error("Error uploading image: " + str(res["error"]["message"]))
@@ -115,18 +116,17 @@ def main():
     # -------------------------
     with tab_list:
         st.subheader("My Offers")
-        offers = crud.get_all_offers(db, exclude_profile_id=None, include_inactive=True)
-        user_offers = [o for o in offers if o["profile_id"] == profile_id]
+        user_offers = crud.get_offers_for_profile(db, profile_id, include_inactive=True)
 
         if user_offers:
+            image_urls.get_rendition_urls(db, OFFER_BUCKET_NAME, [o.get("image_file_name") for o in user_offers])
             for o in user_offers:
                 st.write(f"**{o['title']}** - {o.get('category', '—')} : {o.get('subcategory', '—')}")
                 st.write(o.get("description", ""))
                 if o.get("image_file_name"):
-                    signed_url_resp = db.storage.from_(OFFER_BUCKET_NAME).create_signed_url(
-                        o["image_file_name"], 60*60*24
-                    )
-                    st.image(signed_url_resp.get("signedURL"), width=200)
+                    signed_url = image_urls.get_rendition_url(db, OFFER_BUCKET_NAME, o["image_file_name"])
+                    if signed_url:
+                        st.image(signed_url, width=200)
 
                 st.write(f"Status: {'Active' if o.get('is_active', True) else 'Inactive'}")
 
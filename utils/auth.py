@@ -1,10 +1,49 @@
 import streamlit as st
 from supabase import Client
-from data.db_ipv4 import get_db  # per-user client
+import jwt
+import os
+from data.db_ipv4 import get_db, release_db, SUPABASE_URL  # per-user client
 
 SESSION_KEY_USER = "supabase_user_id"
 SESSION_KEY_SESSION = "supabase_session"
 
+# Access tokens are verified in-process: HS256 tokens with the project's JWT
+# secret, asymmetric ones against the project's JWKS (fetched once, then cached).
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
+JWT_AUDIENCE = "authenticated"
+JWKS_CACHE_SECONDS = 3600
+
+_jwks_client = None
+
+
+class TokenUser:
+    """The user a verified access token belongs to."""
+    def __init__(self, claims: dict):
+        self.id = claims["sub"]
+        self.email = claims.get("email")
+        self.role = claims.get("role")
+        self.claims = claims
+
+
+def verify_access_token(access_token: str):
+    """
+    Check the token's signature, expiry and audience without calling Supabase.
+    Returns the claims, or None when the token cannot be checked locally
+    (an HS256 token and no SUPABASE_JWT_SECRET). Raises jwt.InvalidTokenError.
+    """
+    global _jwks_client
+    alg = jwt.get_unverified_header(access_token).get("alg")
+    if alg == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            return None
+        return jwt.decode(access_token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience=JWT_AUDIENCE)
+
+    if _jwks_client is None:
+        _jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, cache_keys=True, lifespan=JWKS_CACHE_SECONDS)
+    signing_key = _jwks_client.get_signing_key_from_jwt(access_token)
+    return jwt.decode(access_token, signing_key.key, algorithms=["RS256", "ES256"], audience=JWT_AUDIENCE)
+
 
 def is_authenticated() -> bool:
     """Check if user is logged in by looking at session_state."""
@@ -49,36 +88,53 @@ def logout_user():
         db.auth.sign_out()
     except Exception as e:
         st.warning(f"Error signing out of Supabase: {e}")
+    release_db()
 
     # Clear local session state
     st.session_state.pop(SESSION_KEY_USER, None)
     st.session_state.pop(SESSION_KEY_SESSION, None)
 
 
+def _validate_with_server(db: Client):
+    """Ask Supabase Auth for the user, restoring the session first if needed."""
+    user_resp = db.auth.get_user()
+    if user_resp and getattr(user_resp, "user", None):
+        return user_resp.user
+
+    # Try restoring session from st.session_state
+    if SESSION_KEY_SESSION in st.session_state:
+        session = st.session_state[SESSION_KEY_SESSION]
+        refreshed = db.auth.set_session(
+            session["access_token"],
+            session["refresh_token"],
+        )
+        if refreshed and getattr(refreshed, "user", None):
+            return refreshed.user
+    return None
+
+
 def ensure_authenticated(db: Client | None = None, required: bool = True):
     """
     Ensures the current Supabase session is valid.
     Returns the user object if valid.
     If required=False, returns None instead of stopping execution.
+    get_db() refreshes a session close to expiry; the token is then verified
+    locally, falling back to Supabase Auth when that is not possible.
     """
     db = db or get_db()
 
     try:
-        user_resp = db.auth.get_user()
-        if user_resp and getattr(user_resp, "user", None):
-            st.session_state[SESSION_KEY_USER] = user_resp.user.id
-            return user_resp.user
-
-        # Try restoring session from st.session_state
-        if SESSION_KEY_SESSION in st.session_state:
-            session = st.session_state[SESSION_KEY_SESSION]
-            refreshed = db.auth.set_session(
-                session["access_token"],
-                session["refresh_token"],
-            )
-            if refreshed and getattr(refreshed, "user", None):
-                st.session_state[SESSION_KEY_USER] = refreshed.user.id
-                return refreshed.user
+        user = None
+        session = st.session_state.get(SESSION_KEY_SESSION)
+        claims = verify_access_token(session["access_token"]) if session else None
+        if claims:
+            user = TokenUser(claims)
+        elif session:
+            user = _validate_with_server(db)
+
+        if user:
+            st.session_state[SESSION_KEY_USER] = user.id
+            return user
 
         if required:
             st.error("Your session has expired or you are not logged in. Please log in again.")
@@ -86,6 +142,12 @@ def ensure_authenticated(db: Client | None = None, required: bool = True):
 
         return None
 
+    except jwt.ExpiredSignatureError:
+        if required:
+            st.error("Your session has expired or you are not logged in. Please log in again.")
+            st.stop()
+        return None
+
     except Exception as e:
         if required:
             st.error(f"Authentication error: {e}")
@@ -115,4 +115,31 @@ def parse_datetime(dt):
             return datetime.fromisoformat(dt.replace("Z", "+00:00"))
         except ValueError:
             return None
-    return dt
\ No newline at end of file
+    return dt
+
+def section_selector(sections, state_key: str):
+    """
+    Horizontal section picker used in place of st.tabs, which runs every tab's body on each rerun.
+    The choice is kept in st.session_state[state_key], so it survives visits to other pages.
+    """
+    # The radio keeps a fixed key so reruns reuse the same widget; Streamlit drops
+    # that key while the page is not shown, so it is seeded again from state_key
+    widget_key = f"{state_key}_widget"
+    if st.session_state.get(widget_key) not in sections:
+        current = st.session_state.get(state_key)
+        st.session_state[widget_key] = current if current in sections else sections[0]
+    selected = st.radio(
+        "Section",
+        sections,
+        key=widget_key,
+        on_change=_remember_section,
+        args=(widget_key, state_key),
+        horizontal=True,
+        label_visibility="collapsed",
+    )
+    st.session_state.setdefault(state_key, selected)
+    return selected
+
+
+def _remember_section(widget_key: str, state_key: str):
+    st.session_state[state_key] = st.session_state[widget_key]